@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 from pathlib import Path
+from importlib.util import find_spec
 import os
 from dotenv import load_dotenv
 
@@ -49,6 +50,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'chef_co.middleware.MetricsMiddleware',  # Outermost so it times the whole request
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -56,6 +58,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'chef_co.middleware.ProfilingMiddleware',  # After authentication so it can tell staff apart
 ]
 
 ROOT_URLCONF = 'chef_app.urls'
@@ -90,6 +93,102 @@ DATABASES = {
 }
 
 
+# Caches
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Serialized menu/course/item representations; swap for FileBasedCache or a shared backend as needed
+    'renders': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'chef-co-renders',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+CHEF_CO_RENDER_CACHE = {
+    'CACHE': 'renders',
+    'TIMEOUT': 60 * 60 * 24,
+    'GZIP': True,  # Also keep gzipped JSON bodies for menu, course and item detail views
+}
+
+
+# Prediction settings
+# Items with references for all of these sizes are computed locally in hybrid mode
+CHEF_CO_REFERENCE_SIZES = [50, 100, 250, 500]
+CHEF_CO_PREDICTION_MODE = os.environ.get('CHEF_CO_PREDICTION_MODE', 'llm')
+
+# Prediction cache and warm-up of common party sizes
+CHEF_CO_PREDICTION_CACHE = {
+    'CACHE': 'default',
+    'TIMEOUT': 60 * 60 * 24 * 7,
+}
+CHEF_CO_WARM_PARTY_SIZES = [75, 150, 200, 300]
+CHEF_CO_WARM_TOP_SIZES = 5  # Also warm the most frequently ordered sizes per menu
+CHEF_CO_WARM_MODE = None  # Defaults to CHEF_CO_PREDICTION_MODE
+CHEF_CO_WARM_ON_CHANGE = os.environ.get('CHEF_CO_WARM_ON_CHANGE', '').lower() in ('1', 'true', 'yes')
+CHEF_CO_WARM_DELAY = 5.0  # Seconds to wait for further edits before warming
+
+# Cached token authentication: in-process LRU plus an optional shared cache alias
+CHEF_CO_TOKEN_CACHE = {
+    'MAX_ENTRIES': 1024,
+    'TTL': 60,  # Seconds; also bounds how long other workers may serve a revoked token
+    'CACHE': None,
+}
+
+# Seconds the sync change feed trails the clock, covering transactions that are still committing
+CHEF_CO_SYNC_LAG = 5
+# Most rows one change feed response returns; clients follow has_more for the rest
+CHEF_CO_SYNC_PAGE_SIZE = 1000
+
+# Patch the changed item lines of stored predictions when a reference changes, in a
+# background thread once no further change has been made for CHEF_CO_RECOMPUTE_DELAY seconds
+# (or when the process exits, whichever comes first)
+CHEF_CO_RECOMPUTE_ON_CHANGE = True
+CHEF_CO_RECOMPUTE_DELAY = 5.0
+
+# Applied by `manage.py archive_predictions`; CODEC defaults to zstd when zstandard is installed, else gzip
+CHEF_CO_PREDICTION_RETENTION = {
+    'ARCHIVE_AFTER_DAYS': 90,  # Compress payloads into the archive table, keeping a slim index row
+    'DELETE_AFTER_DAYS': None,  # Delete predictions entirely; None keeps them forever
+    'RESTORE_ON_READ': True,  # Move an archived payload back when the prediction is retrieved
+}
+
+# LLM routes from cheapest to most capable (see chef_co/routing.py). Prices are USD per
+# million tokens; `fallback` names the route to retry with when an answer fails validation
+CHEF_CO_LLM_ROUTES = [
+    {'name': 'small', 'model': 'gpt-4o-mini', 'max_items': 40, 'max_tokens': 2000, 'chunk_items': None,
+     'latency_ms': 3000, 'prompt_price': 0.15, 'completion_price': 0.60, 'fallback': 'large'},
+    {'name': 'large', 'model': 'gpt-4o', 'max_items': None, 'max_tokens': 4000, 'chunk_items': 80,
+     'latency_ms': 8000, 'prompt_price': 2.50, 'completion_price': 10.00, 'fallback': None},
+]
+
+# Admission control for the prediction actions, shared by all workers through the database
+CHEF_CO_ADMISSION = {
+    'USER_RATE_PER_MINUTE': 30,  # Token bucket per user (or client address); None disables it
+    'USER_BURST': 10,
+    'GLOBAL_RATE_PER_MINUTE': 300,  # Token bucket for the whole site
+    'GLOBAL_BURST': 60,
+    'USER_CONCURRENCY': 2,  # Predictions one client may have running or queued
+    'GLOBAL_CONCURRENCY': 8,  # Predictions running at once; the rest queue fairly across users
+    'QUEUE_TIMEOUT': 10,  # Seconds a request waits for a slot before 429
+}
+
+# Staff can profile a request with `X-Chef-Profile: 1` (or `download`) or `?profile=1`
+CHEF_CO_PROFILING = {
+    'ENABLED': True,
+    'EXPLAIN_SLOWEST': 5,  # Slowest SELECTs to run EXPLAIN on
+}
+
+# Checks applied to every prediction before it is cached or saved
+CHEF_CO_VALIDATION = {
+    'TOLERANCE': 0.1,  # Relative distance allowed from the interpolated value
+    'REPAIR': True,  # Fix issues locally; False only records them
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -126,6 +225,15 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Swagger UI and ReDoc read the prebuilt schema (manage.py generate_openapi_schema)
+SWAGGER_SETTINGS = {
+    'SPEC_URL': ('schema-json', {'format': '.json'}),
+}
+REDOC_SETTINGS = {
+    'SPEC_URL': ('schema-json', {'format': '.json'}),
+}
+CHEF_CO_SCHEMA_MAX_AGE = 3600
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -134,11 +242,23 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Django REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'chef_co.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',  # Explicitly set to allow any access
     ],
+    # orjson-backed JSON (falls back to the stdlib when orjson is missing) plus MessagePack when installed
+    'DEFAULT_RENDERER_CLASSES': [
+        'chef_co.renderers.ORJSONRenderer',
+        *(['chef_co.renderers.MessagePackRenderer'] if find_spec('msgpack') else []),
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'chef_co.renderers.ORJSONParser',
+        *(['chef_co.renderers.MessagePackParser'] if find_spec('msgpack') else []),
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10
 }
@@ -17,13 +17,10 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include, re_path
 from rest_framework.authtoken.views import obtain_auth_token
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
-from rest_framework import permissions
 from drf_yasg.utils import swagger_auto_schema
-from rest_framework.decorators import api_view
-from rest_framework.authtoken.serializers import AuthTokenSerializer
 from chef_co.apiutils import token_response, tags
+from chef_co.schema import schema_ui_view
+from chef_co.views import openapi_schema
 
 # Decorate token view for swagger docs
 decorated_obtain_auth_token = swagger_auto_schema(
@@ -34,20 +31,6 @@ decorated_obtain_auth_token = swagger_auto_schema(
     tags=[tags['auth']]
 )(obtain_auth_token)
 
-# Create a schema view for Swagger UI
-schema_view = get_schema_view(
-    openapi.Info(
-        title="Chef Co API",
-        default_version='v1',
-        description="API for Chef Co menu and quantity prediction service",
-        terms_of_service="https://www.example.com/terms/",
-        contact=openapi.Contact(email="contact@example.com"),
-        license=openapi.License(name="BSD License"),
-    ),
-    public=True,
-    permission_classes=[permissions.AllowAny],
-)
-
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('chef_co.urls')),  # Include our app's URLs
@@ -55,7 +38,8 @@ urlpatterns = [
     path('api-token-auth/', decorated_obtain_auth_token),  # Token authentication
     
     # Swagger UI endpoints
-    re_path(r'^swagger(?P<format>\.json|\.yaml)$', schema_view.without_ui(cache_timeout=0), name='schema-json'),
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+    re_path(r'^swagger(?P<format>\.json|\.yaml)$', openapi_schema, name='schema-json'),
+    # The UI pages load the prebuilt schema from /swagger.json
+    path('swagger/', schema_ui_view('swagger'), name='schema-swagger-ui'),
+    path('redoc/', schema_ui_view('redoc'), name='schema-redoc'),
 ]
@@ -1,9 +1,20 @@
 from django.contrib import admin
-from .models import Menu, Course, MenuItem, QuantityReference, PartyOrder, PredictionResult
+from .models import (
+    Menu, Course, MenuItem, QuantityReference, PartyOrder, PredictionResult, Ingredient, Recipe, RecipeLine,
+    Event, ProfileReport
+)
+from .archive import result_data_of
 from django import forms
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import CharField, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Concat
 from django.shortcuts import render, redirect
-from django.urls import path
+from django.urls import path, reverse
+from django.utils.functional import cached_property
+from django.utils.html import format_html
 import csv
+import json
 from io import TextIOWrapper
 from decimal import Decimal
 import re
@@ -13,6 +24,60 @@ class CSVUploadForm(forms.Form):
     csv_file = forms.FileField()
 
 
+def estimate_row_count(model, using):
+    """
+    The database's own row estimate for a table, or None where the backend has none.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                "SELECT table_rows FROM information_schema.tables "
+                "WHERE table_schema = DATABASE() AND table_name = %s", [table]
+            )
+        else:
+            return None
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] is not None and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Use the planner's estimate instead of COUNT(*) for unfiltered changelists of large tables.
+    """
+    estimate_threshold = 10000
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            estimate = estimate_row_count(self.object_list.model, self.object_list.db)
+            if estimate is not None and estimate >= self.estimate_threshold:
+                return estimate
+        return super().count
+
+
+class CourseFieldListFilter(admin.RelatedFieldListFilter):
+    """
+    Course filter whose choices load their menus in the same query (Course.__str__ shows the menu).
+    """
+
+    def field_choices(self, field, request, model_admin):
+        ordering = self.field_admin_ordering(field, request, model_admin) or ('menu__name', 'order', 'name')
+        return [(course.pk, str(course)) for course in Course.objects.select_related('menu').order_by(*ordering)]
+
+
+class ScalableModelAdmin(admin.ModelAdmin):
+    """
+    Changelist defaults for large tables: estimated totals and no second COUNT(*) for the unfiltered total.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
 class CourseInline(admin.TabularInline):
     model = Course
     extra = 1
@@ -29,33 +94,45 @@ class QuantityReferenceInline(admin.TabularInline):
 
 
 @admin.register(Menu)
-class MenuAdmin(admin.ModelAdmin):
+class MenuAdmin(ScalableModelAdmin):
     list_display = ('name', 'created_by', 'created_at')
+    list_select_related = ('created_by',)
     search_fields = ('name', 'description')
+    autocomplete_fields = ('created_by',)
     inlines = [CourseInline]
 
 
 @admin.register(Course)
-class CourseAdmin(admin.ModelAdmin):
+class CourseAdmin(ScalableModelAdmin):
     list_display = ('name', 'menu', 'order')
+    list_select_related = ('menu',)
     list_filter = ('menu',)
-    search_fields = ('name',)
+    search_fields = ('name', 'menu__name')
+    autocomplete_fields = ('menu',)
     inlines = [MenuItemInline]
 
+    def get_queryset(self, request):
+        # Also used for autocomplete results, which render Course.__str__
+        return super().get_queryset(request).select_related('menu')
+
 
 @admin.register(MenuItem)
-class MenuItemAdmin(admin.ModelAdmin):
+class MenuItemAdmin(ScalableModelAdmin):
     list_display = ('name', 'course')
-    list_filter = ('course__menu', 'course')
+    list_select_related = ('course__menu',)
+    list_filter = ('course__menu', ('course', CourseFieldListFilter))
     search_fields = ('name',)
+    autocomplete_fields = ('course',)
     inlines = [QuantityReferenceInline]
 
 
 @admin.register(QuantityReference)
-class QuantityReferenceAdmin(admin.ModelAdmin):
+class QuantityReferenceAdmin(ScalableModelAdmin):
     list_display = ('menu_item', 'party_size', 'quantity_value', 'unit')
-    list_filter = ('menu_item__course__menu', 'menu_item__course', 'party_size')
+    list_select_related = ('menu_item',)
+    list_filter = ('menu_item__course__menu', ('menu_item__course', CourseFieldListFilter), 'party_size')
     search_fields = ('menu_item__name',)
+    autocomplete_fields = ('menu_item',)
     
     def get_urls(self):
         urls = super().get_urls()
@@ -184,35 +261,130 @@ class QuantityReferenceAdmin(admin.ModelAdmin):
         return super().changelist_view(request, extra_context=extra_context)
 
 
+class RecipeLineInline(admin.TabularInline):
+    model = RecipeLine
+    fk_name = 'recipe'
+    extra = 1
+    autocomplete_fields = ('ingredient', 'sub_recipe')
+
+
+@admin.register(Ingredient)
+class IngredientAdmin(ScalableModelAdmin):
+    list_display = ('name', 'unit')
+    search_fields = ('name',)
+
+
+@admin.register(Recipe)
+class RecipeAdmin(ScalableModelAdmin):
+    list_display = ('name', 'menu_item', 'yield_quantity', 'yield_unit')
+    list_select_related = ('menu_item__course',)
+    search_fields = ('name', 'menu_item__name')
+    autocomplete_fields = ('menu_item',)
+    inlines = [RecipeLineInline]
+
+
+class EventOrderInline(admin.TabularInline):
+    model = PartyOrder
+    fields = ('menu', 'party_size', 'user')
+    extra = 1
+    autocomplete_fields = ('menu', 'user')
+
+
+@admin.register(Event)
+class EventAdmin(ScalableModelAdmin):
+    list_display = ('name', 'user', 'event_date', 'created_at')
+    list_select_related = ('user',)
+    list_filter = ('event_date',)
+    search_fields = ('name', 'user__username')
+    autocomplete_fields = ('user',)
+    inlines = [EventOrderInline]
+
+
 @admin.register(PartyOrder)
-class PartyOrderAdmin(admin.ModelAdmin):
+class PartyOrderAdmin(ScalableModelAdmin):
     list_display = ('menu', 'user', 'party_size', 'created_at')
-    list_filter = ('menu', 'user', 'created_at')
+    list_select_related = ('menu', 'user')
+    list_filter = ('menu', ('user', admin.RelatedOnlyFieldListFilter), 'created_at')
     search_fields = ('menu__name', 'user__username')
+    autocomplete_fields = ('menu', 'user')
+    raw_id_fields = ('event',)
 
 
 @admin.register(PredictionResult)
-class PredictionResultAdmin(admin.ModelAdmin):
-    list_display = ('name', 'party_order', 'created_at')
-    list_filter = ('party_order__menu', 'party_order__user', 'created_at')
+class PredictionResultAdmin(ScalableModelAdmin):
+    list_display = ('name', 'party_order', 'created_at', 'validation_status')
+    list_select_related = ('party_order__menu',)
+    list_filter = (
+        'party_order__menu', ('party_order__user', admin.RelatedOnlyFieldListFilter), 'created_at',
+        'validation_status', ('archived_at', admin.EmptyFieldListFilter)
+    )
     search_fields = ('name', 'party_order__menu__name')
-    readonly_fields = ('result_data', 'party_order', 'created_at')
+    exclude = ('payload', 'archive')  # Shown through result_preview
+    readonly_fields = (
+        'result_preview', 'party_order', 'created_at', 'archived_at',
+        'prompt_tokens', 'completion_tokens', 'llm_latency_ms', 'validation_status'
+    )
+    raw_id_fields = ('party_order',)
     actions = ['update_prediction_names']
+    preview_chars = 5000
+    
+    def get_queryset(self, request):
+        # The payload can be large; only the detail page loads it, for the preview
+        return super().get_queryset(request).select_related('party_order__menu')
+    
+    @admin.display(description='Result data')
+    def result_preview(self, obj):
+        """
+        Show the start of the prediction JSON; the full document is served by the API.
+        """
+        text = json.dumps(result_data_of(obj), indent=2)
+        if len(text) <= self.preview_chars:
+            return format_html('<pre>{}</pre>', text)
+        return format_html(
+            '<pre>{}\n…</pre><p>Truncated, {} characters in total. '
+            '<a href="{}">Full prediction</a></p>',
+            text[:self.preview_chars], len(text), reverse('predicted_quantities-detail', args=[obj.pk])
+        )
     
     def update_prediction_names(self, request, queryset):
         """
         Update prediction names to use their party order string representations.
         """
-        updated = 0
-        for prediction in queryset:
-            if prediction.name == 'string':
-                prediction.name = str(prediction.party_order)
-                prediction.save()
-                updated += 1
+        # Same text as PartyOrder.__str__, built in SQL so this is a single UPDATE
+        order_names = PartyOrder.objects.filter(pk=OuterRef('party_order_id')).annotate(
+            label=Concat(
+                'menu__name', Value(' for '), Cast('party_size', CharField()), Value(' people'),
+                output_field=CharField()
+            )
+        ).values('label')[:1]
+        updated = queryset.filter(name='string').update(name=Subquery(order_names))
         
         if updated == 0:
             self.message_user(request, "No predictions required name updates.", level='INFO')
         else:
             self.message_user(request, f"Successfully updated names for {updated} predictions.", level='SUCCESS')
     
-    update_prediction_names.short_description = "Update selected predictions with party order names"
\ No newline at end of file
+    update_prediction_names.short_description = "Update selected predictions with party order names"
+
+
+@admin.register(ProfileReport)
+class ProfileReportAdmin(ScalableModelAdmin):
+    list_display = ('path', 'method', 'status_code', 'duration_ms', 'query_count', 'user', 'created_at')
+    list_select_related = ('user',)
+    list_filter = ('method', 'created_at')
+    search_fields = ('path',)
+    exclude = ('queries', 'profile')
+    readonly_fields = (
+        'download', 'user', 'method', 'path', 'status_code', 'duration_ms', 'query_count', 'query_ms', 'created_at'
+    )
+    
+    def get_queryset(self, request):
+        # Query lists and profiles are only needed for the download
+        return super().get_queryset(request).defer('queries', 'profile')
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def download(self, obj):
+        return format_html('<a href="{}">Download report</a>', reverse('profile-report', args=[obj.pk]))
+
@@ -0,0 +1,211 @@
+"""
+Admission control for the prediction actions.
+
+Each client (the user when authenticated, otherwise its address) and the
+site as a whole have a token bucket: a request takes a token from both or
+is refused with 429 and a Retry-After of when both will have one again.
+Admitted requests then take a lease. A client may hold ``USER_CONCURRENCY``
+leases at once, and at most ``GLOBAL_CONCURRENCY`` of them run at a time.
+The others wait up to ``QUEUE_TIMEOUT`` seconds for a slot, and freed slots
+go first to the waiters whose client has the fewest requests running, so
+one client looping on the endpoint cannot hold everyone else back.
+
+Buckets and leases live in the database so every worker shares them.
+Leases expire after ``LEASE_TIMEOUT`` seconds, releasing the slots of
+workers that died mid-request.
+"""
+import functools
+import math
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.throttling import BaseThrottle
+
+from .metrics import admission_decisions, admission_queue_depth, admission_wait
+from .models import AdmissionLease, RateLimitBucket
+
+
+DEFAULTS = {
+    'ENABLED': True,
+    'USER_RATE_PER_MINUTE': 30,  # None disables the bucket
+    'USER_BURST': 10,
+    'GLOBAL_RATE_PER_MINUTE': 300,
+    'GLOBAL_BURST': 60,
+    'USER_CONCURRENCY': 2,
+    'GLOBAL_CONCURRENCY': 8,
+    'QUEUE_TIMEOUT': 10,
+    'POLL_INTERVAL': 0.25,
+    'LEASE_TIMEOUT': 600,
+}
+
+GLOBAL_KEY = '*'
+
+
+def admission_settings():
+    return {**DEFAULTS, **getattr(settings, 'CHEF_CO_ADMISSION', {})}
+
+
+class AdmissionDenied(Exception):
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+def client_key(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    return f"ip:{BaseThrottle().get_ident(request)}"
+
+
+def take_token(key, config, now=None):
+    """
+    Take a token from the client's bucket and the global one, or from neither.
+    Returns 0 when taken, else the seconds until both have a token.
+    """
+    now = now or time.time()
+    limits = [
+        (key, config['USER_RATE_PER_MINUTE'], config['USER_BURST']),
+        (GLOBAL_KEY, config['GLOBAL_RATE_PER_MINUTE'], config['GLOBAL_BURST']),
+    ]
+    limits = [limit for limit in limits if limit[1] is not None]
+    if not limits:
+        return 0
+
+    wait = 0
+    with transaction.atomic():
+        buckets = RateLimitBucket.objects.select_for_update().in_bulk([bucket_key for bucket_key, _, _ in limits])
+        for bucket_key, rate_per_minute, burst in limits:
+            bucket = buckets.get(bucket_key)
+            if bucket is None:
+                bucket, _ = RateLimitBucket.objects.get_or_create(
+                    key=bucket_key, defaults={'tokens': burst, 'updated_at': now}
+                )
+                buckets[bucket_key] = bucket
+            rate = rate_per_minute / 60
+            bucket.tokens = min(burst, bucket.tokens + max(0.0, now - bucket.updated_at) * rate)
+            bucket.updated_at = now
+            if bucket.tokens < 1:
+                wait = max(wait, (1 - bucket.tokens) / rate)
+        if not wait:
+            for bucket in buckets.values():
+                bucket.tokens -= 1
+        RateLimitBucket.objects.bulk_update(buckets.values(), ['tokens', 'updated_at'])
+    return wait
+
+
+def _active(now):
+    return AdmissionLease.objects.filter(expires_at__gt=now)
+
+
+def _try_start(lease, config):
+    """
+    Start ``lease`` when it is among the first waiters for the free slots,
+    ranked by how many requests their client has running, then by age.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        waiting = list(
+            _active(now).select_for_update().filter(state=AdmissionLease.WAITING)
+            .order_by('created_at', 'pk').values_list('pk', 'key')
+        )
+        running = dict(
+            _active(now).filter(state=AdmissionLease.RUNNING)
+            .values_list('key').annotate(count=Count('pk')).values_list('key', 'count')
+        )
+        admission_queue_depth.set(len(waiting))
+        free = config['GLOBAL_CONCURRENCY'] - sum(running.values())
+        # sorted() is stable, so ties keep their arrival order
+        ranked = [pk for pk, key in sorted(waiting, key=lambda entry: running.get(entry[1], 0))]
+        if lease.pk not in ranked[:max(0, free)]:
+            return False
+        AdmissionLease.objects.filter(pk=lease.pk).update(
+            state=AdmissionLease.RUNNING, expires_at=now + timedelta(seconds=config['LEASE_TIMEOUT'])
+        )
+        admission_queue_depth.set(len(waiting) - 1)
+        return True
+
+
+def acquire(key, config):
+    """
+    Take a running lease for ``key``, queueing for up to ``QUEUE_TIMEOUT`` seconds.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        AdmissionLease.objects.filter(expires_at__lte=now).delete()
+        if _active(now).filter(key=key).count() >= config['USER_CONCURRENCY']:
+            admission_decisions.inc(outcome='concurrency_limited')
+            raise AdmissionDenied("Too many prediction requests in progress for this client.", config['POLL_INTERVAL'])
+        lease = AdmissionLease.objects.create(
+            key=key, state=AdmissionLease.WAITING, expires_at=now + timedelta(seconds=config['LEASE_TIMEOUT'])
+        )
+
+    start = time.monotonic()
+    while not _try_start(lease, config):
+        if time.monotonic() - start >= config['QUEUE_TIMEOUT']:
+            AdmissionLease.objects.filter(pk=lease.pk).delete()
+            admission_decisions.inc(outcome='queue_timeout')
+            raise AdmissionDenied("The prediction service is busy.", config['QUEUE_TIMEOUT'])
+        time.sleep(config['POLL_INTERVAL'])
+    admission_wait.observe(time.monotonic() - start)
+    return lease
+
+
+@contextmanager
+def admit(request, config=None):
+    """
+    Hold an admission slot for the duration of the block, or raise AdmissionDenied.
+    """
+    config = config or admission_settings()
+    if not config['ENABLED']:
+        yield
+        return
+
+    key = client_key(request)
+    wait = take_token(key, config)
+    if wait:
+        admission_decisions.inc(outcome='rate_limited')
+        raise AdmissionDenied("Prediction rate limit exceeded.", wait)
+    lease = acquire(key, config)
+    admission_decisions.inc(outcome='admitted')
+    try:
+        yield
+    finally:
+        AdmissionLease.objects.filter(pk=lease.pk).delete()
+
+
+def admission_controlled(view_method):
+    """
+    Run a detail action under admit(), answering 429 with Retry-After when refused.
+
+    The object is looked up and permission-checked first, so requests for
+    missing or forbidden objects get their 404 or 403 without spending
+    quota. It is passed to the action after the request.
+    """
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        instance = self.get_object()
+        try:
+            with admit(request):
+                return view_method(self, request, instance, *args, **kwargs)
+        except AdmissionDenied as e:
+            response = Response({"error": str(e)}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+            response['Retry-After'] = str(e.retry_after)
+            return response
+    return wrapper
+
+
+def refresh_queue_depth():
+    """
+    Set the queue depth gauge from the leases currently waiting.
+    """
+    depth = _active(timezone.now()).filter(state=AdmissionLease.WAITING).count()
+    admission_queue_depth.set(depth)
+    return depth
@@ -14,6 +14,36 @@ token_response = openapi.Response(
     )
 )
 
+bulk_upsert_response = openapi.Response(
+    description="Per-row upsert status with totals",
+    schema=openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        properties={
+            'created': openapi.Schema(type=openapi.TYPE_INTEGER),
+            'updated': openapi.Schema(type=openapi.TYPE_INTEGER),
+            'unchanged': openapi.Schema(type=openapi.TYPE_INTEGER),
+            'error': openapi.Schema(type=openapi.TYPE_INTEGER),
+            'results': openapi.Schema(
+                type=openapi.TYPE_ARRAY,
+                items=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'index': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        'id': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        'menu_item': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        'party_size': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        'status': openapi.Schema(
+                            type=openapi.TYPE_STRING,
+                            enum=['created', 'updated', 'unchanged', 'error', 'skipped']
+                        ),
+                        'errors': openapi.Schema(type=openapi.TYPE_OBJECT),
+                    }
+                )
+            ),
+        }
+    )
+)
+
 # Parameter schemas
 party_size_param = openapi.Parameter(
     'party_size', 
@@ -38,6 +68,111 @@ prediction_name_param = openapi.Parameter(
     type=openapi.TYPE_STRING
 )
 
+bulk_atomic_param = openapi.Parameter(
+    'atomic',
+    openapi.IN_QUERY,
+    description="Reject the whole batch if any row is invalid (true/false)",
+    type=openapi.TYPE_BOOLEAN,
+    default=False
+)
+
+since_cursor_param = openapi.Parameter(
+    'since',
+    openapi.IN_QUERY,
+    description="Cursor returned by the previous sync; omit for a full snapshot",
+    type=openapi.TYPE_STRING
+)
+
+sync_limit_param = openapi.Parameter(
+    'limit',
+    openapi.IN_QUERY,
+    description="Maximum rows per page, up to CHEF_CO_SYNC_PAGE_SIZE (the default)",
+    type=openapi.TYPE_INTEGER
+)
+
+autocomplete_params = [
+    openapi.Parameter(
+        'q', openapi.IN_QUERY, description="Prefix of an item name, a word in it, or a course name",
+        type=openapi.TYPE_STRING, required=True
+    ),
+    openapi.Parameter(
+        'limit', openapi.IN_QUERY, description="Maximum number of results (1-50)",
+        type=openapi.TYPE_INTEGER, default=10
+    ),
+    openapi.Parameter(
+        'menu', openapi.IN_QUERY, description="Only return items of this menu",
+        type=openapi.TYPE_INTEGER
+    ),
+]
+
+autocomplete_response = openapi.Response(
+    description="Matching items as [id, name, course_id, course_name] tuples",
+    schema=openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        properties={
+            'fields': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_STRING)),
+            'results': openapi.Schema(
+                type=openapi.TYPE_ARRAY,
+                items=openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_STRING))
+            ),
+        }
+    )
+)
+
+party_order_ids_param = openapi.Parameter(
+    'ids',
+    openapi.IN_QUERY,
+    description="Comma-separated party order ids; the latest prediction of each is used",
+    type=openapi.TYPE_STRING,
+    required=True
+)
+
+export_params = [
+    openapi.Parameter(
+        'file', openapi.IN_QUERY, description="File type to stream",
+        type=openapi.TYPE_STRING, enum=['csv', 'xlsx'], default='csv'
+    ),
+    openapi.Parameter(
+        'ids', openapi.IN_QUERY, description="Comma-separated prediction ids; default is every prediction",
+        type=openapi.TYPE_STRING
+    ),
+]
+
+shopping_list_response = openapi.Response(
+    description="Raw ingredient totals expanded through the recipes of the predicted items",
+    schema=openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        properties={
+            'predictions': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_INTEGER)),
+            'ingredients': openapi.Schema(
+                type=openapi.TYPE_ARRAY,
+                items=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'id': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        'name': openapi.Schema(type=openapi.TYPE_STRING),
+                        'unit': openapi.Schema(type=openapi.TYPE_STRING),
+                        'quantity': openapi.Schema(type=openapi.TYPE_NUMBER),
+                    }
+                )
+            ),
+            'unmatched': openapi.Schema(
+                type=openapi.TYPE_ARRAY,
+                items=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'course_name': openapi.Schema(type=openapi.TYPE_STRING),
+                        'item_name': openapi.Schema(type=openapi.TYPE_STRING),
+                        'unit': openapi.Schema(type=openapi.TYPE_STRING),
+                        'quantity_value': openapi.Schema(type=openapi.TYPE_NUMBER),
+                        'reason': openapi.Schema(type=openapi.TYPE_STRING),
+                    }
+                )
+            ),
+        }
+    )
+)
+
 # Request body schemas
 rename_prediction_schema = openapi.Schema(
     type=openapi.TYPE_OBJECT,
@@ -53,10 +188,65 @@ prediction_name_schema = openapi.Schema(
         'name': openapi.Schema(
             type=openapi.TYPE_STRING,
             description="Optional name for the prediction"
+        ),
+        'mode': openapi.Schema(
+            type=openapi.TYPE_STRING,
+            enum=['llm', 'hybrid'],
+            description=(
+                "llm sends the whole menu to the AI model; hybrid computes items with full reference "
+                "coverage locally and only asks the model for the rest"
+            )
+        ),
+        'latency_budget_ms': openapi.Schema(
+            type=openapi.TYPE_NUMBER,
+            description=(
+                "Optional time budget for the model calls; picks the cheapest route in "
+                "CHEF_CO_LLM_ROUTES expected to answer within it"
+            )
         )
     }
 )
 
+event_prediction_response = openapi.Response(
+    description="One prediction per menu line plus quantities merged per item and unit",
+    schema=openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        properties={
+            'event': openapi.Schema(type=openapi.TYPE_INTEGER),
+            'mode': openapi.Schema(type=openapi.TYPE_STRING),
+            'usage': openapi.Schema(type=openapi.TYPE_OBJECT),
+            'menus': openapi.Schema(
+                type=openapi.TYPE_ARRAY,
+                items=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'party_order': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        'menu': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        'menu_name': openapi.Schema(type=openapi.TYPE_STRING),
+                        'party_size': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        'prediction_id': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        'cached': openapi.Schema(type=openapi.TYPE_BOOLEAN),
+                        'validation_status': openapi.Schema(type=openapi.TYPE_STRING),
+                        'data': openapi.Schema(type=openapi.TYPE_OBJECT),
+                    }
+                )
+            ),
+            'totals': openapi.Schema(
+                type=openapi.TYPE_ARRAY,
+                items=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'item_name': openapi.Schema(type=openapi.TYPE_STRING),
+                        'unit': openapi.Schema(type=openapi.TYPE_STRING),
+                        'quantity_value': openapi.Schema(type=openapi.TYPE_NUMBER),
+                        'menus': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_INTEGER)),
+                    }
+                )
+            ),
+        }
+    )
+)
+
 # Standard API tags
 tags = {
     'auth': 'Authentication',
@@ -65,5 +255,15 @@ tags = {
     'menu_items': 'Menu Items',
     'quantity_references': 'Quantity References',
     'party_orders': 'Party Orders',
+    'events': 'Events',
     'predictions': 'Predictions',
-} 
\ No newline at end of file
+    'sync': 'Sync',
+} 
+
+admission_response = openapi.Response(
+    description="Rate or concurrency limit exceeded; retry after the number of seconds in the Retry-After header",
+    schema=openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        properties={'error': openapi.Schema(type=openapi.TYPE_STRING)}
+    )
+)
@@ -7,6 +7,7 @@ class ChefCoConfig(AppConfig):
     verbose_name = 'Chef Co - Menu Planner'
     
     def ready(self):
+        from . import signals  # noqa: F401 - registers the model signal handlers
         from django.db.models.signals import post_migrate
         from django.dispatch import receiver
         
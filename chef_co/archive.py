@@ -0,0 +1,195 @@
+"""
+Retention and archival of stored predictions.
+
+Predictions older than ``ARCHIVE_AFTER_DAYS`` have their JSON payload
+compressed into ArchivedPayload and emptied from PredictionResult, which
+stays behind as a slim index row (name, order, usage, timestamps) so lists,
+searches and backups of the prediction table stay small. Like live
+payloads, archives are keyed by content digest, so predictions sharing a
+payload share one compressed copy. Payloads and archives no longer
+referenced by any prediction are then deleted. Archived payloads are read
+back transparently, and by default restored when a prediction is retrieved
+again. Predictions older than ``DELETE_AFTER_DAYS`` are deleted.
+
+zstd is used when the ``zstandard`` package is installed, gzip otherwise;
+each archive row records its codec, so either can be read back later.
+"""
+import gzip
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ArchivedPayload, PredictionPayload, PredictionResult
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - exercised only without zstandard
+    zstandard = None
+
+
+DEFAULTS = {
+    'ARCHIVE_AFTER_DAYS': 90,
+    'DELETE_AFTER_DAYS': None,
+    'CODEC': 'zstd' if zstandard is not None else 'gzip',
+    'RESTORE_ON_READ': True,
+}
+
+CODECS = ('gzip', 'zstd')
+
+
+def retention_settings():
+    return {**DEFAULTS, **getattr(settings, 'CHEF_CO_PREDICTION_RETENTION', {})}
+
+
+def compress(data, codec):
+    if codec == 'gzip':
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    if codec == 'zstd':
+        if zstandard is None:
+            raise ValueError("The zstd codec needs the zstandard package")
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    raise ValueError(f"Unknown codec: {codec}")
+
+
+def decompress(data, codec):
+    data = bytes(data)
+    if codec == 'gzip':
+        return gzip.decompress(data)
+    if codec == 'zstd':
+        if zstandard is None:
+            raise ValueError("Reading zstd archives needs the zstandard package")
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"Unknown codec: {codec}")
+
+
+def archive_predictions(cutoff, codec=None, batch_size=500, dry_run=False):
+    """
+    Compress the payloads of predictions created before ``cutoff``, once per digest.
+    Returns the number of predictions archived and the raw and compressed
+    sizes of the archives written.
+    """
+    codec = codec or retention_settings()['CODEC']
+    report = {'dry_run': dry_run, 'codec': codec, 'archived': 0, 'raw_bytes': 0, 'compressed_bytes': 0}
+    candidates = PredictionResult.objects.filter(
+        created_at__lt=cutoff, archived_at__isnull=True, payload__isnull=False
+    )
+
+    last_pk = 0
+    while True:
+        batch = list(
+            candidates.filter(pk__gt=last_pk).order_by('pk').values_list('pk', 'payload_id')[:batch_size]
+        )
+        if not batch:
+            if not dry_run:
+                collect_payloads()
+            return report
+        last_pk = batch[-1][0]
+        report['archived'] += len(batch)
+
+        digests = {digest for _, digest in batch}
+        # Digests archived by an earlier batch or run are reused as they are
+        existing = set(ArchivedPayload.objects.filter(pk__in=list(digests)).values_list('pk', flat=True))
+        archives = _compress_payloads(digests - existing, codec, report)
+        if dry_run:
+            continue
+
+        with transaction.atomic():
+            kept = set(ArchivedPayload.objects.select_for_update().filter(pk__in=existing).values_list('pk', flat=True))
+            # Archives collected since they were looked up are written again
+            archives += _compress_payloads(existing - kept, codec, report)
+            ArchivedPayload.objects.bulk_create(archives, ignore_conflicts=True)
+            # archive_id is set first: MySQL evaluates assignments left to right
+            PredictionResult.objects.filter(pk__in=[pk for pk, _ in batch]).update(
+                archive_id=F('payload_id'), payload=None, archived_at=timezone.now()
+            )
+
+
+def _compress_payloads(digests, codec, report):
+    archives = []
+    for digest, result_data in PredictionPayload.objects.filter(pk__in=list(digests)).values_list('digest', 'data'):
+        raw = json.dumps(result_data, separators=(',', ':')).encode('utf-8')
+        payload = compress(raw, codec)
+        report['raw_bytes'] += len(raw)
+        report['compressed_bytes'] += len(payload)
+        archives.append(ArchivedPayload(digest=digest, codec=codec, payload=payload, raw_size=len(raw)))
+    return archives
+
+
+def delete_predictions(cutoff, dry_run=False):
+    """
+    Delete predictions, archived or not, created before ``cutoff``.
+    """
+    expired = PredictionResult.objects.filter(created_at__lt=cutoff)
+    if dry_run:
+        return expired.count()
+    deleted = expired.delete()[1].get(PredictionResult._meta.label, 0)
+    collect_payloads()
+    return deleted
+
+
+def collect_payloads():
+    """
+    Delete payloads and archives that no prediction points to any more.
+
+    Candidates are locked first, skipping those a concurrent save has just
+    matched in PredictionPayload.intern(); a save that matches a payload
+    after it is locked here waits, finds it gone and inserts it again.
+    """
+    deleted = 0
+    for model in (PredictionPayload, ArchivedPayload):
+        with transaction.atomic():
+            orphans = list(
+                model.objects.select_for_update(skip_locked=True, of=('self',)).filter(predictions__isnull=True)
+                .values_list('pk', flat=True)
+            )
+            # Checked again under the lock, against rows committed since
+            deleted += model.objects.filter(pk__in=orphans, predictions__isnull=True).delete()[0]
+    return deleted
+
+
+def apply_retention(config=None, now=None, dry_run=False, batch_size=500):
+    """
+    Archive and delete according to ``CHEF_CO_PREDICTION_RETENTION``, or
+    ``config`` when given. A day count of None disables that step.
+    """
+    config = config or retention_settings()
+    now = now or timezone.now()
+    report = {'archived': None, 'deleted': None}
+    if config['DELETE_AFTER_DAYS'] is not None:
+        report['deleted'] = delete_predictions(now - timedelta(days=config['DELETE_AFTER_DAYS']), dry_run=dry_run)
+    if config['ARCHIVE_AFTER_DAYS'] is not None:
+        report['archived'] = archive_predictions(
+            now - timedelta(days=config['ARCHIVE_AFTER_DAYS']),
+            codec=config['CODEC'], batch_size=batch_size, dry_run=dry_run
+        )
+    return report
+
+
+def result_data_of(prediction):
+    """
+    The prediction's payload, decompressed from its archive when it has been archived.
+    """
+    if prediction.archived_at is None:
+        return prediction.result_data
+    archive = prediction.archive
+    return json.loads(decompress(archive.payload, archive.codec))
+
+
+def restore_prediction(prediction):
+    """
+    Move an archived payload back into the prediction row.
+    """
+    prediction.result_data = result_data_of(prediction)
+    with transaction.atomic():
+        PredictionResult.attach_payloads([prediction])
+        PredictionResult.objects.filter(pk=prediction.pk).update(
+            payload=prediction.payload, archive=None, archived_at=None
+        )
+    # The archive may be shared; collect_payloads() deletes it once nothing points to it
+    prediction.archive = None
+    prediction.archived_at = None
+    return prediction
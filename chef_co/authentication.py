@@ -0,0 +1,134 @@
+"""
+Token authentication without a database query per request.
+
+CachedTokenAuthentication keeps recently seen tokens in a bounded in-process
+LRU and, when ``CHEF_CO_TOKEN_CACHE['CACHE']`` names a cache alias, in a
+shared cache as well. Entries expire after a short TTL. Deleting a token or
+saving its user (e.g. deactivating it) evicts the entry through signals; in
+other worker processes the local entry lives until its TTL runs out.
+"""
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+
+from .metrics import auth_cache_lookups
+
+
+DEFAULTS = {
+    'MAX_ENTRIES': 1024,
+    'TTL': 60,
+    'CACHE': None,
+    'KEY_PREFIX': 'chef_co:token',
+}
+
+
+def token_cache_settings():
+    return {**DEFAULTS, **getattr(settings, 'CHEF_CO_TOKEN_CACHE', {})}
+
+
+class ExpiringLRU:
+    """
+    Thread-safe LRU mapping whose entries expire after a TTL.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl, max_entries):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+local_tokens = ExpiringLRU()
+
+
+def _shared_cache(config):
+    return caches[config['CACHE']] if config['CACHE'] else None
+
+
+def _cache_key(config, key):
+    # Never use the raw token as a key in a shared cache
+    return f"{config['KEY_PREFIX']}:{hashlib.sha256(key.encode()).hexdigest()}"
+
+
+def invalidate_tokens(keys):
+    """
+    Evict tokens from the local LRU and the shared cache.
+    """
+    config = token_cache_settings()
+    cache_keys = [_cache_key(config, key) for key in keys]
+    for cache_key in cache_keys:
+        local_tokens.pop(cache_key)
+    shared = _shared_cache(config)
+    if shared is not None and cache_keys:
+        shared.delete_many(cache_keys)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that answers repeat requests from a cache.
+    Unknown tokens and inactive users still go to the database every time.
+    """
+
+    def authenticate_credentials(self, key):
+        config = token_cache_settings()
+        cache_key = _cache_key(config, key)
+
+        entry = local_tokens.get(cache_key)
+        if entry is not None:
+            auth_cache_lookups.inc(result='local')
+            return self._copy(entry)
+
+        shared = _shared_cache(config)
+        if shared is not None:
+            entry = shared.get(cache_key)
+            if entry is not None:
+                auth_cache_lookups.inc(result='shared')
+                local_tokens.set(cache_key, entry, config['TTL'], config['MAX_ENTRIES'])
+                return self._copy(entry)
+
+        auth_cache_lookups.inc(result='miss')
+        entry = super().authenticate_credentials(key)
+        local_tokens.set(cache_key, entry, config['TTL'], config['MAX_ENTRIES'])
+        if shared is not None:
+            shared.set(cache_key, entry, timeout=config['TTL'])
+        return self._copy(entry)
+
+    @staticmethod
+    def _copy(entry):
+        # Requests must not see each other's changes to request.user
+        user, token = entry
+        return copy.copy(user), copy.copy(token)
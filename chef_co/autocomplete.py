@@ -0,0 +1,234 @@
+"""
+In-memory prefix index for menu item autocomplete.
+
+Normalized item names (and each word within them) and course names are kept
+in sorted arrays, so a prefix lookup is a bisect plus a short scan. The index
+is built from one query on first use. Saves and deletes in this process then
+update it incrementally after commit, and it is rebuilt every
+``CHEF_CO_AUTOCOMPLETE_TTL`` seconds to pick up changes made by other
+processes or by bulk operations that bypass signals. Rebuilds query and sort
+outside the lock and swap the result in, so searches keep using the old index
+meanwhile.
+"""
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+
+from django.conf import settings
+
+from .models import MenuItem
+
+
+def normalize(text):
+    """
+    Casefold, strip accents and collapse whitespace.
+    """
+    decomposed = unicodedata.normalize('NFKD', str(text))
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(stripped.casefold().split())
+
+
+def item_terms(name):
+    """
+    The normalized name plus the remainder from each later word, so "tikka"
+    finds "Chicken Tikka".
+    """
+    words = normalize(name).split()
+    return {' '.join(words[start:]) for start in range(len(words))}
+
+
+class PrefixIndex:
+    """
+    Sorted (term, id) arrays over menu item and course names.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._built_at = None
+        self._replay = None  # changes applied while a rebuild runs, applied again to its result
+        self._reset()
+
+    def _reset(self):
+        self.items = {}         # item id -> (name, course id, menu id)
+        self.courses = {}       # course id -> (name, menu id)
+        self.course_items = {}  # course id -> set of item ids
+        self.item_entries = []    # sorted (term, item id)
+        self.course_entries = []  # sorted (term, course id)
+
+    @property
+    def built(self):
+        return self._built_at is not None
+
+    def is_stale(self):
+        ttl = getattr(settings, 'CHEF_CO_AUTOCOMPLETE_TTL', 300)
+        return not self.built or (ttl is not None and time.monotonic() - self._built_at > ttl)
+
+    def build(self):
+        """
+        Rebuild from the database without holding up searches. One thread
+        rebuilds; the others keep searching the current index, or wait for
+        the first build when there is none yet.
+        """
+        first = not self.built
+        if not self._build_lock.acquire(blocking=first):
+            return
+        try:
+            if first and self.built:
+                return
+            with self._lock:
+                self._replay = []
+            fresh = PrefixIndex()
+            rows = MenuItem.objects.values_list('pk', 'name', 'course_id', 'course__name', 'course__menu_id')
+            for item_id, name, course_id, course_name, menu_id in rows.iterator():
+                fresh._add_course(course_id, course_name, menu_id)
+                fresh._add_item(item_id, name, course_id, menu_id)
+            fresh.item_entries.sort()
+            fresh.course_entries.sort()
+
+            with self._lock:
+                for attr in ('items', 'courses', 'course_items', 'item_entries', 'course_entries'):
+                    setattr(self, attr, getattr(fresh, attr))
+                self._built_at = time.monotonic()
+                # The query may have read the rows before these changes committed
+                for method, args in self._replay:
+                    method(*args)
+        finally:
+            self._replay = None
+            self._build_lock.release()
+
+    def _record(self, method, *args):
+        if self._replay is not None:
+            self._replay.append((method, args))
+
+    def _add_course(self, course_id, name, menu_id, sort=False):
+        if course_id in self.courses:
+            return
+        self.courses[course_id] = (name, menu_id)
+        self.course_items.setdefault(course_id, set())
+        self._insert(self.course_entries, (normalize(name), course_id), sort)
+
+    def _add_item(self, item_id, name, course_id, menu_id, sort=False):
+        self.items[item_id] = (name, course_id, menu_id)
+        self.course_items.setdefault(course_id, set()).add(item_id)
+        for term in item_terms(name):
+            self._insert(self.item_entries, (term, item_id), sort)
+
+    @staticmethod
+    def _insert(entries, entry, sort):
+        # Bulk builds append and sort once at the end
+        if sort:
+            insort(entries, entry)
+        else:
+            entries.append(entry)
+
+    @staticmethod
+    def _discard(entries, entry):
+        position = bisect_left(entries, entry)
+        if position < len(entries) and entries[position] == entry:
+            del entries[position]
+
+    def remove_item(self, item_id):
+        with self._lock:
+            self._record(self._remove_item, item_id)
+            self._remove_item(item_id)
+
+    def upsert_item(self, item_id, name, course_id, course_name, menu_id):
+        with self._lock:
+            self._record(self._upsert_item, item_id, name, course_id, course_name, menu_id)
+            self._upsert_item(item_id, name, course_id, course_name, menu_id)
+
+    def upsert_course(self, course_id, name, menu_id):
+        with self._lock:
+            self._record(self._upsert_course, course_id, name, menu_id)
+            self._upsert_course(course_id, name, menu_id)
+
+    def remove_course(self, course_id):
+        with self._lock:
+            self._record(self._remove_course, course_id)
+            self._remove_course(course_id)
+
+    def _remove_item(self, item_id):
+        current = self.items.pop(item_id, None)
+        if current is None:
+            return
+        name, course_id, _ = current
+        for term in item_terms(name):
+            self._discard(self.item_entries, (term, item_id))
+        self.course_items.get(course_id, set()).discard(item_id)
+
+    def _upsert_item(self, item_id, name, course_id, course_name, menu_id):
+        self._remove_item(item_id)
+        self._upsert_course(course_id, course_name, menu_id)
+        self._add_item(item_id, name, course_id, menu_id, sort=True)
+
+    def _upsert_course(self, course_id, name, menu_id):
+        current = self.courses.get(course_id)
+        if current == (name, menu_id):
+            return
+        if current is not None:
+            self._discard(self.course_entries, (normalize(current[0]), course_id))
+            del self.courses[course_id]
+            # Items carry their menu id for filtering
+            for item_id in self.course_items.get(course_id, ()):
+                item_name, _, _ = self.items[item_id]
+                self.items[item_id] = (item_name, course_id, menu_id)
+        self._add_course(course_id, name, menu_id, sort=True)
+
+    def _remove_course(self, course_id):
+        for item_id in list(self.course_items.pop(course_id, ())):
+            self._remove_item(item_id)
+        current = self.courses.pop(course_id, None)
+        if current is not None:
+            self._discard(self.course_entries, (normalize(current[0]), course_id))
+
+    def search(self, query, limit=10, menu_id=None):
+        """
+        Up to ``limit`` (id, name, course id, course name) tuples whose item
+        name, a word of it, or course name starts with ``query``. Item name
+        matches come first.
+        """
+        prefix = normalize(query)
+        if not prefix:
+            return []
+
+        with self._lock:
+            matched = []
+            seen = set()
+
+            def take(item_id):
+                name, course_id, item_menu = self.items[item_id]
+                if item_id in seen or (menu_id is not None and item_menu != menu_id):
+                    return
+                seen.add(item_id)
+                matched.append((item_id, name, course_id, self.courses[course_id][0]))
+
+            position = bisect_left(self.item_entries, (prefix,))
+            while len(matched) < limit and position < len(self.item_entries):
+                term, item_id = self.item_entries[position]
+                if not term.startswith(prefix):
+                    break
+                take(item_id)
+                position += 1
+
+            position = bisect_left(self.course_entries, (prefix,))
+            while len(matched) < limit and position < len(self.course_entries):
+                term, course_id = self.course_entries[position]
+                if not term.startswith(prefix):
+                    break
+                for item_id in sorted(self.course_items.get(course_id, ())):
+                    if len(matched) >= limit:
+                        break
+                    take(item_id)
+                position += 1
+            return matched
+
+
+index = PrefixIndex()
+
+
+def search_items(query, limit=10, menu_id=None):
+    if index.is_stale():
+        index.build()
+    return index.search(query, limit=limit, menu_id=menu_id)
@@ -0,0 +1,516 @@
+"""
+Benchmark helpers for the chef_co REST API.
+
+Builds synthetic menus at a configurable scale, times every chef_co endpoint,
+the prediction path (with the LLM stubbed out) and both CSV importers, and
+reports latency percentiles, query counts and peak memory so runs can be
+compared between commits.
+"""
+import csv
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from decimal import Decimal
+from unittest import mock
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+
+from .models import Menu, Course, MenuItem, QuantityReference, PartyOrder, PredictionResult
+from .predictions import interpolate_item
+from .scaling import rebuild_item_curves
+from .renderers import ORJSONRenderer, MessagePackRenderer, orjson, msgpack
+from .serializers import QuantityReferenceSerializer, PredictionResultSerializer
+from .warmup import get_prediction_cache
+
+
+DEFAULT_SCALE = {
+    'menus': 1,
+    'courses': 4,
+    'items': 10,
+    'reference_sizes': [50, 100, 250, 500],
+    'orders': 20,
+    'predictions': 50,
+}
+
+PERCENTILES = (50, 90, 95, 99)
+
+# Course names recognised by both CSV importers
+IMPORT_COURSES = ['APPETIZERS', 'MAIN COURSE', 'BREADS', 'DESSERTS']
+
+
+def build_synthetic_menus(menus=1, courses=4, items=10, reference_sizes=(50, 100, 250, 500),
+                          orders=20, predictions=50, user=None):
+    """
+    Populate the database with synthetic menus, references, orders and predictions.
+    Returns a dict with the created user, menus, orders and predictions.
+    """
+    if user is None:
+        user, _ = User.objects.get_or_create(
+            username='bench-admin',
+            defaults={'is_staff': True, 'is_superuser': True}
+        )
+
+    created_menus = []
+    for m in range(menus):
+        menu = Menu.objects.create(
+            name=f"Synthetic Menu {m + 1}",
+            description='Generated for benchmarking',
+            created_by=user
+        )
+        created_menus.append(menu)
+
+        course_objs = Course.objects.bulk_create([
+            Course(menu=menu, name=f"COURSE {c + 1}", order=c + 1) for c in range(courses)
+        ])
+        item_objs = MenuItem.objects.bulk_create([
+            MenuItem(course=course, name=f"ITEM {c + 1}-{i + 1}")
+            for c, course in enumerate(course_objs)
+            for i in range(items)
+        ])
+        QuantityReference.objects.bulk_create([
+            QuantityReference(
+                menu_item=item,
+                party_size=size,
+                quantity_value=Decimal(size) / Decimal(25) + Decimal(n % 7),
+                unit='PC' if n % 5 == 0 else 'KG'
+            )
+            for n, item in enumerate(item_objs)
+            for size in reference_sizes
+        ])
+        rebuild_item_curves(item.pk for item in item_objs)
+
+    created_orders = PartyOrder.objects.bulk_create([
+        PartyOrder(
+            user=user,
+            menu=created_menus[o % len(created_menus)],
+            party_size=75 + (o * 25) % 500
+        )
+        for o in range(orders)
+    ]) if created_menus else []
+
+    created_predictions = []
+    if created_orders:
+        for p in range(predictions):
+            order = created_orders[p % len(created_orders)]
+            created_predictions.append(PredictionResult(
+                party_order=order,
+                result_data=synthetic_prediction(order.menu, order.party_size),
+                name=f"Synthetic prediction {p + 1}"
+            ))
+        created_predictions = PredictionResult.objects.bulk_create(created_predictions)
+
+    return {
+        'user': user,
+        'menus': created_menus,
+        'orders': created_orders,
+        'predictions': created_predictions,
+    }
+
+
+def synthetic_prediction(menu, party_size):
+    """
+    Build a prediction payload in the shape returned by the LLM for the given menu.
+    """
+    predictions = []
+    courses = menu.courses.prefetch_related('menu_items__quantity_references')
+    for course in courses:
+        items = []
+        for item in course.menu_items.all():
+            references = [
+                {'party_size': ref.party_size, 'quantity': float(ref.quantity_value), 'unit': ref.unit}
+                for ref in item.quantity_references.all()
+            ]
+            # Answer like a model that interpolates correctly, so validation has nothing to repair
+            value, unit = interpolate_item({'reference_quantities': references}, party_size)
+            if value is None:
+                value, unit = 0, 'KG'
+            items.append({'item_name': item.name, 'quantity_value': value, 'unit': unit})
+        predictions.append({'course_name': course.name, 'items': items})
+    return {'predictions': predictions}
+
+
+def write_top_sheet_csv(path, items=10, reference_sizes=(50, 100, 250, 500)):
+    """
+    Write a synthetic CSV in the BANQUET FOOD TOP SHEET layout.
+    """
+    with open(path, 'w', newline='') as handle:
+        writer = csv.writer(handle)
+        header = ['MENU', '']
+        for size in reference_sizes:
+            header.extend([f"{size} PAX", ''])
+        writer.writerow(header[:-1])
+        for course_name in IMPORT_COURSES:
+            writer.writerow([course_name])
+            for i in range(items):
+                row = [f"{course_name} ITEM {i + 1}", '']
+                for size in reference_sizes:
+                    row.extend([f"{max(1, size // 25)}KG", ''])
+                writer.writerow(row[:-1])
+            writer.writerow([])
+
+
+@contextmanager
+def stub_llm(payload):
+    """
+    Replace the OpenAI client used by the prediction path with one that
+    immediately returns ``payload`` as the completion content.
+    """
+    message = mock.Mock(content=json.dumps(payload))
+    usage = mock.Mock(prompt_tokens=0, completion_tokens=0)
+    response = mock.Mock(choices=[mock.Mock(message=message)], usage=usage)
+    with mock.patch('openai.OpenAI') as client_class:
+        client_class.return_value.chat.completions.create.return_value = response
+        yield client_class
+
+
+def percentile(samples, pct):
+    """
+    Nearest-rank percentile of a list of samples.
+    """
+    ordered = sorted(samples)
+    if not ordered:
+        return None
+    rank = math.ceil(pct / 100 * len(ordered))
+    return ordered[max(0, rank - 1)]
+
+
+def measure(func, repeat=10, warmup=1):
+    """
+    Run ``func`` ``repeat`` times and return latency percentiles (ms),
+    the number of queries per call and the peak traced memory (KiB).
+    """
+    for _ in range(warmup):
+        func()
+
+    latencies = []
+    query_counts = []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            func()
+            latencies.append((time.perf_counter() - start) * 1000)
+        query_counts.append(len(queries.captured_queries))
+
+    # Memory is traced in a separate run so tracing overhead does not skew latencies
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    result = {
+        'runs': repeat,
+        'mean_ms': round(statistics.mean(latencies), 3),
+        'min_ms': round(min(latencies), 3),
+        'max_ms': round(max(latencies), 3),
+        'queries': max(query_counts),
+        'peak_memory_kib': round(peak / 1024, 1),
+    }
+    for pct in PERCENTILES:
+        result[f"p{pct}_ms"] = round(percentile(latencies, pct), 3)
+    return result
+
+
+def _get(client, url, expected=200):
+    def call():
+        response = client.get(url)
+        if response.status_code != expected:
+            raise RuntimeError(f"GET {url} returned {response.status_code}")
+        return response
+    return call
+
+
+def _post(client, url, data=None, expected=201):
+    def call():
+        response = client.post(url, data or {}, content_type='application/json')
+        if response.status_code != expected:
+            raise RuntimeError(f"POST {url} returned {response.status_code}")
+        return response
+    return call
+
+
+def benchmark_endpoints(dataset, repeat=10):
+    """
+    Time the list and detail views of every chef_co endpoint plus the prediction action.
+    """
+    client = Client()
+    client.force_login(dataset['user'])
+
+    menu = dataset['menus'][0]
+    course = menu.courses.first()
+    item = MenuItem.objects.filter(course__menu=menu).first()
+    reference = QuantityReference.objects.filter(menu_item__course__menu=menu).first()
+    order = dataset['orders'][0]
+    prediction = dataset['predictions'][0] if dataset['predictions'] else None
+
+    cases = {
+        'menus.list': _get(client, '/api/menus/'),
+        'menus.retrieve': _get(client, f"/api/menus/{menu.id}/"),
+        'menus.scaled_quantities': _get(client, f"/api/menus/{menu.id}/scaled_quantities/?party_size=175"),
+        'courses.list': _get(client, '/api/courses/'),
+        'courses.retrieve': _get(client, f"/api/courses/{course.id}/"),
+        'menu_items.list': _get(client, '/api/menu-items/'),
+        'menu_items.retrieve': _get(client, f"/api/menu-items/{item.id}/"),
+        'menu_items.autocomplete': _get(client, f"/api/menu-items/autocomplete/?q={item.name[:4]}"),
+        'quantity_references.list': _get(client, '/api/quantity-references/'),
+        'quantity_references.retrieve': _get(client, f"/api/quantity-references/{reference.id}/"),
+        'party_orders.list': _get(client, '/api/party-orders/'),
+        'party_orders.retrieve': _get(client, f"/api/party-orders/{order.id}/"),
+        'predicted_quantities.list': _get(client, '/api/predicted_quantities/'),
+    }
+    if prediction is not None:
+        cases['predicted_quantities.retrieve'] = _get(
+            client, f"/api/predicted_quantities/{prediction.id}/"
+        )
+
+    results = {name: measure(call, repeat=repeat) for name, call in cases.items()}
+
+    # The prediction action, with the OpenAI round trip replaced by a canned answer
+    def uncached(call):
+        def wrapped():
+            get_prediction_cache().clear()
+            return call()
+        return wrapped
+
+    # Repeated predictions would be rate limited; leases are still taken and released
+    unthrottled = override_settings(CHEF_CO_ADMISSION={'USER_RATE_PER_MINUTE': None, 'GLOBAL_RATE_PER_MINUTE': None})
+    with stub_llm(synthetic_prediction(order.menu, order.party_size)), unthrottled:
+        predict_url = f"/api/party-orders/{order.id}/predict_quantities/"
+        results['party_orders.predict_quantities'] = measure(
+            uncached(_post(client, predict_url, {'name': 'bench'})), repeat=repeat
+        )
+        results['party_orders.predict_quantities.hybrid'] = measure(
+            uncached(_post(client, predict_url, {'name': 'bench', 'mode': 'hybrid'})), repeat=repeat
+        )
+        results['party_orders.predict_quantities.cached'] = measure(
+            _post(client, predict_url, {'name': 'bench'}), repeat=repeat
+        )
+    return results
+
+
+def benchmark_importers(dataset, items=10, reference_sizes=(50, 100, 250, 500), repeat=3):
+    """
+    Time the ``import_menu_data`` management command and the admin CSV upload.
+    """
+    results = {}
+    # import_menu_data attaches the menu it creates to the 'admin' user
+    User.objects.get_or_create(
+        username='admin',
+        defaults={'is_staff': True, 'is_superuser': True}
+    )
+
+    with tempfile.TemporaryDirectory() as workdir:
+        csv_path = os.path.join(workdir, 'BANQUET FOOD TOP SHEET - BASIC MENU 1.csv')
+        write_top_sheet_csv(csv_path, items=items, reference_sizes=reference_sizes)
+
+        def run_command():
+            cwd = os.getcwd()
+            os.chdir(workdir)
+            try:
+                with open(os.devnull, 'w') as devnull:
+                    call_command('import_menu_data', stdout=devnull)
+            finally:
+                os.chdir(cwd)
+
+        results['import_menu_data'] = measure(run_command, repeat=repeat)
+
+        client = Client()
+        client.force_login(dataset['user'])
+
+        def run_upload():
+            with open(csv_path, 'rb') as handle:
+                response = client.post(
+                    '/admin/chef_co/quantityreference/upload-csv/',
+                    {'csv_file': handle}
+                )
+            if response.status_code != 302:
+                raise RuntimeError(f"CSV upload returned {response.status_code}")
+
+        results['admin.upload_csv'] = measure(run_upload, repeat=repeat)
+    return results
+
+
+def benchmark_renderers(repeat=10):
+    """
+    Time rendering every quantity reference and prediction as one big page with
+    the stdlib JSON renderer and each of the fast renderers that is installed.
+    """
+    pages = {
+        'quantity_references': QuantityReferenceSerializer(
+            QuantityReference.objects.all(), many=True
+        ).data,
+        'predicted_quantities': PredictionResultSerializer(
+            PredictionResult.objects.select_related('party_order__menu__created_by', 'party_order__user'),
+            many=True
+        ).data,
+    }
+    renderers = {'json': JSONRenderer()}
+    if orjson is not None:
+        renderers['orjson'] = ORJSONRenderer()
+    if msgpack is not None:
+        renderers['msgpack'] = MessagePackRenderer()
+
+    results = {}
+    for page_name, data in pages.items():
+        baseline = None
+        for renderer_name, renderer in renderers.items():
+            stats = measure(lambda: renderer.render(data, renderer.media_type), repeat=repeat)
+            stats['rows'] = len(data)
+            stats['bytes'] = len(renderer.render(data, renderer.media_type))
+            if baseline is None:
+                baseline = stats['p50_ms']
+            elif stats['p50_ms']:
+                stats['speedup_vs_json'] = round(baseline / stats['p50_ms'], 2)
+            results[f"render.{page_name}.{renderer_name}"] = stats
+    return results
+
+
+def run_benchmarks(scale=None, repeat=10, import_repeat=3):
+    """
+    Build a synthetic dataset at ``scale`` and run every benchmark against it.
+    Must be called against a disposable database.
+    """
+    scale = dict(DEFAULT_SCALE, **(scale or {}))
+    dataset = build_synthetic_menus(**scale)
+
+    results = benchmark_endpoints(dataset, repeat=repeat)
+    results.update(benchmark_renderers(repeat=repeat))
+    results.update(benchmark_importers(
+        dataset,
+        items=scale['items'],
+        reference_sizes=scale['reference_sizes'],
+        repeat=import_repeat
+    ))
+    results['startup'] = measure_startup(repeat=import_repeat)
+
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'scale': scale,
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+
+# Heavy modules that must only be imported by the code paths that need them
+STARTUP_LAZY_MODULES = ('openai', 'drf_yasg.views', 'drf_yasg.codecs', 'drf_yasg.generators', 'jsonschema')
+
+# django.setup() plus URL resolution takes about 0.5 s on an idle machine; it was 1.2 s with openai loaded eagerly
+STARTUP_BUDGET_MS = 1000
+
+STARTUP_SCRIPT = """
+import json, os, resource, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+from django.urls import resolve
+resolve('/api/menus/')
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    'ms': elapsed * 1000,
+    'maxrss_kib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'modules': sorted(sys.modules),
+}))
+"""
+
+
+def _run_startup(importtime=False):
+    command = [sys.executable]
+    if importtime:
+        command += ['-X', 'importtime']
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'chef_app.settings'))
+    completed = subprocess.run(
+        command + ['-c', STARTUP_SCRIPT], cwd=settings.BASE_DIR, env=env,
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1]), completed.stderr
+
+
+def parse_importtime(stderr, top=10):
+    """
+    Cumulative import time in ms of the top-level imports in ``-X importtime`` output.
+    """
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        if name.startswith('  '):  # Nested import, already counted by its parent
+            continue
+        totals[name.strip()] = totals.get(name.strip(), 0) + int(cumulative) / 1000
+    ranked = sorted(totals.items(), key=lambda pair: pair[1], reverse=True)[:top]
+    return {name: round(ms, 1) for name, ms in ranked}
+
+
+def measure_startup(repeat=3):
+    """
+    Time ``django.setup()`` plus URL resolution in fresh interpreters, with an
+    ``-X importtime`` breakdown of the slowest top-level imports.
+    """
+    runs = [_run_startup()[0] for _ in range(repeat)]
+    latencies = [run['ms'] for run in runs]
+    probe, stderr = _run_startup(importtime=True)
+
+    result = {
+        'runs': repeat,
+        'mean_ms': round(statistics.mean(latencies), 3),
+        'min_ms': round(min(latencies), 3),
+        'max_ms': round(max(latencies), 3),
+        'queries': 0,
+        'peak_memory_kib': max(run['maxrss_kib'] for run in runs),  # Resident set of the whole process
+        'modules': len(probe['modules']),
+        'eager_heavy_modules': [name for name in STARTUP_LAZY_MODULES if name in probe['modules']],
+        'slowest_imports_ms': parse_importtime(stderr),
+    }
+    for pct in PERCENTILES:
+        result[f"p{pct}_ms"] = round(percentile(latencies, pct), 3)
+    return result
+
+
+def compare_results(baseline, current, metric='p50_ms'):
+    """
+    Compare two benchmark reports and return rows of
+    (name, baseline value, current value, percent change).
+    """
+    rows = []
+    old_results = baseline.get('results', {})
+    for name, stats in sorted(current.get('results', {}).items()):
+        new_value = stats.get(metric)
+        old_value = old_results.get(name, {}).get(metric)
+        if old_value:
+            change = round((new_value - old_value) / old_value * 100, 1)
+        else:
+            change = None
+        rows.append((name, old_value, new_value, change))
+    return rows
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,199 @@
+"""
+Bill of materials expansion: turn predicted dish quantities into raw ingredients.
+
+Recipes form a DAG, since a sub-recipe such as a spice mix can be shared by
+many dishes. Each recipe is expanded once into an ingredient vector per unit
+of output, memoized across the whole call. A batch of predictions is first
+reduced to one demand figure per recipe, so the multiplication runs once per
+distinct dish however many orders the batch covers.
+"""
+from collections import defaultdict
+
+from .archive import result_data_of
+from .models import Ingredient, MenuItem, PredictionResult, Recipe, RecipeLine
+from .predictions import item_key
+
+
+# Unit -> (base unit, factor to base)
+UNIT_FACTORS = {
+    'KG': ('KG', 1.0), 'KGS': ('KG', 1.0),
+    'G': ('KG', 0.001), 'GM': ('KG', 0.001), 'GMS': ('KG', 0.001), 'GRAM': ('KG', 0.001), 'GRAMS': ('KG', 0.001),
+    'L': ('L', 1.0), 'LTR': ('L', 1.0), 'LTRS': ('L', 1.0), 'LITRE': ('L', 1.0), 'LITER': ('L', 1.0),
+    'ML': ('L', 0.001),
+    'PC': ('PC', 1.0), 'PCS': ('PC', 1.0), 'PIECE': ('PC', 1.0), 'PIECES': ('PC', 1.0), 'NOS': ('PC', 1.0),
+}
+
+
+class RecipeCycleError(ValueError):
+    pass
+
+
+def normalize_unit(unit):
+    return str(unit or '').strip().upper().rstrip('.')
+
+
+def convert(quantity, from_unit, to_unit):
+    """
+    Convert between units of the same dimension; None when they are not comparable.
+    """
+    source, target = normalize_unit(from_unit), normalize_unit(to_unit)
+    if source == target:
+        return quantity
+    if source not in UNIT_FACTORS or target not in UNIT_FACTORS:
+        return None
+    source_base, source_factor = UNIT_FACTORS[source]
+    target_base, target_factor = UNIT_FACTORS[target]
+    if source_base != target_base:
+        return None
+    return quantity * source_factor / target_factor
+
+
+def to_base_unit(quantity, unit):
+    """
+    The quantity in the base unit of its dimension (KG, L or PC), or as given when the unit is unknown.
+    """
+    normalized = normalize_unit(unit)
+    if normalized not in UNIT_FACTORS:
+        return quantity, unit
+    base, factor = UNIT_FACTORS[normalized]
+    return quantity * factor, base
+
+
+class BOMExpander:
+    """
+    Loads recipes level by level and expands them into per-unit ingredient vectors.
+    """
+
+    def __init__(self):
+        self.recipes = {}  # recipe id -> yield quantity
+        self.lines = {}    # recipe id -> [(ingredient id, sub-recipe id, quantity)]
+        self._per_unit = {}
+
+    def load(self, recipe_ids):
+        """
+        Fetch the recipes and every sub-recipe below them, one query pair per nesting level.
+        """
+        pending = set(recipe_ids) - set(self.recipes)
+        while pending:
+            for pk, yield_quantity in Recipe.objects.filter(pk__in=pending).values_list('pk', 'yield_quantity'):
+                self.recipes[pk] = float(yield_quantity) or 1.0
+                self.lines[pk] = []
+            children = set()
+            rows = RecipeLine.objects.filter(recipe_id__in=pending).values_list(
+                'recipe_id', 'ingredient_id', 'sub_recipe_id', 'quantity'
+            )
+            for recipe_id, ingredient_id, sub_recipe_id, quantity in rows:
+                self.lines[recipe_id].append((ingredient_id, sub_recipe_id, float(quantity)))
+                if sub_recipe_id is not None:
+                    children.add(sub_recipe_id)
+            pending = children - set(self.recipes)
+
+    def per_unit(self, recipe_id, _path=()):
+        """
+        Ingredient id -> quantity needed for one yield unit of the recipe.
+        """
+        if recipe_id in self._per_unit:
+            return self._per_unit[recipe_id]
+        if recipe_id in _path:
+            raise RecipeCycleError(f"Recipe {recipe_id} contains itself")
+        if recipe_id not in self.recipes:
+            self.load([recipe_id])
+
+        yield_quantity = self.recipes[recipe_id]
+        vector = defaultdict(float)
+        for ingredient_id, sub_recipe_id, quantity in self.lines[recipe_id]:
+            ratio = quantity / yield_quantity
+            if ingredient_id is not None:
+                vector[ingredient_id] += ratio
+            else:
+                for sub_ingredient, amount in self.per_unit(sub_recipe_id, _path + (recipe_id,)).items():
+                    vector[sub_ingredient] += ratio * amount
+        self._per_unit[recipe_id] = dict(vector)
+        return self._per_unit[recipe_id]
+
+    def expand(self, demand):
+        """
+        Total ingredients for a {recipe id: quantity in yield units} demand.
+        """
+        self.load(demand)
+        totals = defaultdict(float)
+        for recipe_id, quantity in demand.items():
+            for ingredient_id, amount in self.per_unit(recipe_id).items():
+                totals[ingredient_id] += quantity * amount
+        return totals
+
+
+def _quantity(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def shopping_list(predictions):
+    """
+    Aggregate raw ingredient totals over PredictionResults (with ``party_order`` loaded).
+
+    Returns the ingredients sorted by name and the predicted lines that could
+    not be expanded, with the reason: no recipe, an unconvertible unit or a
+    non-numeric quantity.
+    """
+    predictions = list(predictions)
+    menu_ids = {prediction.party_order.menu_id for prediction in predictions}
+    recipes = {}
+    rows = MenuItem.objects.filter(course__menu_id__in=menu_ids).values_list(
+        'course__menu_id', 'course__name', 'name', 'recipe__id', 'recipe__yield_unit'
+    )
+    for menu_id, course_name, name, recipe_id, yield_unit in rows:
+        recipes[(menu_id, *item_key(course_name, name))] = (recipe_id, yield_unit)
+
+    demand = defaultdict(float)
+    unmatched = {}
+    for prediction in predictions:
+        menu_id = prediction.party_order.menu_id
+        for course in (result_data_of(prediction) or {}).get('predictions', []):
+            for line in course.get('items', []):
+                recipe_id, yield_unit = recipes.get((menu_id, *item_key(course.get('course_name'), line.get('item_name'))), (None, None))
+                quantity = _quantity(line.get('quantity_value'))
+                if quantity is None:
+                    reason = 'invalid quantity'
+                elif recipe_id is None:
+                    reason = 'no recipe'
+                else:
+                    converted = convert(quantity, line.get('unit'), yield_unit)
+                    if converted is not None:
+                        demand[recipe_id] += converted
+                        continue
+                    reason = f"unit {line.get('unit')} does not convert to {yield_unit}"
+                key = (course.get('course_name'), line.get('item_name'), line.get('unit'), reason)
+                entry = unmatched.setdefault(key, {
+                    'course_name': key[0], 'item_name': key[1], 'unit': key[2],
+                    'quantity_value': 0.0, 'reason': reason,
+                })
+                entry['quantity_value'] += quantity or 0.0
+
+    totals = BOMExpander().expand(demand)
+    ingredients = [
+        {'id': pk, 'name': name, 'unit': unit, 'quantity': round(totals[pk], 3)}
+        for pk, name, unit in Ingredient.objects.filter(pk__in=totals).order_by('name').values_list('pk', 'name', 'unit')
+    ]
+    for entry in unmatched.values():
+        entry['quantity_value'] = round(entry['quantity_value'], 3)
+    return {
+        'predictions': [prediction.pk for prediction in predictions],
+        'ingredients': ingredients,
+        'unmatched': list(unmatched.values()),
+    }
+
+
+def latest_predictions(party_order_ids):
+    """
+    The most recent prediction of each party order, with the order loaded.
+    """
+    latest = {}
+    rows = PredictionResult.objects.filter(party_order_id__in=party_order_ids).order_by(
+        'party_order_id', '-created_at', '-pk'
+    ).values_list('party_order_id', 'pk')
+    for party_order_id, pk in rows:
+        latest.setdefault(party_order_id, pk)
+    return PredictionResult.objects.filter(pk__in=latest.values()).select_related('party_order', 'payload', 'archive').order_by('pk')
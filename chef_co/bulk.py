@@ -0,0 +1,99 @@
+"""
+Set-based bulk operations on quantity references.
+"""
+from django.db import transaction
+
+from .models import Menu, MenuItem, QuantityReference
+from .recompute import schedule_recompute
+from .scaling import rebuild_item_curves
+from .warmup import schedule_warmup
+
+
+def bulk_upsert_references(records):
+    """
+    Insert or update validated ``{menu_item, party_size, quantity_value, unit}``
+    records in one transaction using a single conflict-handling INSERT.
+
+    Returns one status dict per record, in order. Status is one of
+    ``created``, ``updated``, ``unchanged`` or ``error``.
+    """
+    results = [None] * len(records)
+
+    # Resolve every referenced menu item (and its menu) in one query
+    item_ids = {record['menu_item'] for record in records}
+    item_menus = dict(
+        MenuItem.objects.filter(pk__in=item_ids).values_list('pk', 'course__menu_id')
+    )
+
+    pending = {}
+    for index, record in enumerate(records):
+        key = (record['menu_item'], record['party_size'])
+        if record['menu_item'] not in item_menus:
+            results[index] = _row(index, record, 'error', errors={'menu_item': ['Menu item does not exist.']})
+        elif key in pending:
+            results[index] = _row(index, record, 'error', errors={
+                'non_field_errors': [f"Duplicate of row {pending[key]} for this menu item and party size."]
+            })
+        else:
+            pending[key] = index
+
+    with transaction.atomic():
+        existing = {
+            (ref.menu_item_id, ref.party_size): ref
+            for ref in QuantityReference.objects.filter(
+                menu_item_id__in={key[0] for key in pending},
+                party_size__in={key[1] for key in pending},
+            )
+        }
+
+        to_write = []
+        for key, index in pending.items():
+            record = records[index]
+            current = existing.get(key)
+            if current is None:
+                status = 'created'
+            elif current.quantity_value == record['quantity_value'] and current.unit == record['unit']:
+                results[index] = _row(index, record, 'unchanged', pk=current.pk)
+                continue
+            else:
+                status = 'updated'
+            to_write.append((index, status, current, QuantityReference(
+                menu_item_id=record['menu_item'],
+                party_size=record['party_size'],
+                quantity_value=record['quantity_value'],
+                unit=record['unit'],
+            )))
+
+        if to_write:
+            QuantityReference.objects.bulk_create(
+                [obj for _, _, _, obj in to_write],
+                update_conflicts=True,
+                unique_fields=['menu_item', 'party_size'],
+                update_fields=['quantity_value', 'unit', 'updated_at'],
+            )
+            # bulk_create bypasses save signals, so update the denormalized state here
+            menu_ids = {item_menus[obj.menu_item_id] for _, _, _, obj in to_write}
+            Menu.bump_tree_version(menu_ids)
+            item_ids = {obj.menu_item_id for _, _, _, obj in to_write}
+            rebuild_item_curves(item_ids)
+            schedule_recompute(item_ids)
+            schedule_warmup(menu_ids)
+
+    for index, status, current, obj in to_write:
+        # Backends without RETURNING leave pk unset on upserted rows
+        pk = obj.pk if obj.pk is not None else getattr(current, 'pk', None)
+        results[index] = _row(index, records[index], status, pk=pk)
+    return results
+
+
+def _row(index, record, status, pk=None, errors=None):
+    row = {
+        'index': index,
+        'id': pk,
+        'menu_item': record.get('menu_item'),
+        'party_size': record.get('party_size'),
+        'status': status,
+    }
+    if errors:
+        row['errors'] = errors
+    return row
@@ -0,0 +1,96 @@
+"""
+Conditional GET support for the nested menu tree endpoints.
+
+Responses are validated against the menus' ``tree_version`` so an unchanged
+menu can be answered with 304 Not Modified without touching the serializer.
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from .models import Menu
+
+
+class MenuTreeConditionalMixin:
+    """
+    Adds ETag/Last-Modified validators to list and retrieve.
+
+    Subclasses set ``menu_lookup`` to the path from Menu to the viewset's
+    model (e.g. ``'courses'`` for Course) so detail requests only look at
+    the owning menu.
+    """
+    menu_lookup = None
+
+    def get_menu_versions(self, pk=None):
+        """
+        Return (id, tree_version, tree_updated_at) rows for the menus the response depends on.
+        """
+        menus = Menu.objects.all()
+        if pk is not None:
+            lookup = f"{self.menu_lookup}__pk" if self.menu_lookup else 'pk'
+            menus = menus.filter(**{lookup: pk})
+        return list(menus.order_by('pk').values_list('pk', 'tree_version', 'tree_updated_at'))
+
+    def get_validators(self, request, pk=None):
+        """
+        Build the (etag, last_modified) pair for the current request.
+        """
+        try:
+            versions = self.get_menu_versions(pk)
+        except (ValueError, TypeError):
+            # Malformed lookup; let the regular view produce its 404
+            return None, None
+        if pk is not None and not versions:
+            return None, None
+
+        digest = hashlib.sha1()
+        # The representation depends on the query string (paging, format), negotiated media type and encoding
+        digest.update(self.basename.encode())
+        digest.update(request.get_full_path().encode())
+        digest.update(request.META.get('HTTP_ACCEPT', '').encode())
+        digest.update(request.META.get('HTTP_ACCEPT_ENCODING', '').encode())
+        for menu_id, version, _ in versions:
+            digest.update(f"{menu_id}:{version};".encode())
+
+        last_modified = max((updated for _, _, updated in versions), default=None)
+        if last_modified is not None:
+            last_modified = int(last_modified.timestamp())
+        return quote_etag(digest.hexdigest()), last_modified
+
+    def conditional_response(self, request, pk=None):
+        """
+        Return a 304 response when the client's copy is current, else
+        (None, etag, last_modified) for the caller to decorate its response.
+        """
+        etag, last_modified = self.get_validators(request, pk)
+        if etag is None:
+            return None, None, None
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is not None:
+            self.add_validators(response, etag, last_modified)
+        return response, etag, last_modified
+
+    @staticmethod
+    def add_validators(response, etag, last_modified):
+        if etag is not None:
+            response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ['Accept', 'Accept-Encoding'])
+        return response
+
+    def list(self, request, *args, **kwargs):
+        not_modified, etag, last_modified = self.conditional_response(request)
+        if not_modified is not None:
+            return not_modified
+        response = super().list(request, *args, **kwargs)
+        return self.add_validators(response, etag, last_modified)
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+        not_modified, etag, last_modified = self.conditional_response(request, pk)
+        if not_modified is not None:
+            return not_modified
+        response = super().retrieve(request, *args, **kwargs)
+        return self.add_validators(response, etag, last_modified)
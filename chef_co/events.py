@@ -0,0 +1,122 @@
+"""
+Prediction for multi-menu events.
+
+An event holds one PartyOrder per (menu, party size) line. A single pass
+answers what it can from the prediction cache, loads every remaining menu
+tree and scaling curve together, predicts each line, saves all predictions
+in one insert and merges the lines into one quantity per item and unit
+across menus.
+"""
+from .bom import normalize_unit, to_base_unit
+from .models import Menu, PredictionResult
+from .predictions import item_key, menu_curves, predict, stage_timer
+from .validation import validation_status
+from .warmup import get_cached_prediction, store_prediction, usage_fields
+
+
+def load_menus(menu_ids):
+    """
+    Fetch several menu trees in the same fixed number of queries as one.
+    """
+    return Menu.objects.prefetch_related(
+        'courses__menu_items__quantity_references'
+    ).in_bulk(set(menu_ids))
+
+
+def predict_event(event, mode, name=None, latency_budget_ms=None):
+    """
+    Predict every order of the event and save the results.
+    Returns (lines, totals, usage): one entry per order, the merged
+    item totals and the summed LLM usage.
+    """
+    orders = list(event.orders.select_related('menu').order_by('pk'))
+    results = {}  # order id -> ((result_data, usage), cached)
+    missing = []
+    for order in orders:
+        cached = get_cached_prediction(order.menu, order.party_size, mode)
+        if cached is None:
+            missing.append(order)
+        else:
+            results[order.pk] = (cached, True)
+
+    if missing:
+        with stage_timer('load_references'):
+            menus = load_menus(order.menu_id for order in missing)
+        with stage_timer('load_curves'):
+            curves = menu_curves((order.menu_id, order.party_size) for order in missing)
+        for order in missing:
+            menu = menus[order.menu_id]
+            # Lines with the same menu and size share one prediction
+            cached = get_cached_prediction(menu, order.party_size, mode)
+            if cached is not None:
+                results[order.pk] = (cached, True)
+                continue
+            result = predict(
+                menu, order.party_size, mode=mode, latency_budget_ms=latency_budget_ms,
+                curves=curves.get((order.menu_id, order.party_size))
+            )
+            store_prediction(menu, order.party_size, mode, *result)
+            results[order.pk] = (result, False)
+
+    with stage_timer('save'):
+        predictions = []
+        for order in orders:
+            (result_data, usage), was_cached = results[order.pk]
+            predictions.append(PredictionResult(
+                party_order=order,
+                result_data=result_data,
+                name=f"{name or event.name}: {order}",
+                **usage_fields(usage, cached=was_cached),
+                validation_status=validation_status(result_data),
+            ))
+        PredictionResult.objects.bulk_create(predictions)
+
+    lines = []
+    usage = {'prompt_tokens': 0, 'completion_tokens': 0, 'latency_ms': 0.0, 'cost_usd': 0.0}
+    for order, prediction in zip(orders, predictions):
+        (result_data, line_usage), was_cached = results[order.pk]
+        if not was_cached:
+            for key in usage:
+                usage[key] += line_usage.get(key) or 0
+        lines.append({
+            'party_order': order.pk,
+            'menu': order.menu_id,
+            'menu_name': order.menu.name,
+            'party_size': order.party_size,
+            'prediction_id': prediction.pk,
+            'cached': was_cached,
+            'validation_status': prediction.validation_status,
+            'data': result_data,
+        })
+    usage['cost_usd'] = round(usage['cost_usd'], 6)
+    return lines, merge_totals(lines), usage
+
+
+def merge_totals(lines):
+    """
+    Sum quantities per item name and unit across the menus of an event.
+    Convertible units are summed in their base unit, so G and KG or ML and L
+    lines of one item end up in a single KG or L total.
+    """
+    totals = {}
+    for line in lines:
+        for course in line['data'].get('predictions', []):
+            for item in course.get('items', []):
+                try:
+                    quantity = float(item.get('quantity_value'))
+                except (TypeError, ValueError):
+                    continue
+                quantity, unit = to_base_unit(quantity, item.get('unit'))
+                key = (item_key('', item.get('item_name'))[1], normalize_unit(unit))
+                entry = totals.setdefault(key, {
+                    'item_name': item.get('item_name'),
+                    'unit': unit,
+                    'quantity_value': 0.0,
+                    'menus': [],
+                })
+                entry['quantity_value'] += quantity
+                if line['menu'] not in entry['menus']:
+                    entry['menus'].append(line['menu'])
+    for entry in totals.values():
+        entry['quantity_value'] = round(entry['quantity_value'], 2)
+    return sorted(totals.values(), key=lambda entry: (str(entry['item_name']).upper(), str(entry['unit'])))
@@ -0,0 +1,183 @@
+"""
+Streaming export of predictions in the BANQUET FOOD TOP SHEET layout.
+
+Each prediction becomes a block: a ``MENU, , <N> PAX, , <name>`` header, then
+each course name followed by its ``item, , <quantity><unit>`` rows, with
+blank rows between courses and between predictions, matching the sheets the
+menus are imported from. Predictions are read in chunks and rows are encoded
+as they are produced, so memory stays flat however many predictions are exported.
+
+XLSX is written with zipfile into an unseekable stream, so no spreadsheet
+library is needed and nothing is buffered beyond the current chunk.
+"""
+import csv
+import zipfile
+from xml.sax.saxutils import escape
+
+from .archive import result_data_of
+
+
+CHUNK_SIZE = 200
+
+
+def format_quantity(value, unit):
+    try:
+        number = ('%.2f' % float(value)).rstrip('0').rstrip('.')
+    except (TypeError, ValueError):
+        number = '' if value is None else str(value)
+    return f"{number}{unit or ''}"
+
+
+def top_sheet_rows(prediction):
+    """
+    Rows of one prediction; its party order must be loaded.
+    """
+    yield ['MENU', '', f"{prediction.party_order.party_size} PAX", '', prediction.name]
+    for course in (result_data_of(prediction) or {}).get('predictions', []):
+        yield []
+        yield [course.get('course_name', '')]
+        for item in course.get('items', []):
+            yield [item.get('item_name', ''), '', format_quantity(item.get('quantity_value'), item.get('unit'))]
+
+
+def export_rows(queryset, chunk_size=CHUNK_SIZE):
+    """
+    Rows for every prediction in ``queryset``, read ``chunk_size`` at a time.
+    """
+    if not queryset.ordered:
+        queryset = queryset.order_by('pk')
+    predictions = queryset.select_related('party_order', 'payload', 'archive').only(
+        'pk', 'name', 'archived_at', 'party_order__party_size', 'payload__data', 'archive__codec', 'archive__payload'
+    )
+    for index, prediction in enumerate(predictions.iterator(chunk_size=chunk_size)):
+        if index:
+            yield []
+            yield []
+        yield from top_sheet_rows(prediction)
+
+
+class Echo:
+    """
+    File-like object whose write() just returns what it was given.
+    """
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    writer = csv.writer(Echo())
+    for row in rows:
+        yield writer.writerow(row)
+
+
+class _ChunkBuffer:
+    """
+    Write-only, unseekable sink that the XLSX generator drains after each row.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Top Sheet" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def _column(index):
+    name = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        name = chr(65 + remainder) + name
+    return name
+
+
+def _row_xml(number, row):
+    cells = ''.join(
+        f'<c r="{_column(col)}{number}" t="inlineStr"><is><t xml:space="preserve">{escape(str(value))}</t></is></c>'
+        for col, value in enumerate(row) if value not in ('', None)
+    )
+    return f'<row r="{number}">{cells}</row>'
+
+
+def stream_xlsx(rows):
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_PARTS.items():
+            archive.writestr(name, content)
+        yield buffer.drain()
+
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            for number, row in enumerate(rows, start=1):
+                sheet.write(_row_xml(number, row).encode('utf-8'))
+                data = buffer.drain()
+                if data:
+                    yield data
+            sheet.write(b'</sheetData></worksheet>')
+    yield buffer.drain()
+
+
+# name -> (content type, streamer)
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', stream_csv),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', stream_xlsx),
+}
+
+
+def export_predictions(queryset, file_format='csv', chunk_size=CHUNK_SIZE):
+    """
+    Return (content type, chunk iterator) for the predictions in ``queryset``.
+    """
+    content_type, streamer = EXPORT_FORMATS[file_format]
+    return content_type, streamer(export_rows(queryset, chunk_size=chunk_size))
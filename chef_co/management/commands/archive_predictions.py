@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from chef_co.archive import CODECS, apply_retention, retention_settings
+
+
+class Command(BaseCommand):
+    help = 'Compress old prediction payloads into the archive table and delete expired predictions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int,
+                            help='Archive predictions older than this many days (default: ARCHIVE_AFTER_DAYS)')
+        parser.add_argument('--delete-days', type=int,
+                            help='Delete predictions older than this many days (default: DELETE_AFTER_DAYS)')
+        parser.add_argument('--codec', choices=CODECS)
+        parser.add_argument('--dry-run', action='store_true', help='Report what would change without writing')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        config = retention_settings()
+        for option, key in (('days', 'ARCHIVE_AFTER_DAYS'), ('delete_days', 'DELETE_AFTER_DAYS'), ('codec', 'CODEC')):
+            if options[option] is not None:
+                config[key] = options[option]
+
+        dry_run = options['dry_run']
+        report = apply_retention(config, dry_run=dry_run, batch_size=options['batch_size'])
+
+        prefix = 'Would have ' if dry_run else ''
+        if report['deleted'] is not None:
+            self.stdout.write(f"{prefix}Deleted {report['deleted']} predictions.")
+        archived = report['archived']
+        if archived is not None:
+            ratio = archived['compressed_bytes'] / archived['raw_bytes'] if archived['raw_bytes'] else 0
+            self.stdout.write(self.style.SUCCESS(
+                f"{prefix}Archived {archived['archived']} predictions with {archived['codec']}: "
+                f"{archived['raw_bytes']} -> {archived['compressed_bytes']} bytes ({ratio:.0%})."
+            ))
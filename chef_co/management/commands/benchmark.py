@@ -0,0 +1,98 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from chef_co.benchmarks import DEFAULT_SCALE, STARTUP_BUDGET_MS, run_benchmarks, compare_results
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the chef_co API against a disposable database filled with synthetic menus'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--menus', type=int, default=DEFAULT_SCALE['menus'])
+        parser.add_argument('--courses', type=int, default=DEFAULT_SCALE['courses'],
+                            help='Courses per menu')
+        parser.add_argument('--items', type=int, default=DEFAULT_SCALE['items'],
+                            help='Menu items per course')
+        parser.add_argument('--reference-sizes', default=','.join(str(s) for s in DEFAULT_SCALE['reference_sizes']),
+                            help='Comma separated party sizes to create references for')
+        parser.add_argument('--orders', type=int, default=DEFAULT_SCALE['orders'])
+        parser.add_argument('--predictions', type=int, default=DEFAULT_SCALE['predictions'])
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Timed runs per endpoint')
+        parser.add_argument('--import-repeat', type=int, default=3,
+                            help='Timed runs per importer')
+        parser.add_argument('--output', default='bench_output.json',
+                            help='Where to write the JSON report')
+        parser.add_argument('--compare',
+                            help='A previous JSON report to compare p50 latencies against')
+        parser.add_argument('--startup-budget', type=float, default=STARTUP_BUDGET_MS,
+                            help='Fail when the p50 startup time exceeds this many milliseconds (0 disables)')
+
+    def handle(self, *args, **options):
+        try:
+            reference_sizes = [int(s) for s in options['reference_sizes'].split(',') if s.strip()]
+        except ValueError:
+            raise CommandError('--reference-sizes must be a comma separated list of integers')
+
+        scale = {
+            'menus': options['menus'],
+            'courses': options['courses'],
+            'items': options['items'],
+            'reference_sizes': reference_sizes,
+            'orders': options['orders'],
+            'predictions': options['predictions'],
+        }
+        if scale['menus'] < 1 or scale['courses'] < 1 or scale['items'] < 1 or scale['orders'] < 1:
+            raise CommandError('--menus, --courses, --items and --orders must be at least 1')
+
+        # Never touch the real database: run everything against a throwaway test database
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            report = run_benchmarks(
+                scale=scale,
+                repeat=options['repeat'],
+                import_repeat=options['import_repeat']
+            )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        with open(options['output'], 'w') as handle:
+            json.dump(report, handle, indent=2, sort_keys=True)
+
+        self.stdout.write(f"{'benchmark':40} {'p50 ms':>10} {'p95 ms':>10} {'queries':>8} {'peak KiB':>10}")
+        for name, stats in sorted(report['results'].items()):
+            self.stdout.write(
+                f"{name:40} {stats['p50_ms']:>10} {stats['p95_ms']:>10} "
+                f"{stats['queries']:>8} {stats['peak_memory_kib']:>10}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+
+        if options['compare']:
+            try:
+                with open(options['compare']) as handle:
+                    baseline = json.load(handle)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not read baseline report: {e}")
+
+            self.stdout.write('')
+            self.stdout.write(f"{'benchmark':40} {'baseline':>10} {'current':>10} {'change':>8}")
+            for name, old_value, new_value, change in compare_results(baseline, report):
+                change_str = f"{change:+.1f}%" if change is not None else 'new'
+                line = f"{name:40} {str(old_value):>10} {new_value:>10} {change_str:>8}"
+                if change is not None and change > 10:
+                    line = self.style.WARNING(line)
+                self.stdout.write(line)
+
+        # Checked last so the report and comparison are written either way
+        startup = report['results']['startup']
+        if startup['eager_heavy_modules']:
+            raise CommandError(f"Startup imports modules that should load lazily: {', '.join(startup['eager_heavy_modules'])}")
+        if options['startup_budget'] and startup['p50_ms'] > options['startup_budget']:
+            raise CommandError(
+                f"Startup took {startup['p50_ms']} ms at p50, over the {options['startup_budget']:g} ms budget"
+            )
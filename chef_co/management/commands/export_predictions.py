@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from chef_co.export import CHUNK_SIZE, EXPORT_FORMATS, export_predictions
+from chef_co.models import PredictionResult
+
+
+class Command(BaseCommand):
+    help = 'Export predictions in the BANQUET FOOD TOP SHEET layout as CSV or XLSX'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--id', type=int, action='append', dest='ids',
+                            help='Prediction id to export (repeatable); default is every prediction')
+        parser.add_argument('--menu', type=int, help='Only export predictions of this menu')
+        parser.add_argument('--event', type=int, help='Only export predictions of this event')
+        parser.add_argument('--file-format', choices=sorted(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--output', help='File to write; CSV defaults to stdout')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        queryset = PredictionResult.objects.order_by('pk')
+        if options['ids']:
+            queryset = queryset.filter(pk__in=options['ids'])
+        if options['menu'] is not None:
+            queryset = queryset.filter(party_order__menu_id=options['menu'])
+        if options['event'] is not None:
+            queryset = queryset.filter(party_order__event_id=options['event'])
+
+        file_format = options['file_format']
+        if file_format == 'xlsx' and not options['output']:
+            raise CommandError('XLSX export needs --output')
+
+        _, chunks = export_predictions(queryset, file_format, chunk_size=options['chunk_size'])
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+
+        if file_format == 'xlsx':
+            handle = open(options['output'], 'wb')
+        else:
+            handle = open(options['output'], 'w', newline='', encoding='utf-8')
+        with handle:
+            for chunk in chunks:
+                handle.write(chunk)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
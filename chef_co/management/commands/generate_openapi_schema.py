@@ -0,0 +1,29 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chef_co.schema import generate_schema, schema_path, write_schema
+
+
+class Command(BaseCommand):
+    help = 'Generate the static OpenAPI schema served at /swagger.json, or check that it is up to date'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Where to write the schema (defaults to CHEF_CO_SCHEMA_PATH)')
+        parser.add_argument('--check', action='store_true',
+                            help='Exit with an error if the stored schema differs from the code')
+
+    def handle(self, *args, **options):
+        path = Path(options['output'] or schema_path())
+
+        if options['check']:
+            current = path.read_bytes() if path.exists() else None
+            if current != generate_schema():
+                raise CommandError(
+                    f'{path} is out of date; run "python manage.py generate_openapi_schema" and commit it.'
+                )
+            self.stdout.write(self.style.SUCCESS(f'{path} is up to date.'))
+            return
+
+        path, body = write_schema(path)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {len(body)} bytes to {path}.'))
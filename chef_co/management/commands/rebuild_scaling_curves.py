@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from chef_co.scaling import rebuild_all_curves
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the materialized scaling curves from quantity references'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--menu', type=int, help='Only rebuild the items of this menu')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        count = rebuild_all_curves(menu_id=options['menu'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} scaling segments.'))
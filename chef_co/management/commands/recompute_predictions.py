@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from chef_co.models import MenuItem
+from chef_co.recompute import recompute_predictions
+
+
+class Command(BaseCommand):
+    help = 'Recompute the lines of stored predictions for menu items from their scaling curves'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--item', type=int, action='append', dest='items',
+                            help='Menu item id to recompute (repeatable)')
+        parser.add_argument('--menu', type=int, help='Recompute every item of this menu')
+        parser.add_argument('--dry-run', action='store_true', help='Report the changes without saving them')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        item_ids = set(options['items'] or [])
+        if options['menu'] is not None:
+            item_ids.update(MenuItem.objects.filter(course__menu_id=options['menu']).values_list('pk', flat=True))
+        if not item_ids:
+            raise CommandError('Pass at least one --item or a --menu')
+
+        report = recompute_predictions(item_ids, dry_run=options['dry_run'], batch_size=options['batch_size'])
+        for line in report['lines']:
+            old, new = line['old'], line['new']
+            self.stdout.write(
+                f"Prediction {line['prediction']}: {line['course_name']} / {line['item_name']} "
+                f"{old['quantity_value']} {old['unit'] or ''} -> {new['quantity_value']} {new['unit']}"
+            )
+
+        verb = 'Would update' if options['dry_run'] else 'Updated'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {report['changed']} of {report['scanned']} predictions ({len(report['lines'])} lines)."
+        ))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from chef_co.models import Menu
+from chef_co.predictions import PREDICTION_MODES
+from chef_co.warmup import warm_menu, warm_party_sizes
+
+
+class Command(BaseCommand):
+    help = 'Precompute cached predictions for configured and frequently ordered party sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--menu', type=int, action='append', dest='menus',
+                            help='Menu id to warm (repeatable); defaults to every menu')
+        parser.add_argument('--sizes', help='Comma separated party sizes; defaults to configured plus frequent sizes')
+        parser.add_argument('--top', type=int, help='How many frequently ordered sizes to include')
+        parser.add_argument('--mode', choices=PREDICTION_MODES)
+        parser.add_argument('--force', action='store_true', help='Recompute sizes that are already cached')
+
+    def handle(self, *args, **options):
+        sizes = None
+        if options['sizes']:
+            try:
+                sizes = [int(s) for s in options['sizes'].split(',') if s.strip()]
+            except ValueError:
+                raise CommandError('--sizes must be a comma separated list of integers')
+
+        menu_ids = options['menus'] or list(Menu.objects.values_list('pk', flat=True))
+        for menu_id in menu_ids:
+            if not Menu.objects.filter(pk=menu_id).exists():
+                self.stdout.write(self.style.ERROR(f'Menu {menu_id} not found'))
+                continue
+            menu_sizes = sizes if sizes is not None else warm_party_sizes(menu_id, top=options['top'])
+            for party_size, status in warm_menu(menu_id, menu_sizes, mode=options['mode'], force=options['force']):
+                style = self.style.SUCCESS if status == 'warmed' else (
+                    self.style.WARNING if status == 'cached' else self.style.ERROR
+                )
+                self.stdout.write(style(f'Menu {menu_id}, {party_size} people: {status}'))
+        self.stdout.write(self.style.SUCCESS('Warm-up complete!'))
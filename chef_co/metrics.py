@@ -0,0 +1,266 @@
+"""
+Minimal in-process metrics registry rendered in the Prometheus text format.
+
+Each worker process keeps its own counters; scrape every worker (or run a
+single worker per pod) to get complete numbers.
+"""
+import threading
+from collections import defaultdict
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = []
+    for name, value in pairs:
+        value = str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+        escaped.append(f'{name}="{value}"')
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """
+    Base class for a labelled metric family.
+    """
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self):
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values = defaultdict(float)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] += amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values = defaultdict(float)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] += amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._counts = {}
+        self._sums = defaultdict(float)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * len(self.buckets))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._sums[key] += value
+
+    def count(self, **labels):
+        counts = self._counts.get(self._key(labels))
+        return counts[-1] if counts else 0
+
+    def _samples(self):
+        with self._lock:
+            items = sorted((key, list(counts), self._sums[key]) for key, counts in self._counts.items())
+        lines = []
+        for key, counts, total in items:
+            for bound, count in zip(self.buckets, counts):
+                labels = _format_labels(self.labelnames, key, ('le', _format_value(float(bound))))
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {counts[-1]}")
+        return lines
+
+
+class Registry:
+    """
+    Holds metric families and renders them for the /metrics endpoint.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+# Request level metrics, recorded by MetricsMiddleware
+http_request_duration = registry.histogram(
+    'chef_co_http_request_duration_seconds',
+    'Request latency by endpoint.',
+    ['endpoint', 'method', 'status']
+)
+db_queries = registry.histogram(
+    'chef_co_db_queries_per_request',
+    'Number of SQL queries executed per request.',
+    ['endpoint'],
+    buckets=COUNT_BUCKETS
+)
+db_query_duration = registry.histogram(
+    'chef_co_db_time_per_request_seconds',
+    'Total SQL time spent per request.',
+    ['endpoint']
+)
+
+# Prediction path metrics
+prediction_stage_duration = registry.histogram(
+    'chef_co_prediction_stage_seconds',
+    'Time spent in each stage of a prediction (reference loading, prompt building, LLM call, saving).',
+    ['stage']
+)
+llm_request_duration = registry.histogram(
+    'chef_co_llm_request_duration_seconds',
+    'Latency of LLM completion calls.',
+    ['model', 'outcome']
+)
+llm_tokens = registry.counter(
+    'chef_co_llm_tokens_total',
+    'Tokens consumed by LLM completion calls.',
+    ['model', 'kind']
+)
+llm_route_duration = registry.histogram(
+    'chef_co_llm_route_duration_seconds',
+    'Total LLM time of a prediction per route, across its chunks.',
+    ['route']
+)
+llm_route_cost = registry.counter(
+    'chef_co_llm_route_cost_usd_total',
+    'Estimated LLM spend per route, from the prices in CHEF_CO_LLM_ROUTES.',
+    ['route']
+)
+llm_route_fallbacks = registry.counter(
+    'chef_co_llm_route_fallbacks_total',
+    'Predictions retried on a larger route after failing validation.',
+    ['route', 'fallback']
+)
+prediction_validation_issues = registry.counter(
+    'chef_co_prediction_validation_issues_total',
+    'Problems found when checking predictions against their references, and whether they were repaired.',
+    ['kind', 'repaired']
+)
+
+# Admission control metrics
+admission_queue_depth = registry.gauge(
+    'chef_co_admission_queue_depth',
+    'Prediction requests waiting for a free slot.'
+)
+admission_decisions = registry.counter(
+    'chef_co_admission_decisions_total',
+    'Prediction requests admitted or refused, by outcome.',
+    ['outcome']
+)
+admission_wait = registry.histogram(
+    'chef_co_admission_wait_seconds',
+    'Time admitted prediction requests spent queued for a slot.'
+)
+
+# Authentication metrics
+auth_cache_lookups = registry.counter(
+    'chef_co_auth_cache_lookups_total',
+    'Token authentication lookups by the layer that answered them.',
+    ['result']
+)
@@ -0,0 +1,94 @@
+import time
+
+from django.db import connections
+from django.urls import reverse
+
+from .metrics import http_request_duration, db_queries, db_query_duration
+from .models import ProfileReport
+from .profiling import MODE_DOWNLOAD, profile_request, profiling_settings, report_download, requested_mode, staff_user
+
+
+class MetricsMiddleware:
+    """
+    Records per-endpoint request latency plus the number of SQL queries
+    and the time spent in them.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = {'queries': 0, 'seconds': 0.0}
+
+        def query_timer(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                stats['queries'] += 1
+                stats['seconds'] += time.perf_counter() - start
+
+        wrapped = []
+        start = time.perf_counter()
+        try:
+            for connection in connections.all():
+                connection.execute_wrappers.append(query_timer)
+                wrapped.append(connection)
+            response = self.get_response(request)
+        finally:
+            for connection in wrapped:
+                connection.execute_wrappers.remove(query_timer)
+
+        elapsed = time.perf_counter() - start
+        endpoint = self.endpoint_name(request)
+        http_request_duration.observe(
+            elapsed, endpoint=endpoint, method=request.method, status=response.status_code
+        )
+        db_queries.observe(stats['queries'], endpoint=endpoint)
+        db_query_duration.observe(stats['seconds'], endpoint=endpoint)
+        return response
+
+    @staticmethod
+    def endpoint_name(request):
+        """
+        Use the URL name (e.g. "partyorder-predict-quantities") so labels stay low-cardinality.
+        """
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return 'unmatched'
+        return match.view_name or match.route or 'unnamed'
+
+
+class ProfilingMiddleware:
+    """
+    Profiles requests from staff users who ask for it with the
+    ``X-Chef-Profile`` header or ``profile`` query parameter; every other
+    request is passed straight through.
+
+    Streaming responses are profiled up to the point the response is
+    returned, not while their body is produced.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        config = profiling_settings()
+        mode = config['ENABLED'] and requested_mode(request, config)
+        user = mode and staff_user(request)
+        if not user:
+            return self.get_response(request)
+
+        response, fields = profile_request(self.get_response, request, config)
+        report = ProfileReport.objects.create(
+            user=user,
+            method=request.method,
+            path=request.get_full_path()[:2000],
+            status_code=response.status_code,
+            **fields
+        )
+        if mode == MODE_DOWNLOAD:
+            return report_download(report)
+        response['X-Chef-Profile-Report'] = str(report.pk)
+        response['X-Chef-Profile-URL'] = reverse('profile-report', args=[report.pk])
+        return response
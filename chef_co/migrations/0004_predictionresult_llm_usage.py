@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chef_co', '0003_alter_predictionresult_options_alter_partyorder_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='predictionresult',
+            name='completion_tokens',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='predictionresult',
+            name='llm_latency_ms',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='predictionresult',
+            name='prompt_tokens',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
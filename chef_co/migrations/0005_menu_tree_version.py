@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chef_co', '0004_predictionresult_llm_usage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='menu',
+            name='tree_updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='menu',
+            name='tree_version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,103 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+INTERPOLATE = 'interpolate'
+EXTRAPOLATE = 'extrapolate'
+
+
+def segment(lower, upper, slope, intercept, unit, kind):
+    return {
+        'lower_bound': lower,
+        'upper_bound': upper,
+        'slope': slope,
+        'intercept': intercept,
+        'unit': unit,
+        'kind': kind,
+    }
+
+
+def fit_curve(points):
+    # Frozen copy of chef_co.scaling.fit_curve as of this migration
+    points = sorted(points, key=lambda point: point[0])
+    if not points:
+        return []
+
+    if len(points) == 1:
+        size, quantity, unit = points[0]
+        slope = quantity / size if size else 0.0
+        intercept = 0.0 if size else quantity
+        return [segment(0, None, slope, intercept, unit, EXTRAPOLATE)]
+
+    n = len(points)
+    mean_size = sum(p[0] for p in points) / n
+    mean_quantity = sum(p[1] for p in points) / n
+    variance = sum((p[0] - mean_size) ** 2 for p in points)
+    covariance = sum((p[0] - mean_size) * (p[1] - mean_quantity) for p in points)
+    fitted_slope = max(0.0, covariance / variance) if variance else 0.0
+
+    segments = []
+    first_size, first_quantity, first_unit = points[0]
+    if first_size > 0:
+        segments.append(segment(
+            0, first_size, fitted_slope, first_quantity - fitted_slope * first_size, first_unit, EXTRAPOLATE
+        ))
+    for (size_a, quantity_a, unit_a), (size_b, quantity_b, _) in zip(points, points[1:]):
+        slope = (quantity_b - quantity_a) / (size_b - size_a)
+        segments.append(segment(size_a, size_b, slope, quantity_a - slope * size_a, unit_a, INTERPOLATE))
+    last_size, last_quantity, last_unit = points[-1]
+    segments.append(segment(
+        last_size, None, fitted_slope, last_quantity - fitted_slope * last_size, last_unit, EXTRAPOLATE
+    ))
+    return segments
+
+
+def build_curves(apps, schema_editor):
+    MenuItem = apps.get_model('chef_co', 'MenuItem')
+    QuantityReference = apps.get_model('chef_co', 'QuantityReference')
+    ScalingSegment = apps.get_model('chef_co', 'ScalingSegment')
+
+    item_menus = dict(MenuItem.objects.values_list('pk', 'course__menu_id'))
+    points = {}
+    for item_id, party_size, quantity, unit in QuantityReference.objects.values_list(
+        'menu_item_id', 'party_size', 'quantity_value', 'unit'
+    ):
+        points.setdefault(item_id, []).append((party_size, float(quantity), unit))
+
+    ScalingSegment.objects.bulk_create([
+        ScalingSegment(menu_item_id=item_id, menu_id=item_menus[item_id], reference_count=len(item_points), **definition)
+        for item_id, item_points in points.items()
+        for definition in fit_curve(item_points)
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chef_co', '0005_menu_tree_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScalingSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lower_bound', models.PositiveIntegerField()),
+                ('upper_bound', models.PositiveIntegerField(blank=True, null=True)),
+                ('slope', models.FloatField()),
+                ('intercept', models.FloatField()),
+                ('unit', models.CharField(max_length=20)),
+                ('kind', models.CharField(choices=[('interpolate', 'Interpolated between two references'), ('extrapolate', 'Extrapolated with the fitted slope')], max_length=12)),
+                ('reference_count', models.PositiveIntegerField()),
+                ('menu', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scaling_segments', to='chef_co.menu')),
+                ('menu_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scaling_segments', to='chef_co.menuitem')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['menu', 'lower_bound'], name='chef_co_seg_menu_lower_idx')],
+                'unique_together': {('menu_item', 'lower_bound')},
+            },
+        ),
+        migrations.RunPython(build_curves, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chef_co', '0007_sync_change_feed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Ingredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('unit', models.CharField(max_length=20)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Recipe',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('yield_quantity', models.DecimalField(decimal_places=3, default=1, max_digits=10)),
+                ('yield_unit', models.CharField(max_length=20)),
+                ('menu_item', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='recipe', to='chef_co.menuitem')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RecipeLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.DecimalField(decimal_places=4, max_digits=10)),
+                ('ingredient', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='recipe_lines', to='chef_co.ingredient')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='chef_co.recipe')),
+                ('sub_recipe', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='used_in', to='chef_co.recipe')),
+            ],
+            options={
+                'constraints': [models.CheckConstraint(condition=models.Q(models.Q(('ingredient__isnull', False), ('sub_recipe__isnull', True)), models.Q(('ingredient__isnull', True), ('sub_recipe__isnull', False)), _connector='OR'), name='chef_co_recipeline_one_component')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chef_co', '0009_event_orders'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedPrediction',
+            fields=[
+                ('prediction', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='archive', serialize=False, to='chef_co.predictionresult')),
+                ('codec', models.CharField(max_length=10)),
+                ('payload', models.BinaryField()),
+                ('raw_size', models.PositiveIntegerField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='predictionresult',
+            name='archived_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='predictionresult',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:50
+
+import hashlib
+import json
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+BATCH_SIZE = 1000
+
+
+def digest(data):
+    # Must match chef_co.models.payload_digest
+    canonical = json.dumps(data, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def backfill_payloads(apps, schema_editor):
+    PredictionResult = apps.get_model('chef_co', 'PredictionResult')
+    PredictionPayload = apps.get_model('chef_co', 'PredictionPayload')
+    # Archived rows keep their payload in ArchivedPrediction
+    live = PredictionResult.objects.filter(archived_at__isnull=True).order_by('pk')
+
+    last_pk = 0
+    while True:
+        batch = list(live.filter(pk__gt=last_pk).values_list('pk', 'result_data')[:BATCH_SIZE])
+        if not batch:
+            return
+        last_pk = batch[-1][0]
+
+        rows = {}
+        documents = {}
+        for pk, result_data in batch:
+            key = digest(result_data)
+            documents[key] = result_data
+            rows.setdefault(key, []).append(pk)
+        existing = set(PredictionPayload.objects.filter(pk__in=list(documents)).values_list('pk', flat=True))
+        PredictionPayload.objects.bulk_create([
+            PredictionPayload(digest=key, data=data) for key, data in documents.items() if key not in existing
+        ])
+        for key, pks in rows.items():
+            PredictionResult.objects.filter(pk__in=pks).update(payload_id=key)
+
+
+def restore_result_data(apps, schema_editor):
+    PredictionResult = apps.get_model('chef_co', 'PredictionResult')
+    for prediction in PredictionResult.objects.select_related('payload').iterator(chunk_size=BATCH_SIZE):
+        prediction.result_data = prediction.payload.data if prediction.payload_id else {}
+        prediction.save(update_fields=['result_data'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chef_co', '0010_prediction_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PredictionPayload',
+            fields=[
+                ('digest', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('data', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='predictionresult',
+            name='payload',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='predictions', to='chef_co.predictionpayload'),
+        ),
+        # Nullable only so the column can be re-added and refilled when migrating backwards
+        migrations.AlterField(
+            model_name='predictionresult',
+            name='result_data',
+            field=models.JSONField(null=True),
+        ),
+        migrations.RunPython(backfill_payloads, restore_result_data),
+        migrations.RemoveField(
+            model_name='predictionresult',
+            name='result_data',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chef_co', '0011_prediction_payloads'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='predictionresult',
+            name='validation_status',
+            field=models.CharField(blank=True, choices=[('valid', 'Valid'), ('repaired', 'Repaired'), ('invalid', 'Invalid')], db_index=True, max_length=16),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chef_co', '0012_prediction_validation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdmissionLease',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(db_index=True, max_length=150)),
+                ('state', models.CharField(choices=[('waiting', 'Waiting'), ('running', 'Running')], max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RateLimitBucket',
+            fields=[
+                ('key', models.CharField(max_length=150, primary_key=True, serialize=False)),
+                ('tokens', models.FloatField()),
+                ('updated_at', models.FloatField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,103 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:22
+
+import gzip
+import hashlib
+import json
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - exercised only without zstandard
+    zstandard = None
+
+
+BATCH_SIZE = 1000
+
+
+def digest(data):
+    # Must match chef_co.models.payload_digest
+    canonical = json.dumps(data, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def decompress(data, codec):
+    # Frozen copy of chef_co.archive.decompress
+    data = bytes(data)
+    if codec == 'gzip':
+        return gzip.decompress(data)
+    if zstandard is None:
+        raise RuntimeError("Migrating zstd archives needs the zstandard package")
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+def share_archives(apps, schema_editor):
+    ArchivedPrediction = apps.get_model('chef_co', 'ArchivedPrediction')
+    ArchivedPayload = apps.get_model('chef_co', 'ArchivedPayload')
+    PredictionResult = apps.get_model('chef_co', 'PredictionResult')
+
+    last_pk = 0
+    while True:
+        batch = list(ArchivedPrediction.objects.filter(pk__gt=last_pk).order_by('pk')[:BATCH_SIZE])
+        if not batch:
+            return
+        last_pk = batch[-1].pk
+
+        archives = {}
+        rows = {}
+        for archive in batch:
+            key = digest(json.loads(decompress(archive.payload, archive.codec)))
+            archives.setdefault(key, ArchivedPayload(
+                digest=key, codec=archive.codec, payload=archive.payload, raw_size=archive.raw_size
+            ))
+            rows.setdefault(key, []).append(archive.prediction_id)
+        ArchivedPayload.objects.bulk_create(archives.values(), ignore_conflicts=True)
+        for key, pks in rows.items():
+            PredictionResult.objects.filter(pk__in=pks).update(archived_payload_id=key)
+
+
+def split_archives(apps, schema_editor):
+    ArchivedPrediction = apps.get_model('chef_co', 'ArchivedPrediction')
+    PredictionResult = apps.get_model('chef_co', 'PredictionResult')
+    archived = PredictionResult.objects.filter(archived_payload__isnull=False).select_related('archived_payload')
+    for prediction in archived.iterator(chunk_size=BATCH_SIZE):
+        archive = prediction.archived_payload
+        ArchivedPrediction.objects.create(
+            prediction=prediction, codec=archive.codec, payload=archive.payload, raw_size=archive.raw_size
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chef_co', '0014_profile_reports'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedPayload',
+            fields=[
+                ('digest', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('codec', models.CharField(max_length=10)),
+                ('payload', models.BinaryField()),
+                ('raw_size', models.PositiveIntegerField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        # Added under a temporary name: 'archive' is ArchivedPrediction's reverse accessor until it is deleted
+        migrations.AddField(
+            model_name='predictionresult',
+            name='archived_payload',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='predictions', to='chef_co.archivedpayload'),
+        ),
+        migrations.RunPython(share_archives, split_archives),
+        migrations.DeleteModel(
+            name='ArchivedPrediction',
+        ),
+        migrations.RenameField(
+            model_name='predictionresult',
+            old_name='archived_payload',
+            new_name='archive',
+        ),
+    ]
@@ -1,5 +1,11 @@
-from django.db import models
+import hashlib
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import F, Q
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 
 class Menu(models.Model):
@@ -10,9 +16,26 @@ class Menu(models.Model):
     description = models.TextField(blank=True)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)  # Drives the sync change feed
+    # Bumped whenever the menu or any course, item or reference under it changes
+    tree_version = models.PositiveIntegerField(default=1)
+    tree_updated_at = models.DateTimeField(default=timezone.now)
     
     def __str__(self):
         return self.name
+    
+    @classmethod
+    def bump_tree_version(cls, menu_ids):
+        """
+        Mark the given menus' trees as changed without triggering save signals.
+        """
+        menu_ids = {menu_id for menu_id in menu_ids if menu_id is not None}
+        if not menu_ids:
+            return 0
+        return cls.objects.filter(pk__in=menu_ids).update(
+            tree_version=F('tree_version') + 1,
+            tree_updated_at=timezone.now()
+        )
 
 
 class Course(models.Model):
@@ -22,6 +45,7 @@ class Course(models.Model):
     name = models.CharField(max_length=100)
     menu = models.ForeignKey(Menu, related_name='courses', on_delete=models.CASCADE)
     order = models.PositiveIntegerField(default=0)  # To maintain course order
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     def __str__(self):
         return f"{self.menu.name} - {self.name}"
@@ -36,6 +60,7 @@ class MenuItem(models.Model):
     """
     name = models.CharField(max_length=100)
     course = models.ForeignKey(Course, related_name='menu_items', on_delete=models.CASCADE)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     def __str__(self):
         return self.name
@@ -50,6 +75,7 @@ class QuantityReference(models.Model):
     party_size = models.PositiveIntegerField()  # e.g., 50, 100, 250, 500
     quantity_value = models.DecimalField(max_digits=10, decimal_places=2)  # numeric value (e.g., 2.0)
     unit = models.CharField(max_length=20)  # e.g., "KG", "PC"
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     def __str__(self):
         return f"{self.menu_item.name} - {self.quantity_value} {self.unit} for {self.party_size} people"
@@ -58,6 +84,151 @@ class QuantityReference(models.Model):
         unique_together = ['menu_item', 'party_size']
 
 
+class ScalingSegment(models.Model):
+    """
+    One linear piece of a menu item's scaling curve, materialized from its quantity references.
+    For lower_bound <= party_size < upper_bound: quantity = intercept + slope * party_size
+    """
+    INTERPOLATE = 'interpolate'
+    EXTRAPOLATE = 'extrapolate'
+    KIND_CHOICES = [
+        (INTERPOLATE, 'Interpolated between two references'),
+        (EXTRAPOLATE, 'Extrapolated with the fitted slope'),
+    ]
+    
+    menu_item = models.ForeignKey(MenuItem, related_name='scaling_segments', on_delete=models.CASCADE)
+    menu = models.ForeignKey(Menu, related_name='scaling_segments', on_delete=models.CASCADE)  # Denormalized for menu-wide lookups
+    lower_bound = models.PositiveIntegerField()
+    upper_bound = models.PositiveIntegerField(null=True, blank=True)  # None means unbounded
+    slope = models.FloatField()
+    intercept = models.FloatField()
+    unit = models.CharField(max_length=20)
+    kind = models.CharField(max_length=12, choices=KIND_CHOICES)
+    reference_count = models.PositiveIntegerField()  # References the curve was built from
+    
+    def __str__(self):
+        upper = self.upper_bound if self.upper_bound is not None else '∞'
+        return f"Segment [{self.lower_bound}, {upper}) for item {self.menu_item_id}"
+    
+    def covers(self, party_size):
+        return self.lower_bound <= party_size and (self.upper_bound is None or party_size < self.upper_bound)
+    
+    def quantity_for(self, party_size):
+        return max(0.0, self.intercept + self.slope * party_size)
+    
+    class Meta:
+        unique_together = ['menu_item', 'lower_bound']
+        indexes = [
+            models.Index(fields=['menu', 'lower_bound'], name='chef_co_seg_menu_lower_idx'),
+        ]
+
+
+class Ingredient(models.Model):
+    """
+    A raw ingredient bought for the kitchen (e.g., "Chicken", "Onion")
+    """
+    name = models.CharField(max_length=100, unique=True)
+    unit = models.CharField(max_length=20)  # Unit recipe lines use for this ingredient, e.g. "KG"
+    
+    def __str__(self):
+        return f"{self.name} ({self.unit})"
+    
+    class Meta:
+        ordering = ['name']
+
+
+class Recipe(models.Model):
+    """
+    Bill of materials for a menu item or a reusable sub-recipe (e.g., a spice mix).
+    Line quantities are per ``yield_quantity`` ``yield_unit`` of output.
+    """
+    name = models.CharField(max_length=100)
+    menu_item = models.OneToOneField(
+        MenuItem, related_name='recipe', on_delete=models.CASCADE, null=True, blank=True
+    )  # Empty for sub-recipes only used inside other recipes
+    yield_quantity = models.DecimalField(max_digits=10, decimal_places=3, default=1)
+    yield_unit = models.CharField(max_length=20)  # Must be convertible to the menu item's predicted unit
+    
+    def __str__(self):
+        return self.name
+
+
+class RecipeLine(models.Model):
+    """
+    One component of a recipe: an ingredient or a sub-recipe
+    """
+    recipe = models.ForeignKey(Recipe, related_name='lines', on_delete=models.CASCADE)
+    ingredient = models.ForeignKey(Ingredient, related_name='recipe_lines', on_delete=models.PROTECT, null=True, blank=True)
+    sub_recipe = models.ForeignKey(Recipe, related_name='used_in', on_delete=models.PROTECT, null=True, blank=True)
+    quantity = models.DecimalField(max_digits=10, decimal_places=4)  # In the ingredient's unit or the sub-recipe's yield unit
+    
+    def __str__(self):
+        component = self.ingredient or self.sub_recipe
+        return f"{self.recipe}: {self.quantity} of {component}"
+    
+    def clean(self):
+        if (self.ingredient_id is None) == (self.sub_recipe_id is None):
+            raise ValidationError("Set either an ingredient or a sub-recipe.")
+        if self.sub_recipe_id is not None and self.recipe_id is not None:
+            # Walk down the sub-recipe tree; reaching this recipe again would be a cycle
+            seen, frontier = set(), {self.sub_recipe_id}
+            while frontier:
+                if self.recipe_id in frontier:
+                    raise ValidationError({'sub_recipe': "A recipe cannot contain itself."})
+                seen |= frontier
+                frontier = set(RecipeLine.objects.filter(
+                    recipe_id__in=frontier, sub_recipe__isnull=False
+                ).values_list('sub_recipe_id', flat=True)) - seen
+    
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                condition=(
+                    Q(ingredient__isnull=False, sub_recipe__isnull=True)
+                    | Q(ingredient__isnull=True, sub_recipe__isnull=False)
+                ),
+                name='chef_co_recipeline_one_component',
+            ),
+        ]
+
+
+class Tombstone(models.Model):
+    """
+    Records a deleted menu, course, item or reference for the sync change feed
+    """
+    MENU = 'menus'
+    COURSE = 'courses'
+    MENU_ITEM = 'menu_items'
+    QUANTITY_REFERENCE = 'quantity_references'
+    KIND_CHOICES = [
+        (MENU, 'Menu'),
+        (COURSE, 'Course'),
+        (MENU_ITEM, 'Menu item'),
+        (QUANTITY_REFERENCE, 'Quantity reference'),
+    ]
+    
+    kind = models.CharField(max_length=32, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now, db_index=True)
+    
+    def __str__(self):
+        return f"Deleted {self.kind} {self.object_id}"
+
+
+class Event(models.Model):
+    """
+    An event served from several menus, each for its own guest count.
+    Its lines are PartyOrders pointing back to it.
+    """
+    name = models.CharField(max_length=255)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    event_date = models.DateField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return self.name
+
+
 class PartyOrder(models.Model):
     """
     Represents a user's request for a menu for a specific party size
@@ -66,25 +237,133 @@ class PartyOrder(models.Model):
     menu = models.ForeignKey(Menu, on_delete=models.CASCADE)
     party_size = models.PositiveIntegerField()
     created_at = models.DateTimeField(auto_now_add=True)
+    event = models.ForeignKey(Event, related_name='orders', on_delete=models.CASCADE, null=True, blank=True)
     
     def __str__(self):
         return f"{self.menu.name} for {self.party_size} people"
 
 
+def payload_digest(data):
+    """
+    SHA-256 of the canonical JSON encoding, so equal payloads share a digest.
+    """
+    canonical = json.dumps(data, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class PredictionPayload(models.Model):
+    """
+    A prediction JSON document stored once and shared by every prediction with the same content.
+    Rows are immutable: changing a prediction points it at another payload.
+    """
+    digest = models.CharField(max_length=64, primary_key=True)
+    data = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return self.digest[:12]
+    
+    @classmethod
+    def intern(cls, by_digest):
+        """
+        Return {digest: payload} for a {digest: data} mapping, inserting the
+        missing payloads in one statement. Existing payloads are locked until
+        the caller's transaction ends, so collection cannot delete one that
+        is about to be referenced.
+        """
+        payloads = cls.objects.select_for_update().in_bulk(list(by_digest))
+        missing = [cls(digest=digest, data=data) for digest, data in by_digest.items() if digest not in payloads]
+        if missing:
+            # Another writer may insert the same content concurrently; either row will do
+            cls.objects.bulk_create(missing, ignore_conflicts=True)
+            payloads.update({payload.digest: payload for payload in missing})
+        return payloads
+
+
+_UNSET = object()
+
+
+class PredictionResultQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        with transaction.atomic():
+            PredictionResult.attach_payloads(objs)
+            return super().bulk_create(objs, *args, **kwargs)
+
+
 class PredictionResult(models.Model):
     """
     Stores saved predictions for future reference
     """
     party_order = models.ForeignKey(PartyOrder, related_name='predictions', on_delete=models.CASCADE)
-    result_data = models.JSONField()  # Stores the complete prediction JSON
-    created_at = models.DateTimeField(auto_now_add=True)
+    # The complete prediction JSON, shared between identical predictions; empty once archived
+    payload = models.ForeignKey(
+        PredictionPayload, related_name='predictions', on_delete=models.PROTECT, null=True, blank=True
+    )
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    archived_at = models.DateTimeField(null=True, blank=True, db_index=True)  # Payload moved to ArchivedPayload
+    archive = models.ForeignKey(
+        'ArchivedPayload', related_name='predictions', on_delete=models.PROTECT, null=True, blank=True
+    )
     name = models.CharField(max_length=255, blank=True)  # Optional name for the prediction
+    # LLM usage for the call that produced this prediction
+    prompt_tokens = models.PositiveIntegerField(null=True, blank=True)
+    completion_tokens = models.PositiveIntegerField(null=True, blank=True)
+    llm_latency_ms = models.FloatField(null=True, blank=True)
+    # Outcome of checking the prediction against its references; blank for older predictions
+    validation_status = models.CharField(
+        max_length=16, blank=True, db_index=True,
+        choices=[('valid', 'Valid'), ('repaired', 'Repaired'), ('invalid', 'Invalid')]
+    )
+    
+    objects = PredictionResultQuerySet.as_manager()
+    
+    @property
+    def result_data(self):
+        """
+        The prediction JSON. Assigning it takes effect in the database on the
+        next save(), bulk_create() or attach_payloads().
+        """
+        pending = self.__dict__.get('_pending_result_data', _UNSET)
+        if pending is not _UNSET:
+            return pending
+        return self.payload.data if self.payload_id is not None else {}
+    
+    @result_data.setter
+    def result_data(self, value):
+        self.__dict__['_pending_result_data'] = value
+    
+    @staticmethod
+    def attach_payloads(predictions, changed=False):
+        """
+        Point the predictions at the payloads for their result_data. With
+        ``changed``, documents edited in place are re-addressed as well.
+        Call it in the transaction that saves the predictions.
+        """
+        predictions = [
+            prediction for prediction in predictions
+            if changed or '_pending_result_data' in prediction.__dict__
+        ]
+        if not predictions:
+            return
+        digests = [payload_digest(prediction.result_data) for prediction in predictions]
+        payloads = PredictionPayload.intern({
+            digest: prediction.result_data for digest, prediction in zip(digests, predictions)
+        })
+        for digest, prediction in zip(digests, predictions):
+            prediction.payload = payloads[digest]
+            prediction.__dict__.pop('_pending_result_data', None)
     
     def save(self, *args, **kwargs):
         # Replace empty or "string" names with party order string representation
         if not self.name or self.name == "string":
             self.name = str(self.party_order)
-        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and '_pending_result_data' in self.__dict__:
+            kwargs['update_fields'] = {*update_fields, 'payload'}
+        with transaction.atomic():
+            self.attach_payloads([self])
+            super().save(*args, **kwargs)
     
     def __str__(self):
         if self.name:
@@ -95,3 +374,70 @@ class PredictionResult(models.Model):
         ordering = ['-created_at']
         verbose_name = "Past order prediction"
         verbose_name_plural = "Past order predictions"
+
+
+class ArchivedPayload(models.Model):
+    """
+    A compressed prediction payload, stored once for every archived
+    prediction that shares it. The PredictionResult rows stay behind as slim
+    index entries pointing here.
+    """
+    digest = models.CharField(max_length=64, primary_key=True)  # Same digest as the PredictionPayload it replaces
+    codec = models.CharField(max_length=10)  # "gzip" or "zstd"
+    payload = models.BinaryField()
+    raw_size = models.PositiveIntegerField()  # Bytes of the uncompressed JSON
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"Archive {self.digest[:12]}"
+
+
+class RateLimitBucket(models.Model):
+    """
+    Token bucket shared by every worker, one per user or for the whole site.
+    """
+    key = models.CharField(max_length=150, primary_key=True)
+    tokens = models.FloatField()
+    updated_at = models.FloatField()  # time.time() of the last refill
+    
+    def __str__(self):
+        return f"{self.key}: {self.tokens:.2f} tokens"
+
+
+class AdmissionLease(models.Model):
+    """
+    A prediction request that is running or queued for a slot. Leases expire,
+    so a worker that dies mid-request does not hold its slot forever.
+    """
+    WAITING = 'waiting'
+    RUNNING = 'running'
+    
+    key = models.CharField(max_length=150, db_index=True)  # User or client address
+    state = models.CharField(max_length=10, choices=[(WAITING, 'Waiting'), (RUNNING, 'Running')])
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    def __str__(self):
+        return f"{self.key} ({self.state})"
+
+
+class ProfileReport(models.Model):
+    """
+    Profile of one request, taken on demand by a staff user.
+    """
+    user = models.ForeignKey(User, related_name='profile_reports', on_delete=models.SET_NULL, null=True)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=2000)
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    query_count = models.PositiveIntegerField()
+    query_ms = models.FloatField()
+    queries = models.JSONField(default=list)  # Statements with timings; the slowest SELECTs carry their EXPLAIN
+    profile = models.TextField(blank=True)  # cProfile table sorted by cumulative time
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms} ms)"
@@ -0,0 +1,443 @@
+"""
+Prediction pipeline: reference loading, prompt building and the OpenAI call.
+
+Each stage is timed into the metrics registry so slow predictions can be
+attributed to the database, prompt building or the LLM.
+
+Two modes are supported:
+
+* ``llm`` sends the whole menu to the model.
+* ``hybrid`` computes every well-referenced item locally from its scaling
+  curve and only sends the remaining items to the model.
+
+The model, token limit and chunking of each LLM request come from the
+routes in ``routing``.
+"""
+import json
+import os
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from .metrics import (
+    prediction_stage_duration, llm_request_duration, llm_tokens,
+    llm_route_cost, llm_route_duration, llm_route_fallbacks
+)
+from .models import Menu
+from .routing import chunk_reference_data, cost_usd, count_items, get_route, select_route
+from .scaling import fit_curve, segments_for_many
+
+
+DEFAULT_MODEL = 'gpt-4o'
+DEFAULT_MAX_TOKENS = 2000
+
+MODE_LLM = 'llm'
+MODE_HYBRID = 'hybrid'
+PREDICTION_MODES = (MODE_LLM, MODE_HYBRID)
+
+SOURCE_LOCAL = 'local'
+SOURCE_LLM = 'llm'
+
+SYSTEM_PROMPT = (
+    "You are a calculator for food quantities. Your only job is to perform linear "
+    "interpolation based on party sizes and return correctly formatted JSON. Maintain the original units."
+)
+
+
+@contextmanager
+def stage_timer(stage):
+    """
+    Record the wall time of a prediction stage.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        prediction_stage_duration.observe(time.perf_counter() - start, stage=stage)
+
+
+def load_menu(menu_id):
+    """
+    Fetch a menu with its whole course, item and reference tree in a fixed number of queries.
+    """
+    return Menu.objects.prefetch_related(
+        'courses__menu_items__quantity_references'
+    ).get(id=menu_id)
+
+
+def build_reference_data(menu, party_size):
+    """
+    Build the reference structure sent to the LLM from a prefetched menu.
+    """
+    reference_data = {"party_size": party_size, "courses": []}
+
+    for course in menu.courses.all():
+        course_data = {
+            "course_name": course.name,
+            "items": []
+        }
+
+        for item in course.menu_items.all():
+            item_data = {
+                "item_name": item.name,
+                "reference_quantities": []
+            }
+
+            # Sort the prefetched references in Python; order_by() would re-query per item
+            references = sorted(item.quantity_references.all(), key=lambda ref: ref.party_size)
+            for ref in references:
+                item_data["reference_quantities"].append({
+                    "party_size": ref.party_size,
+                    "quantity": float(ref.quantity_value),
+                    "unit": ref.unit
+                })
+
+            course_data["items"].append(item_data)
+
+        reference_data["courses"].append(course_data)
+
+    return reference_data
+
+
+def build_prompt(reference_data, party_size):
+    """
+    Create a very explicit prompt with clear examples
+    """
+    return f"""
+        Your task is to predict food quantities needed for a party of {party_size} people.
+
+        The reference data contains known quantities for standard party sizes (typically 50, 100, 250, 500 people).
+
+        The relationship between party size and quantity is typically linear. For example:
+        - If 50 people need 2KG and 100 people need 4KG, then 75 people would need 3KG.
+        - If 50 people need 200 pieces and 100 people need 500 pieces, then 75 people would need 350 pieces.
+
+        Here is the reference data:
+        {reference_data}
+
+        For each menu item, calculate the appropriate quantity for {party_size} people by using linear interpolation/extrapolation from the reference data.
+
+        Return a JSON object with the following structure:
+        {{
+          "predictions": [
+            {{
+              "course_name": "COURSE_NAME",
+              "items": [
+                {{
+                  "item_name": "ITEM_NAME",
+                  "quantity_value": NUMERIC_VALUE,
+                  "unit": "ORIGINAL_UNIT"
+                }},
+                ...
+              ]
+            }},
+            ...
+          ]
+        }}
+
+        Important:
+        1. Preserve the original units exactly as they appear in the reference data (KG, PC, etc.)
+        2. Include ALL courses and ALL items from the reference data in your prediction
+        3. Calculate each value by proper linear scaling based on party size
+        """
+
+
+def request_prediction(prompt, model=DEFAULT_MODEL, max_tokens=DEFAULT_MAX_TOKENS):
+    """
+    Send the prompt to OpenAI and parse the JSON answer.
+    Returns (result_data, usage) where usage holds token counts and latency.
+    """
+    # The SDK takes most of a second to import; only prediction requests pay for it
+    import openai
+
+    client = openai.OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+
+    start = time.perf_counter()
+    outcome = 'error'
+    try:
+        # Call OpenAI API with strict parameters
+        response = client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            response_format={"type": "json_object"},
+            temperature=0.0,  # Zero temperature for deterministic outputs
+            max_tokens=max_tokens
+        )
+        outcome = 'ok'
+    finally:
+        elapsed = time.perf_counter() - start
+        llm_request_duration.observe(elapsed, model=model, outcome=outcome)
+        prediction_stage_duration.observe(elapsed, stage='llm')
+
+    usage = {
+        'model': model,
+        'prompt_tokens': None,
+        'completion_tokens': None,
+        'latency_ms': round(elapsed * 1000, 1),
+    }
+    if getattr(response, 'usage', None) is not None:
+        usage['prompt_tokens'] = response.usage.prompt_tokens
+        usage['completion_tokens'] = response.usage.completion_tokens
+        llm_tokens.inc(usage['prompt_tokens'] or 0, model=model, kind='prompt')
+        llm_tokens.inc(usage['completion_tokens'] or 0, model=model, kind='completion')
+
+    # Parse JSON to ensure it's valid
+    with stage_timer('parse'):
+        result_data = json.loads(response.choices[0].message.content)
+    return result_data, usage
+
+
+def request_routed(reference_data, party_size, route):
+    """
+    Ask the route's model for the items in ``reference_data``, one call per
+    chunk. Returns (result_data, usage) with the usage summed over the calls.
+    """
+    predictions = []
+    usage = {
+        'model': route['model'],
+        'route': route['name'],
+        'calls': 0,
+        'prompt_tokens': None,
+        'completion_tokens': None,
+        'latency_ms': 0.0,
+        'cost_usd': 0.0,
+    }
+    for chunk in chunk_reference_data(reference_data, route.get('chunk_items')):
+        with stage_timer('build_prompt'):
+            prompt = build_prompt(chunk, party_size)
+        chunk_result, chunk_usage = request_prediction(prompt, model=route['model'], max_tokens=route['max_tokens'])
+        if isinstance(chunk_result.get('predictions'), list):
+            predictions.extend(chunk_result['predictions'])
+        usage['calls'] += 1
+        usage['latency_ms'] += chunk_usage['latency_ms']
+        for key in ('prompt_tokens', 'completion_tokens'):
+            if chunk_usage[key] is not None:
+                usage[key] = (usage[key] or 0) + chunk_usage[key]
+
+    usage['latency_ms'] = round(usage['latency_ms'], 1)
+    usage['cost_usd'] = round(cost_usd(route, usage['prompt_tokens'], usage['completion_tokens']), 6)
+    llm_route_duration.observe(usage['latency_ms'] / 1000, route=route['name'])
+    llm_route_cost.inc(usage['cost_usd'], route=route['name'])
+    return {"predictions": predictions}, usage
+
+
+def merge_usage(first, second):
+    """
+    Usage of two attempts at one prediction, reported under the later one's model and route.
+    """
+    merged = dict(second)
+    for key in ('calls', 'prompt_tokens', 'completion_tokens', 'latency_ms', 'cost_usd'):
+        if first.get(key) is not None or second.get(key) is not None:
+            merged[key] = (first.get(key) or 0) + (second.get(key) or 0)
+    merged['fallback_from'] = first.get('fallback_from', []) + [first['route']]
+    return merged
+
+
+def required_reference_sizes():
+    """
+    Party sizes an item needs references for to be computed locally in hybrid mode.
+    """
+    return getattr(settings, 'CHEF_CO_REFERENCE_SIZES', [50, 100, 250, 500])
+
+
+def default_mode():
+    return getattr(settings, 'CHEF_CO_PREDICTION_MODE', MODE_LLM)
+
+
+def is_well_referenced(item_data, party_size, required_sizes):
+    """
+    True when the item has every required reference size in a single unit
+    and the party size lies inside the referenced range.
+    """
+    references = item_data["reference_quantities"]
+    sizes = {ref["party_size"] for ref in references}
+    units = {ref["unit"] for ref in references}
+    return (
+        bool(sizes)
+        and set(required_sizes) <= sizes
+        and len(units) == 1
+        and min(sizes) <= party_size <= max(sizes)
+    )
+
+
+def menu_curves(pairs):
+    """
+    For each (menu id, party size) pair, the (quantity, unit) of every item
+    with a materialized curve, keyed by item_key(). One query for all pairs.
+    """
+    return {
+        (menu_id, party_size): curves_at(segments, party_size)
+        for (menu_id, party_size), segments in segments_for_many(pairs).items()
+    }
+
+
+def curves_at(segments, party_size):
+    """
+    (quantity, unit) by item_key() from those of ``segments`` covering
+    ``party_size``; the segments need their item and course loaded.
+    """
+    return {
+        item_key(segment.menu_item.course.name, segment.menu_item.name):
+            (round(segment.quantity_for(party_size), 2), segment.unit)
+        for segment in segments if segment.covers(party_size)
+    }
+
+
+def interpolate_item(item_data, party_size, curve=None):
+    """
+    Scale one item from its references. ``curve`` is the item's entry in
+    menu_curves(); items without materialized segments are fitted from the
+    references with the same curve as ScalingSegment.
+    Returns (quantity, unit), or (None, None) without references.
+    """
+    if curve is not None:
+        return curve
+    points = [(ref["party_size"], ref["quantity"], ref["unit"]) for ref in item_data["reference_quantities"]]
+    for segment in fit_curve(points):
+        upper = segment['upper_bound']
+        if segment['lower_bound'] <= party_size and (upper is None or party_size < upper):
+            quantity = max(0.0, segment['intercept'] + segment['slope'] * party_size)
+            return round(quantity, 2), segment['unit']
+    return None, None
+
+
+def item_key(course_name, item_name):
+    return (str(course_name).strip().upper(), str(item_name).strip().upper())
+
+
+def refresh_sources(result_data):
+    """
+    Recount the per-source lines and missing items kept next to hybrid predictions.
+    """
+    sources = result_data.get('sources')
+    if not isinstance(sources, dict):
+        return
+    lines = [item for course in result_data.get('predictions', []) for item in course.get('items', [])]
+    sources[SOURCE_LOCAL] = sum(1 for item in lines if item.get('source') == SOURCE_LOCAL)
+    sources[SOURCE_LLM] = sum(1 for item in lines if item.get('source') == SOURCE_LLM)
+    present = {item_key(course.get('course_name'), item.get('item_name'))
+               for course in result_data.get('predictions', []) for item in course.get('items', [])}
+    sources['missing'] = [
+        entry for entry in sources.get('missing', [])
+        if item_key(entry.get('course_name'), entry.get('item_name')) not in present
+    ]
+
+
+def no_llm_usage():
+    return {
+        'model': None, 'route': None, 'calls': 0,
+        'prompt_tokens': 0, 'completion_tokens': 0, 'latency_ms': None, 'cost_usd': 0.0,
+    }
+
+
+def predict(menu, party_size, mode=MODE_LLM, latency_budget_ms=None, curves=None):
+    """
+    Predict quantities for a prefetched menu and check the answer against
+    its references, retrying on the route's fallback when it fails
+    validation. ``curves`` is the menu's entry in menu_curves(), loaded
+    here when not given. Returns (result_data, usage).
+    """
+    # Imported here: validation builds on the helpers in this module
+    from .validation import STATUS_INVALID, validate_prediction
+
+    if mode not in PREDICTION_MODES:
+        raise ValueError(f"Unknown prediction mode: {mode}")
+
+    with stage_timer('build_reference_data'):
+        reference_data = build_reference_data(menu, party_size)
+    if curves is None:
+        with stage_timer('load_curves'):
+            curves = menu_curves([(menu.pk, party_size)])[(menu.pk, party_size)]
+
+    route = None
+    spent = None
+    while True:
+        if mode == MODE_LLM:
+            route = route or select_route(count_items(reference_data), latency_budget_ms)
+            result_data, usage = request_routed(reference_data, party_size, route)
+        else:
+            result_data, usage = predict_hybrid(reference_data, party_size, latency_budget_ms, route=route, curves=curves)
+        if spent is not None:
+            usage = merge_usage(spent, usage)
+
+        with stage_timer('validate'):
+            record = validate_prediction(reference_data, result_data, party_size, curves=curves)
+
+        fallback = get_route(usage['route']).get('fallback') if usage['route'] else None
+        tried = usage.get('fallback_from', []) + [usage['route']]
+        if record['status'] != STATUS_INVALID or not fallback or fallback in tried:
+            return result_data, usage
+        llm_route_fallbacks.inc(route=usage['route'], fallback=fallback)
+        route = get_route(fallback)
+        spent = usage
+
+
+def predict_hybrid(reference_data, party_size, latency_budget_ms=None, route=None, curves=None):
+    """
+    Compute well-referenced items locally and ask the LLM only for the rest,
+    on ``route`` or the one selected for the number of items sent. Local
+    values come from ``curves`` (see menu_curves()) where the item has one.
+    """
+    required_sizes = required_reference_sizes()
+    curves = curves or {}
+    local = {}
+    remote = {"party_size": party_size, "courses": []}
+
+    with stage_timer('local_compute'):
+        for course in reference_data["courses"]:
+            remote_items = []
+            for item in course["items"]:
+                if is_well_referenced(item, party_size, required_sizes):
+                    key = item_key(course["course_name"], item["item_name"])
+                    local[key] = interpolate_item(item, party_size, curves.get(key))
+                else:
+                    remote_items.append(item)
+            if remote_items:
+                remote["courses"].append({"course_name": course["course_name"], "items": remote_items})
+
+    remote_answers = {}
+    usage = no_llm_usage()
+    if remote["courses"]:
+        route = route or select_route(count_items(remote), latency_budget_ms)
+        llm_result, usage = request_routed(remote, party_size, route)
+        for course in llm_result.get("predictions", []):
+            for item in course.get("items", []):
+                remote_answers[item_key(course.get("course_name"), item.get("item_name"))] = item
+
+    # Merge in reference order, recording where each value came from
+    predictions = []
+    missing = []
+    counts = {SOURCE_LOCAL: 0, SOURCE_LLM: 0}
+    for course in reference_data["courses"]:
+        items = []
+        for item in course["items"]:
+            key = item_key(course["course_name"], item["item_name"])
+            if key in local:
+                quantity, unit = local[key]
+                source = SOURCE_LOCAL
+            elif key in remote_answers:
+                quantity = remote_answers[key].get("quantity_value")
+                unit = remote_answers[key].get("unit")
+                source = SOURCE_LLM
+            else:
+                missing.append({"course_name": course["course_name"], "item_name": item["item_name"]})
+                continue
+            counts[source] += 1
+            items.append({
+                "item_name": item["item_name"],
+                "quantity_value": quantity,
+                "unit": unit,
+                "source": source,
+            })
+        predictions.append({"course_name": course["course_name"], "items": items})
+
+    result_data = {
+        "predictions": predictions,
+        "mode": MODE_HYBRID,
+        "sources": {**counts, "missing": missing},
+    }
+    return result_data, usage
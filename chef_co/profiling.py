@@ -0,0 +1,221 @@
+"""
+Opt-in request profiling for staff.
+
+A staff user adds ``X-Chef-Profile: 1`` or ``?profile=1`` to a request to run
+it under cProfile with every SQL statement recorded. The slowest SELECTs
+are then EXPLAINed, and the report is saved as a ProfileReport. Its id and
+download URL come back in the ``X-Chef-Profile-Report`` and
+``X-Chef-Profile-URL`` headers. With ``download`` instead of ``1``, the
+report text replaces the response as an attachment. Requests without the
+flag, or from anyone but staff, go through untouched.
+
+Reports never keep SQL parameter values, only their types. Statements on
+``SENSITIVE_TABLES`` (tokens, users, sessions) keep no parameters at all
+and are not EXPLAINed, since some databases print the values in the plan.
+"""
+import cProfile
+import io
+import pstats
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.http import HttpResponse
+from rest_framework.exceptions import AuthenticationFailed
+
+from .authentication import CachedTokenAuthentication
+
+
+DEFAULTS = {
+    'ENABLED': True,
+    'HEADER': 'HTTP_X_CHEF_PROFILE',
+    'QUERY_PARAM': 'profile',
+    'TOP_FUNCTIONS': 40,   # Rows of the cProfile table kept in the report
+    'EXPLAIN_SLOWEST': 5,  # SELECTs to EXPLAIN, slowest first
+    'MAX_QUERIES': 1000,   # Statements kept in the report; the rest are only counted
+    'SENSITIVE_TABLES': ['authtoken_token', 'auth_user', 'django_session'],
+}
+
+MODE_STORE = 'store'
+MODE_DOWNLOAD = 'download'
+
+
+def profiling_settings():
+    return {**DEFAULTS, **getattr(settings, 'CHEF_CO_PROFILING', {})}
+
+
+def requested_mode(request, config):
+    """
+    MODE_STORE or MODE_DOWNLOAD when the request asks to be profiled, else None.
+    """
+    value = request.META.get(config['HEADER']) or request.GET.get(config['QUERY_PARAM'])
+    if not value:
+        return None
+    value = value.strip().lower()
+    if value == MODE_DOWNLOAD:
+        return MODE_DOWNLOAD
+    return MODE_STORE if value in ('1', 'true', 'yes', MODE_STORE) else None
+
+
+def staff_user(request):
+    """
+    The staff user behind the request's session or API token, or None.
+    """
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        try:
+            authenticated = CachedTokenAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return None
+        user = authenticated[0] if authenticated else None
+    if user is not None and user.is_active and user.is_staff:
+        return user
+    return None
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper that keeps each statement with its duration.
+    """
+
+    def __init__(self, alias, limit):
+        self.alias = alias
+        self.limit = limit
+        self.queries = []
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.seconds += elapsed
+            if len(self.queries) < self.limit:
+                self.queries.append({
+                    'alias': self.alias,
+                    'sql': sql,
+                    'params': None if many else params,
+                    'duration_ms': round(elapsed * 1000, 3),
+                })
+
+
+def explain(alias, sql, params):
+    """
+    The query plan of a SELECT as text, or the reason it could not be taken.
+    """
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"{connection.ops.explain_query_prefix()} {sql}", params or ())
+            return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+    except (DatabaseError, TypeError, ValueError) as e:
+        return f"EXPLAIN failed: {e}"
+
+
+def is_sensitive(sql, config):
+    sql = sql.lower()
+    return any(table.lower() in sql for table in config['SENSITIVE_TABLES'])
+
+
+def _redacted(params):
+    """
+    The parameters as their type names, so a report shows their shape but no values.
+    """
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: type(value).__name__ for key, value in params.items()}
+    return [type(value).__name__ for value in params]
+
+
+def profile_request(get_response, request, config):
+    """
+    Run the request under the profiler and SQL recorder.
+    Returns (response, report fields).
+    """
+    recorders = []
+    for connection in connections.all():
+        recorder = QueryRecorder(connection.alias, config['MAX_QUERIES'])
+        connection.execute_wrappers.append(recorder)
+        recorders.append((connection, recorder))
+
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    try:
+        # Only one profiler can run per thread; under another one, record SQL only
+        try:
+            profiler.enable()
+            profiling = True
+        except ValueError:
+            profiling = False
+        try:
+            response = get_response(request)
+        finally:
+            if profiling:
+                profiler.disable()
+    finally:
+        for connection, recorder in recorders:
+            connection.execute_wrappers.remove(recorder)
+    elapsed = time.perf_counter() - start
+
+    queries = [query for _, recorder in recorders for query in recorder.queries]
+    for query in queries:
+        query['sensitive'] = is_sensitive(query['sql'], config)
+    slowest = sorted(
+        (query for query in queries
+         if query['sql'].lstrip().upper().startswith('SELECT') and not query['sensitive']),
+        key=lambda query: query['duration_ms'], reverse=True
+    )[:config['EXPLAIN_SLOWEST']]
+    for query in slowest:
+        query['explain'] = explain(query['alias'], query['sql'], query['params'])
+    for query in queries:
+        del query['alias']
+        query['params'] = None if query.pop('sensitive') else _redacted(query['params'])
+
+    stats_text = ''
+    if profiling:
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(config['TOP_FUNCTIONS'])
+        stats_text = stream.getvalue()
+
+    return response, {
+        'duration_ms': round(elapsed * 1000, 1),
+        'query_count': sum(recorder.count for _, recorder in recorders),
+        'query_ms': round(sum(recorder.seconds for _, recorder in recorders) * 1000, 1),
+        'queries': queries,
+        'profile': stats_text,
+    }
+
+
+def render_report(report):
+    """
+    The report as a plain-text artifact.
+    """
+    lines = [
+        f"{report.method} {report.path} -> {report.status_code}",
+        f"Profiled at {report.created_at:%Y-%m-%d %H:%M:%S} for {report.user}",
+        f"Total {report.duration_ms} ms; {report.query_count} SQL queries in {report.query_ms} ms",
+        '',
+        'Slowest queries',
+        '===============',
+    ]
+    explained = sorted(
+        (query for query in report.queries if 'explain' in query),
+        key=lambda query: query['duration_ms'], reverse=True
+    )
+    for query in explained:
+        lines += ['', f"{query['duration_ms']} ms: {query['sql']}", f"  params: {query['params']}", query['explain']]
+    lines += ['', 'All queries', '===========']
+    lines += [f"{query['duration_ms']:>10} ms  {query['sql']}" for query in report.queries]
+    lines += ['', 'Profile', '=======', report.profile or '(profiler unavailable)']
+    return '\n'.join(lines) + '\n'
+
+
+def report_download(report):
+    response = HttpResponse(render_report(report), content_type='text/plain; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="profile-{report.pk}.txt"'
+    response['X-Chef-Profile-Report'] = str(report.pk)
+    return response
@@ -0,0 +1,229 @@
+"""
+Incremental recompute of stored predictions.
+
+When a quantity reference changes, only the lines of the affected menu items
+are stale in the predictions of their menus. Those lines are recomputed from
+the items' materialized scaling curves and patched into ``result_data`` in
+bulk, without another LLM round trip. Patched documents are validated again
+and stored as new content-addressed payloads; the old ones stay shared by any
+other predictions.
+
+Recomputes triggered by reference changes run in a background thread
+``CHEF_CO_RECOMPUTE_DELAY`` seconds after the last change, so saving a
+reference stays fast and row-by-row imports are recomputed in one pass.
+A batch still waiting when the process exits is run synchronously first.
+"""
+import atexit
+import logging
+import threading
+from functools import partial
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .models import Menu, MenuItem, PredictionResult, ScalingSegment
+from .predictions import SOURCE_LOCAL, build_reference_data, curves_at, item_key, refresh_sources
+from .validation import validate_prediction, validation_status
+
+
+logger = logging.getLogger(__name__)
+
+
+def recompute_predictions(menu_item_ids, dry_run=False, batch_size=500):
+    """
+    Patch the lines of ``menu_item_ids`` in every stored prediction of their menus.
+
+    Returns a report with the number of predictions scanned and changed and
+    one entry per changed line. Nothing is written when ``dry_run`` is set.
+    """
+    items = {
+        row['pk']: row
+        for row in MenuItem.objects.filter(pk__in=set(menu_item_ids)).values(
+            'pk', 'name', 'course__name', 'course__menu_id'
+        )
+    }
+    report = {'dry_run': dry_run, 'scanned': 0, 'changed': 0, 'lines': []}
+    if not items:
+        return report
+
+    menu_items = {}
+    for item in items.values():
+        menu_items.setdefault(item['course__menu_id'], []).append(item)
+
+    # Every curve of the menus: the changed items are patched, all are validated against
+    curves = {item_id: [] for item_id in items}
+    menu_segments = {menu_id: [] for menu_id in menu_items}
+    segments = ScalingSegment.objects.filter(menu_id__in=menu_items).select_related('menu_item__course')
+    for segment in segments.order_by('menu_item_id', 'lower_bound'):
+        menu_segments[segment.menu_id].append(segment)
+        if segment.menu_item_id in curves:
+            curves[segment.menu_item_id].append(segment)
+
+    menus = Menu.objects.prefetch_related('courses__menu_items__quantity_references').in_bulk(menu_items)
+    references = {}  # (menu id, party size) -> reference snapshot and curves for validation
+
+    predictions = PredictionResult.objects.filter(
+        party_order__menu_id__in=menu_items, archived_at__isnull=True
+    ).select_related('party_order', 'payload').only(
+        'pk', 'payload__data', 'party_order__menu_id', 'party_order__party_size'
+    ).order_by('pk')
+
+    changed = []
+    # One stamp per run, so predictions patched to the same content share a payload
+    recomputed_at = timezone.now().isoformat()
+    for prediction in predictions.iterator(chunk_size=batch_size):
+        report['scanned'] += 1
+        party_size = prediction.party_order.party_size
+        lines = []
+        for item in menu_items[prediction.party_order.menu_id]:
+            segment = _segment_for(curves[item['pk']], party_size)
+            if segment is None:
+                # No references left to scale from; keep whatever was predicted
+                continue
+            line = patch_line(
+                prediction.result_data, item['course__name'], item['name'],
+                round(segment.quantity_for(party_size), 2), segment.unit
+            )
+            if line is not None:
+                lines.append({'prediction': prediction.pk, 'menu_item': item['pk'], **line})
+
+        if lines:
+            report['lines'].extend(lines)
+            report['changed'] += 1
+            if dry_run:
+                continue
+            refresh_sources(prediction.result_data)
+            key = (prediction.party_order.menu_id, party_size)
+            if key not in references:
+                references[key] = (
+                    build_reference_data(menus[key[0]], party_size), curves_at(menu_segments[key[0]], party_size)
+                )
+            reference_data, menu_curves = references[key]
+            validate_prediction(reference_data, prediction.result_data, party_size, curves=menu_curves)
+            prediction.validation_status = validation_status(prediction.result_data)
+            prediction.result_data['recomputed_at'] = recomputed_at
+            changed.append(prediction)
+            if len(changed) >= batch_size:
+                _save_payloads(changed)
+                changed = []
+
+    if changed:
+        _save_payloads(changed)
+    return report
+
+
+def _save_payloads(predictions):
+    with transaction.atomic():
+        PredictionResult.attach_payloads(predictions, changed=True)
+        PredictionResult.objects.bulk_update(predictions, ['payload', 'validation_status'])
+
+
+def _segment_for(segments, party_size):
+    for segment in segments:
+        if segment.covers(party_size):
+            return segment
+    return None
+
+
+def patch_line(result_data, course_name, item_name, quantity, unit):
+    """
+    Set one item's quantity in a prediction payload, adding the line if missing.
+    Returns the old and new values, or None when nothing changed.
+    """
+    courses = result_data.setdefault('predictions', [])
+    key = item_key(course_name, item_name)
+    course = next((c for c in courses if item_key(c.get('course_name'), '')[0] == key[0]), None)
+    if course is None:
+        course = {'course_name': course_name, 'items': []}
+        courses.append(course)
+
+    items = course.setdefault('items', [])
+    line = next((i for i in items if item_key(course_name, i.get('item_name')) == key), None)
+    if line is None:
+        line = {'item_name': item_name}
+        items.append(line)
+    elif _same_quantity(line.get('quantity_value'), quantity) and line.get('unit') == unit:
+        return None
+
+    old = {'quantity_value': line.get('quantity_value'), 'unit': line.get('unit')}
+    line['quantity_value'] = quantity
+    line['unit'] = unit
+    if 'sources' in result_data:
+        line['source'] = SOURCE_LOCAL
+    return {
+        'course_name': course_name,
+        'item_name': item_name,
+        'old': old,
+        'new': {'quantity_value': quantity, 'unit': unit},
+    }
+
+
+def _same_quantity(value, quantity):
+    try:
+        return round(float(value), 2) == quantity
+    except (TypeError, ValueError):
+        return False
+
+
+_background_lock = threading.Lock()
+_running_lock = threading.Lock()
+_background = {'item_ids': set(), 'timer': None, 'atexit': False}
+
+
+def schedule_recompute(menu_item_ids):
+    """
+    Recompute the items' prediction lines in the background once the current
+    transaction commits. Nothing is handed over if it rolls back.
+    """
+    if not getattr(settings, 'CHEF_CO_RECOMPUTE_ON_CHANGE', False):
+        return
+    item_ids = set(menu_item_ids)
+    if item_ids:
+        transaction.on_commit(partial(start_background_recompute, item_ids))
+
+
+def start_background_recompute(menu_item_ids):
+    """
+    Queue the items and restart the delay, so a burst of changes is recomputed in one run.
+    A batch still queued when the process exits is recomputed before it does.
+    """
+    delay = getattr(settings, 'CHEF_CO_RECOMPUTE_DELAY', 5.0)
+    with _background_lock:
+        _background['item_ids'].update(menu_item_ids)
+        if _background['timer'] is not None:
+            _background['timer'].cancel()
+        timer = threading.Timer(delay, _run_background_recompute)
+        timer.daemon = True
+        _background['timer'] = timer
+        if not _background['atexit']:
+            atexit.register(flush_background_recompute)
+            _background['atexit'] = True
+    timer.start()
+
+
+def flush_background_recompute():
+    """
+    Recompute the queued batch now instead of waiting for the delay, e.g. when a
+    management command or shell session ends before the timer fires.
+    """
+    with _background_lock:
+        if _background['timer'] is not None:
+            _background['timer'].cancel()
+    _run_background_recompute()
+
+
+def _run_background_recompute():
+    # A flush waits for a run already in progress rather than exiting under it
+    with _running_lock:
+        with _background_lock:
+            item_ids = _background['item_ids']
+            _background['item_ids'] = set()
+            _background['timer'] = None
+        try:
+            if item_ids:
+                recompute_predictions(item_ids)
+        except Exception:
+            logger.exception("Background recompute of items %s failed", sorted(item_ids))
+        finally:
+            connections.close_all()
@@ -0,0 +1,117 @@
+"""
+Rendered-response cache for the nested menu tree endpoints.
+
+Serialized representations of menus, courses and menu items are cached per
+object and per menu tree version, so the deep serializers only run once per
+change. List responses are assembled from these per-object fragments and
+detail responses can additionally be stored pre-gzipped.
+"""
+import gzip
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F, prefetch_related_objects
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework.response import Response
+
+
+DEFAULTS = {
+    'CACHE': 'default',
+    'TIMEOUT': 60 * 60 * 24,
+    'GZIP': False,
+    'KEY_PREFIX': 'chef_co:render',
+}
+
+
+def render_cache_settings():
+    return {**DEFAULTS, **getattr(settings, 'CHEF_CO_RENDER_CACHE', {})}
+
+
+def get_render_cache():
+    return caches[render_cache_settings()['CACHE']]
+
+
+class MenuTreeRenderCacheMixin:
+    """
+    Serve list and retrieve from cached serializer output.
+
+    Subclasses set ``menu_path`` to the lookup from their model to Menu
+    (``None`` for Menu itself) and ``fragment_prefetch`` to the relations the
+    serializer walks, which are only loaded for cache misses.
+    """
+    menu_path = None
+    fragment_prefetch = ()
+
+    def get_queryset(self):
+        prefix = f"{self.menu_path}__" if self.menu_path else ''
+        return super().get_queryset().annotate(
+            _tree_version=F(f"{prefix}tree_version"),
+            _tree_updated_at=F(f"{prefix}tree_updated_at"),
+        )
+
+    def fragment_key(self, instance):
+        config = render_cache_settings()
+        # The timestamp guards against a recycled primary key meeting an old fragment
+        stamp = int(instance._tree_updated_at.timestamp() * 1_000_000)
+        return f"{config['KEY_PREFIX']}:{self.basename}:{instance.pk}:{instance._tree_version}:{stamp}"
+
+    def render_fragments(self, instances):
+        """
+        Return the serialized data for ``instances``, serializing only cache misses.
+        """
+        cache = get_render_cache()
+        keys = [self.fragment_key(instance) for instance in instances]
+        cached = cache.get_many(keys)
+
+        missing = [instance for instance, key in zip(instances, keys) if key not in cached]
+        if missing:
+            prefetch_related_objects(missing, *self.fragment_prefetch)
+            serializer = self.get_serializer(missing, many=True)
+            fresh = {self.fragment_key(instance): data for instance, data in zip(missing, serializer.data)}
+            cache.set_many(fresh, timeout=render_cache_settings()['TIMEOUT'])
+            cached.update(fresh)
+
+        return [cached[key] for key in keys]
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.render_fragments(page))
+        return Response(self.render_fragments(list(queryset)))
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        if self.wants_gzip(request):
+            return self.gzipped_response(request, instance)
+        return Response(self.render_fragments([instance])[0])
+
+    def wants_gzip(self, request):
+        renderer = getattr(request, 'accepted_renderer', None)
+        return (
+            render_cache_settings()['GZIP']
+            and renderer is not None
+            and renderer.format == 'json'
+            and 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+        )
+
+    def gzipped_response(self, request, instance):
+        """
+        Serve the detail body straight from a pre-compressed cache entry.
+        """
+        cache = get_render_cache()
+        key = f"{self.fragment_key(instance)}:gz"
+        body = cache.get(key)
+        if body is None:
+            data = self.render_fragments([instance])[0]
+            rendered = request.accepted_renderer.render(
+                data, request.accepted_media_type, self.get_renderer_context()
+            )
+            body = gzip.compress(rendered)
+            cache.set(key, body, timeout=render_cache_settings()['TIMEOUT'])
+
+        response = HttpResponse(body, content_type=request.accepted_media_type)
+        response['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ['Accept-Encoding'])
+        return response
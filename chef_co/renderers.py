@@ -0,0 +1,114 @@
+"""
+Fast JSON (orjson) and MessagePack renderers and parsers.
+
+Both libraries are optional: without orjson the JSON classes behave exactly
+like DRF's own, and the MessagePack classes are only enabled in settings when
+msgpack is installed. Types the libraries do not handle natively (Decimal,
+datetime, lazy strings, ...) go through DRF's JSON encoder so every format
+produces the same values.
+"""
+import codecs
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised only without orjson
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - exercised only without msgpack
+    msgpack = None
+
+
+_encoder = JSONEncoder()
+
+
+def encode_default(obj):
+    """
+    Convert types unknown to orjson/msgpack the same way DRF's JSON encoder does.
+    """
+    return _encoder.default(obj)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    Drop-in replacement for JSONRenderer backed by orjson.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        # orjson only emits compact UTF-8 or two-space indentation; defer anything else to DRF
+        if orjson is None or self.ensure_ascii or not self.compact or indent not in (None, 2):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if indent == 2:
+            option |= orjson.OPT_INDENT_2
+        ret = orjson.dumps(data, default=encode_default, option=option)
+
+        # Keep DRF's guarantee that the output is a strict JavaScript subset
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class ORJSONParser(JSONParser):
+    """
+    Drop-in replacement for JSONParser backed by orjson.
+    """
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        raw = stream.read() if stream is not None else b''
+        if codecs.lookup(encoding).name != 'utf-8':
+            raw = raw.decode(encoding).encode('utf-8')
+
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError as exc:
+            # orjson rejects a few inputs the stdlib accepts (e.g. integers over 64 bits)
+            try:
+                return json.loads(raw.decode('utf-8'))
+            except ValueError:
+                raise ParseError(f"JSON parse error - {exc}")
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    Renders responses as MessagePack.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=encode_default, use_bin_type=True)
+
+
+class MessagePackParser(BaseParser):
+    """
+    Parses MessagePack request bodies.
+    """
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False, strict_map_key=False)
+        except (ValueError, msgpack.ExtraData, msgpack.FormatError, msgpack.StackError) as exc:
+            raise ParseError(f"MessagePack parse error - {exc}")
@@ -0,0 +1,123 @@
+"""
+Routing of LLM requests to a model tier.
+
+``CHEF_CO_LLM_ROUTES`` lists the tiers from cheapest to most capable. Each
+route gives the model, its ``max_tokens``, the largest menu it takes
+(``max_items``, None for any size), how many items go into one call
+(``chunk_items``, None for the whole menu at once), its typical latency per
+call and its price per million prompt and completion tokens.
+
+A request goes to the first route large enough for the items being sent.
+With a latency budget, the first of those whose estimated latency (calls
+times latency per call) fits the budget is used, or the fastest one if none
+does. A route's ``fallback`` names the route to retry with when the answer
+fails validation; small menus therefore get the fast, cheap model and only
+pay for the larger one when they need it.
+"""
+import math
+
+from django.conf import settings
+
+
+DEFAULT_ROUTES = [
+    {
+        'name': 'small',
+        'model': 'gpt-4o-mini',
+        'max_items': 40,
+        'max_tokens': 2000,
+        'chunk_items': None,
+        'latency_ms': 3000,
+        'prompt_price': 0.15,
+        'completion_price': 0.60,
+        'fallback': 'large',
+    },
+    {
+        'name': 'large',
+        'model': 'gpt-4o',
+        'max_items': None,
+        'max_tokens': 4000,
+        'chunk_items': 80,
+        'latency_ms': 8000,
+        'prompt_price': 2.50,
+        'completion_price': 10.00,
+        'fallback': None,
+    },
+]
+
+
+def llm_routes():
+    return getattr(settings, 'CHEF_CO_LLM_ROUTES', DEFAULT_ROUTES)
+
+
+def get_route(name):
+    for route in llm_routes():
+        if route['name'] == name:
+            return route
+    raise ValueError(f"Unknown LLM route: {name}")
+
+
+def count_items(reference_data):
+    return sum(len(course['items']) for course in reference_data['courses'])
+
+
+def call_count(route, item_count):
+    chunk_items = route.get('chunk_items')
+    if not chunk_items:
+        return 1
+    return max(1, math.ceil(item_count / chunk_items))
+
+
+def estimated_latency_ms(route, item_count):
+    return call_count(route, item_count) * route.get('latency_ms', 0)
+
+
+def select_route(item_count, latency_budget_ms=None):
+    """
+    The cheapest route that takes ``item_count`` items and, when a budget is
+    given, is expected to answer within it.
+    """
+    routes = llm_routes()
+    candidates = [route for route in routes if route.get('max_items') is None or item_count <= route['max_items']]
+    if not candidates:
+        # Nothing is configured for menus this large; the last route is the most capable
+        candidates = routes[-1:]
+    if latency_budget_ms is None:
+        return candidates[0]
+    for route in candidates:
+        if estimated_latency_ms(route, item_count) <= latency_budget_ms:
+            return route
+    return min(candidates, key=lambda route: estimated_latency_ms(route, item_count))
+
+
+def chunk_reference_data(reference_data, chunk_items):
+    """
+    Split the reference data into parts of at most ``chunk_items`` items,
+    keeping items under their course names.
+    """
+    if not chunk_items:
+        return [reference_data]
+    chunks = []
+    current, size = [], 0
+    for course in reference_data['courses']:
+        items = course['items']
+        while items:
+            taken = items[:chunk_items - size]
+            items = items[len(taken):]
+            current.append({**course, 'items': taken})
+            size += len(taken)
+            if size == chunk_items:
+                chunks.append(current)
+                current, size = [], 0
+    if current:
+        chunks.append(current)
+    return [{**reference_data, 'courses': courses} for courses in chunks] or [reference_data]
+
+
+def cost_usd(route, prompt_tokens, completion_tokens):
+    """
+    Estimated price of a call from the route's per-million-token prices.
+    """
+    return (
+        (prompt_tokens or 0) * route.get('prompt_price', 0)
+        + (completion_tokens or 0) * route.get('completion_price', 0)
+    ) / 1_000_000
@@ -0,0 +1,186 @@
+"""
+Materialized per-item scaling curves.
+
+Each menu item's quantity references are turned into piecewise linear
+segments: straight interpolation between neighbouring reference sizes, and a
+least-squares fitted slope anchored at the outermost references for party
+sizes below or above the referenced range. Curves are rebuilt per item when a
+reference changes, so predicting a whole menu for any party size is a single
+indexed query over ScalingSegment.
+"""
+import functools
+import operator
+
+from django.db import transaction
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import Greatest
+
+from .models import MenuItem, QuantityReference, ScalingSegment
+
+
+def fit_curve(points):
+    """
+    Build segment definitions from (party_size, quantity, unit) points.
+
+    Migration 0006 keeps its own frozen copy; later changes here take effect
+    through ``rebuild_scaling_curves``.
+    """
+    points = sorted(points, key=lambda point: point[0])
+    if not points:
+        return []
+
+    if len(points) == 1:
+        size, quantity, unit = points[0]
+        # A single reference can only be scaled proportionally
+        slope = quantity / size if size else 0.0
+        intercept = 0.0 if size else quantity
+        return [_segment(0, None, slope, intercept, unit, ScalingSegment.EXTRAPOLATE)]
+
+    n = len(points)
+    mean_size = sum(p[0] for p in points) / n
+    mean_quantity = sum(p[1] for p in points) / n
+    variance = sum((p[0] - mean_size) ** 2 for p in points)
+    covariance = sum((p[0] - mean_size) * (p[1] - mean_quantity) for p in points)
+    # Quantities never shrink as the party grows
+    fitted_slope = max(0.0, covariance / variance) if variance else 0.0
+
+    segments = []
+    first_size, first_quantity, first_unit = points[0]
+    if first_size > 0:
+        segments.append(_segment(
+            0, first_size, fitted_slope, first_quantity - fitted_slope * first_size,
+            first_unit, ScalingSegment.EXTRAPOLATE
+        ))
+
+    for (size_a, quantity_a, unit_a), (size_b, quantity_b, _) in zip(points, points[1:]):
+        slope = (quantity_b - quantity_a) / (size_b - size_a)
+        segments.append(_segment(
+            size_a, size_b, slope, quantity_a - slope * size_a, unit_a, ScalingSegment.INTERPOLATE
+        ))
+
+    last_size, last_quantity, last_unit = points[-1]
+    segments.append(_segment(
+        last_size, None, fitted_slope, last_quantity - fitted_slope * last_size,
+        last_unit, ScalingSegment.EXTRAPOLATE
+    ))
+    return segments
+
+
+def _segment(lower, upper, slope, intercept, unit, kind):
+    return {
+        'lower_bound': lower,
+        'upper_bound': upper,
+        'slope': slope,
+        'intercept': intercept,
+        'unit': unit,
+        'kind': kind,
+    }
+
+
+def rebuild_item_curves(menu_item_ids):
+    """
+    Recompute the scaling segments of the given menu items from their references.
+    """
+    item_ids = set(menu_item_ids)
+    if not item_ids:
+        return 0
+
+    item_menus = dict(MenuItem.objects.filter(pk__in=item_ids).values_list('pk', 'course__menu_id'))
+    points = {item_id: [] for item_id in item_menus}
+    references = QuantityReference.objects.filter(menu_item_id__in=item_menus).values_list(
+        'menu_item_id', 'party_size', 'quantity_value', 'unit'
+    )
+    for item_id, party_size, quantity, unit in references:
+        points[item_id].append((party_size, float(quantity), unit))
+
+    segments = [
+        ScalingSegment(menu_item_id=item_id, menu_id=item_menus[item_id], reference_count=len(item_points), **definition)
+        for item_id, item_points in points.items()
+        for definition in fit_curve(item_points)
+    ]
+    with transaction.atomic():
+        ScalingSegment.objects.filter(menu_item_id__in=item_ids).delete()
+        ScalingSegment.objects.bulk_create(segments)
+    return len(segments)
+
+
+def rebuild_all_curves(menu_id=None, batch_size=500):
+    """
+    Rebuild every curve, or those of one menu, in batches of items.
+    """
+    items = MenuItem.objects.order_by('pk')
+    if menu_id is not None:
+        items = items.filter(course__menu_id=menu_id)
+    item_ids = list(items.values_list('pk', flat=True))
+    total = 0
+    for start in range(0, len(item_ids), batch_size):
+        total += rebuild_item_curves(item_ids[start:start + batch_size])
+    return total
+
+
+def _covering(menu_id, party_size):
+    return Q(menu_id=menu_id, lower_bound__lte=party_size) & (
+        Q(upper_bound__gt=party_size) | Q(upper_bound__isnull=True)
+    )
+
+
+def segments_for(menu_id, party_size):
+    """
+    The segment covering ``party_size`` for every referenced item of a menu,
+    with the scaled quantity computed in SQL.
+    """
+    return ScalingSegment.objects.filter(_covering(menu_id, party_size)).annotate(
+        quantity=Greatest(
+            Value(0.0),
+            F('intercept') + F('slope') * Value(float(party_size)),
+            output_field=FloatField()
+        )
+    ).order_by('menu_item__course__order', 'menu_item__course_id', 'menu_item_id')
+
+
+def segments_for_many(pairs):
+    """
+    The segments covering each (menu id, party size) pair, fetched in one query.
+    Returns {pair: [segment, ...]} with the items' course and name loaded.
+    """
+    pairs = set(pairs)
+    if not pairs:
+        return {}
+    sizes = {}
+    for menu_id, party_size in pairs:
+        sizes.setdefault(menu_id, []).append(party_size)
+    segments = ScalingSegment.objects.filter(
+        functools.reduce(operator.or_, (_covering(menu_id, party_size) for menu_id, party_size in pairs))
+    ).select_related('menu_item__course').order_by('menu_item__course__order', 'menu_item__course_id', 'menu_item_id')
+
+    found = {pair: [] for pair in pairs}
+    for segment in segments:
+        for party_size in sizes[segment.menu_id]:
+            if segment.covers(party_size):
+                found[(segment.menu_id, party_size)].append(segment)
+    return found
+
+
+def scale_menu(menu_id, party_size):
+    """
+    Predict every referenced item of a menu from its materialized curve.
+    Returns a list of courses in the same shape as the LLM predictions.
+    """
+    rows = segments_for(menu_id, party_size).values(
+        'menu_item_id', 'menu_item__name', 'menu_item__course_id', 'menu_item__course__name',
+        'quantity', 'unit', 'kind', 'reference_count'
+    )
+
+    courses = []
+    course_index = {}
+    for row in rows:
+        course_id = row['menu_item__course_id']
+        if course_id not in course_index:
+            course_index[course_id] = len(courses)
+            courses.append({"course_name": row['menu_item__course__name'], "items": []})
+        courses[course_index[course_id]]["items"].append({
+            "item_name": row['menu_item__name'],
+            "quantity_value": round(row['quantity'], 2),
+            "unit": row['unit'],
+        })
+    return courses
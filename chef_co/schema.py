@@ -0,0 +1,113 @@
+"""
+Prebuilt OpenAPI schema.
+
+drf_yasg introspects every viewset and serializer to build the schema, which
+is far too slow to repeat per request. The schema is generated by the
+``generate_openapi_schema`` management command into a static file that is
+read once per process and served with ETag and Cache-Control headers.
+``generate_openapi_schema --check`` fails when the file is out of date.
+
+The generator, codecs and UI views pull in jsonschema and the spec validator,
+so they are only imported when a schema is generated or a UI page is served.
+"""
+import hashlib
+import json
+import logging
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.views.decorators.csrf import csrf_exempt
+from drf_yasg import openapi
+
+
+logger = logging.getLogger(__name__)
+
+api_info = openapi.Info(
+    title="Chef Co API",
+    default_version='v1',
+    description="API for Chef Co menu and quantity prediction service",
+    terms_of_service="https://www.example.com/terms/",
+    contact=openapi.Contact(email="contact@example.com"),
+    license=openapi.License(name="BSD License"),
+)
+
+DEFAULT_SCHEMA_PATH = Path(__file__).resolve().parent / 'static' / 'chef_co' / 'swagger.json'
+
+_documents = {}
+_documents_lock = threading.Lock()
+
+
+def schema_path():
+    return Path(getattr(settings, 'CHEF_CO_SCHEMA_PATH', DEFAULT_SCHEMA_PATH))
+
+
+def generate_schema():
+    """
+    Introspect the API and return the schema as pretty-printed JSON bytes.
+    """
+    from drf_yasg.codecs import OpenAPICodecJson
+    from drf_yasg.generators import OpenAPISchemaGenerator
+
+    generator = OpenAPISchemaGenerator(api_info)
+    schema = generator.get_schema(request=None, public=True)
+    return OpenAPICodecJson(validators=[], pretty=True).encode(schema)
+
+
+def write_schema(path=None):
+    path = Path(path or schema_path())
+    body = generate_schema()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(body)
+    return path, body
+
+
+def schema_document(fmt='json'):
+    """
+    Return (body, etag) for the stored schema as ``json`` or ``yaml``.
+    """
+    with _documents_lock:
+        if fmt not in _documents:
+            if 'json' not in _documents:
+                try:
+                    body = schema_path().read_bytes()
+                except FileNotFoundError:
+                    # Keep serving, but only pay for the introspection once per process
+                    logger.warning("%s is missing; run manage.py generate_openapi_schema", schema_path())
+                    body = generate_schema()
+                _documents['json'] = _with_etag(body)
+            if fmt == 'yaml':
+                from drf_yasg.codecs import yaml_dump
+                _documents['yaml'] = _with_etag(yaml_dump(json.loads(_documents['json'][0]), binary=True))
+        return _documents[fmt]
+
+
+def clear_schema_cache():
+    with _documents_lock:
+        _documents.clear()
+
+
+def _with_etag(body):
+    return body, f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def schema_ui_view(renderer):
+    """
+    Swagger UI or ReDoc page, building the drf_yasg schema view on first use.
+    """
+    view = None
+
+    @csrf_exempt
+    def ui(request, *args, **kwargs):
+        nonlocal view
+        if view is None:
+            from drf_yasg.views import get_schema_view
+            from rest_framework import permissions
+
+            view = get_schema_view(
+                api_info,
+                public=True,
+                permission_classes=[permissions.AllowAny],
+            ).with_ui(renderer, cache_timeout=0)
+        return view(request, *args, **kwargs)
+    return ui
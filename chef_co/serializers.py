@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Menu, Course, MenuItem, QuantityReference, PartyOrder, PredictionResult
+from .models import Menu, Course, MenuItem, QuantityReference, PartyOrder, PredictionResult, Event
 from django.contrib.auth.models import User
 
 
@@ -15,6 +15,16 @@ class QuantityReferenceSerializer(serializers.ModelSerializer):
         fields = ['id', 'party_size', 'quantity_value', 'unit']
 
 
+class QuantityReferenceBulkSerializer(serializers.Serializer):
+    """
+    One row of a bulk upsert. Menu item existence is checked for the whole batch at once.
+    """
+    menu_item = serializers.IntegerField(min_value=1)
+    party_size = serializers.IntegerField(min_value=0)
+    quantity_value = serializers.DecimalField(max_digits=10, decimal_places=2)
+    unit = serializers.CharField(max_length=20)
+
+
 class MenuItemSerializer(serializers.ModelSerializer):
     quantity_references = QuantityReferenceSerializer(many=True, read_only=True)
     
@@ -40,6 +50,31 @@ class MenuSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'description', 'created_by', 'created_at', 'courses']
 
 
+# Flat representations for the sync change feed; relations are plain ids
+class SyncMenuSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Menu
+        fields = ['id', 'name', 'description', 'created_by', 'created_at', 'updated_at']
+
+
+class SyncCourseSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Course
+        fields = ['id', 'menu', 'name', 'order', 'updated_at']
+
+
+class SyncMenuItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MenuItem
+        fields = ['id', 'course', 'name', 'updated_at']
+
+
+class SyncQuantityReferenceSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = QuantityReference
+        fields = ['id', 'menu_item', 'party_size', 'quantity_value', 'unit', 'updated_at']
+
+
 class PartyOrderSerializer(serializers.ModelSerializer):
     menu = MenuSerializer(read_only=True)
     menu_id = serializers.PrimaryKeyRelatedField(
@@ -57,16 +92,74 @@ class PartyOrderSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = PartyOrder
-        fields = ['id', 'user', 'user_id', 'menu', 'menu_id', 'party_size', 'created_at']
+        fields = ['id', 'user', 'user_id', 'menu', 'menu_id', 'party_size', 'event', 'created_at']
+        read_only_fields = ['event']
+
+
+class EventLineSerializer(serializers.ModelSerializer):
+    menu_name = serializers.CharField(source='menu.name', read_only=True)
+    
+    class Meta:
+        model = PartyOrder
+        fields = ['id', 'menu', 'menu_name', 'party_size']
+
+
+class EventSerializer(serializers.ModelSerializer):
+    user = UserSerializer(read_only=True)
+    user_id = serializers.PrimaryKeyRelatedField(
+        queryset=User.objects.all(),
+        write_only=True,
+        source='user',
+        required=True
+    )
+    orders = EventLineSerializer(many=True)
+    
+    class Meta:
+        model = Event
+        fields = ['id', 'name', 'user', 'user_id', 'event_date', 'created_at', 'orders']
+    
+    def validate_orders(self, value):
+        if not value:
+            raise serializers.ValidationError("An event needs at least one menu line.")
+        return value
+    
+    def create(self, validated_data):
+        lines = validated_data.pop('orders')
+        event = Event.objects.create(**validated_data)
+        self._create_lines(event, lines)
+        return event
+    
+    def update(self, instance, validated_data):
+        lines = validated_data.pop('orders', None)
+        instance = super().update(instance, validated_data)
+        if lines is not None:
+            # Lines are replaced as a whole, together with their predictions
+            instance.orders.all().delete()
+            self._create_lines(instance, lines)
+        return instance
+    
+    @staticmethod
+    def _create_lines(event, lines):
+        PartyOrder.objects.bulk_create([
+            PartyOrder(event=event, user=event.user, menu=line['menu'], party_size=line['party_size'])
+            for line in lines
+        ])
 
 
 class PredictionResultSerializer(serializers.ModelSerializer):
     party_order = PartyOrderSerializer(read_only=True)
+    result_data = serializers.JSONField(read_only=True)  # Stored in a shared PredictionPayload
     
     class Meta:
         model = PredictionResult
-        fields = ['id', 'party_order', 'result_data', 'created_at', 'name']
-        read_only_fields = ['result_data', 'created_at']
+        fields = [
+            'id', 'party_order', 'result_data', 'created_at', 'name',
+            'prompt_tokens', 'completion_tokens', 'llm_latency_ms', 'validation_status', 'archived_at'
+        ]
+        read_only_fields = [
+            'result_data', 'created_at', 'prompt_tokens', 'completion_tokens', 'llm_latency_ms',
+            'validation_status', 'archived_at'
+        ]
         
     def to_representation(self, instance):
         representation = super().to_representation(instance)
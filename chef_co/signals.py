@@ -0,0 +1,176 @@
+"""
+Signal handlers keeping denormalised menu state (tree versions, scaling
+curves, the autocomplete index) in sync with its tree, and cached token
+authentication in sync with tokens and users.
+"""
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_tokens
+from .autocomplete import index as autocomplete_index
+from .models import Menu, Course, MenuItem, QuantityReference, ScalingSegment, Tombstone
+from .recompute import schedule_recompute
+from .scaling import rebuild_item_curves
+from .sync import TOMBSTONE_KINDS
+from .warmup import schedule_warmup
+
+
+# How to reach the menu (and, for references, the item) a stored row belongs to
+PARENT_LOOKUPS = {
+    Course: ('menu', ('menu_id',)),
+    MenuItem: ('course', ('course__menu_id',)),
+    QuantityReference: ('menu_item', ('menu_item__course__menu_id', 'menu_item_id')),
+}
+
+
+@receiver(pre_save, sender=Course)
+@receiver(pre_save, sender=MenuItem)
+@receiver(pre_save, sender=QuantityReference)
+def remember_previous_parent(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Note where an existing row sat before this save, so that moving it to
+    another menu also updates the menu it left.
+    """
+    instance._previous_parent = (None, None)
+    field, lookups = PARENT_LOOKUPS[sender]
+    if raw or instance._state.adding or (update_fields is not None and field not in update_fields):
+        return
+    row = sender.objects.filter(pk=instance.pk).values_list(*lookups).first()
+    if row is not None:
+        instance._previous_parent = (row[0], row[1] if len(row) > 1 else None)
+
+
+def previous_menu_id(instance):
+    return getattr(instance, '_previous_parent', (None, None))[0]
+
+
+def previous_item_id(instance):
+    return getattr(instance, '_previous_parent', (None, None))[1]
+
+
+@receiver(post_save, sender=Menu)
+def bump_menu_on_save(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        Menu.bump_tree_version([instance.pk])
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def bump_menu_on_course_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        Menu.bump_tree_version([instance.menu_id, previous_menu_id(instance)])
+
+
+@receiver(post_save, sender=Course)
+def move_segments_with_course(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        ScalingSegment.objects.filter(menu_item__course=instance).exclude(
+            menu_id=instance.menu_id
+        ).update(menu_id=instance.menu_id)
+
+
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+def bump_menu_on_item_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        menu_ids = list(Course.objects.filter(pk=instance.course_id).values_list('menu_id', flat=True))
+        Menu.bump_tree_version(menu_ids + [previous_menu_id(instance)])
+
+
+@receiver(post_save, sender=MenuItem)
+def move_segments_with_item(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        # The item may have moved to a course on another menu
+        menu_id = Course.objects.filter(pk=instance.course_id).values_list('menu_id', flat=True).first()
+        ScalingSegment.objects.filter(menu_item=instance).exclude(menu_id=menu_id).update(menu_id=menu_id)
+
+
+@receiver(post_save, sender=QuantityReference)
+@receiver(post_delete, sender=QuantityReference)
+def bump_menu_on_reference_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        menu_ids = set(Course.objects.filter(
+            menu_items__pk=instance.menu_item_id
+        ).values_list('menu_id', flat=True))
+        menu_ids.add(previous_menu_id(instance))
+        menu_ids.discard(None)
+        Menu.bump_tree_version(menu_ids)
+        schedule_warmup(menu_ids)
+
+
+@receiver(post_save, sender=QuantityReference)
+@receiver(post_delete, sender=QuantityReference)
+def rebuild_curve_on_reference_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        # A reference moved to another item leaves a stale curve behind on the old one
+        item_ids = {instance.menu_item_id, previous_item_id(instance)} - {None}
+        rebuild_item_curves(item_ids)
+        schedule_recompute(item_ids)
+
+
+@receiver(post_save, sender=User)
+def bump_menus_on_creator_change(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # Menu representations embed their creator; logins only touch last_login
+    if created or raw or (update_fields is not None and set(update_fields) <= {'last_login'}):
+        return
+    Menu.bump_tree_version(Menu.objects.filter(created_by=instance).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=MenuItem)
+def index_item(sender, instance, raw=False, **kwargs):
+    if raw or not autocomplete_index.built:
+        return
+
+    def update():
+        row = MenuItem.objects.filter(pk=instance.pk).values_list(
+            'pk', 'name', 'course_id', 'course__name', 'course__menu_id'
+        ).first()
+        if row is not None:
+            autocomplete_index.upsert_item(*row)
+    transaction.on_commit(update)
+
+
+@receiver(post_delete, sender=MenuItem)
+def unindex_item(sender, instance, **kwargs):
+    if autocomplete_index.built:
+        item_id = instance.pk
+        transaction.on_commit(lambda: autocomplete_index.remove_item(item_id))
+
+
+@receiver(post_save, sender=Course)
+def index_course(sender, instance, raw=False, **kwargs):
+    if not raw and autocomplete_index.built:
+        course_id, name, menu_id = instance.pk, instance.name, instance.menu_id
+        transaction.on_commit(lambda: autocomplete_index.upsert_course(course_id, name, menu_id))
+
+
+@receiver(post_delete, sender=Course)
+def unindex_course(sender, instance, **kwargs):
+    if autocomplete_index.built:
+        course_id = instance.pk
+        transaction.on_commit(lambda: autocomplete_index.remove_course(course_id))
+
+
+@receiver(post_delete, sender=Menu)
+@receiver(post_delete, sender=Course)
+@receiver(post_delete, sender=MenuItem)
+@receiver(post_delete, sender=QuantityReference)
+def record_tombstone(sender, instance, **kwargs):
+    # Offline clients learn about deletions from the change feed
+    Tombstone.objects.create(kind=TOMBSTONE_KINDS[sender], object_id=instance.pk)
+
+
+@receiver(post_delete, sender=Token)
+def evict_deleted_token(sender, instance, **kwargs):
+    invalidate_tokens([instance.key])
+
+
+@receiver(post_save, sender=User)
+def evict_tokens_on_user_change(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # Deactivation, permission and profile changes must not be served from the cache
+    if created or raw or (update_fields is not None and set(update_fields) <= {'last_login'}):
+        return
+    invalidate_tokens(Token.objects.filter(user=instance).values_list('key', flat=True))
@@ -0,0 +1,123 @@
+"""
+Change feed for offline clients.
+
+Menus, courses, menu items and quantity references carry an indexed
+``updated_at`` and deletions leave a Tombstone, so a client that remembers
+the cursor of its last sync can fetch only what changed since then.
+
+A cursor is the feed's upper bound in microseconds since the epoch. The
+upper bound trails the clock by ``CHEF_CO_SYNC_LAG`` seconds so that rows
+saved by transactions still in flight are picked up by the next sync rather
+than skipped.
+
+Each response holds at most ``limit`` rows across all feeds. When more are
+waiting, the cursor stops just before the first row left out and
+``has_more`` is set, so the client keeps syncing from the cursor until it is
+clear. Rows sharing one timestamp are never split between pages.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Menu, Course, MenuItem, QuantityReference, Tombstone
+from .serializers import (
+    SyncMenuSerializer, SyncCourseSerializer, SyncMenuItemSerializer, SyncQuantityReferenceSerializer
+)
+
+
+FEEDS = (
+    (Tombstone.MENU, Menu, SyncMenuSerializer),
+    (Tombstone.COURSE, Course, SyncCourseSerializer),
+    (Tombstone.MENU_ITEM, MenuItem, SyncMenuItemSerializer),
+    (Tombstone.QUANTITY_REFERENCE, QuantityReference, SyncQuantityReferenceSerializer),
+)
+
+TOMBSTONE_KINDS = {model: kind for kind, model, _ in FEEDS}
+
+
+EPOCH = datetime.fromtimestamp(0, tz=dt_timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def encode_cursor(moment):
+    # Integer arithmetic: a float timestamp can be off by a microsecond at page boundaries
+    return str((moment - EPOCH) // MICROSECOND)
+
+
+def decode_cursor(cursor):
+    """
+    Parse a cursor, raising ValueError for anything that is not one.
+    """
+    micros = int(cursor)
+    if micros < 0:
+        raise ValueError(cursor)
+    return EPOCH + micros * MICROSECOND
+
+
+def page_size():
+    return getattr(settings, 'CHEF_CO_SYNC_PAGE_SIZE', 1000)
+
+
+def _fetch(since, until, limit):
+    """
+    The rows of every feed and the tombstones in (since, until], oldest
+    first, at most ``limit`` + 1 of each when a limit is given.
+    """
+    rows = {}
+    for kind, model, _ in FEEDS:
+        queryset = model.objects.filter(updated_at__lte=until)
+        if since is not None:
+            queryset = queryset.filter(updated_at__gt=since)
+        queryset = queryset.order_by('updated_at', 'pk')
+        rows[kind] = list(queryset[:limit + 1] if limit else queryset)
+
+    tombstones = []
+    if since is not None:
+        queryset = Tombstone.objects.filter(deleted_at__gt=since, deleted_at__lte=until).order_by('deleted_at', 'pk')
+        queryset = queryset.values_list('deleted_at', 'kind', 'object_id')
+        tombstones = list(queryset[:limit + 1] if limit else queryset)
+    return rows, tombstones
+
+
+def changes_since(since=None, limit=None):
+    """
+    Everything created, updated or deleted after ``since`` (a datetime, or None
+    for a full snapshot) up to the returned cursor, in pages of about
+    ``limit`` rows when given.
+    """
+    until = timezone.now() - timedelta(seconds=getattr(settings, 'CHEF_CO_SYNC_LAG', 5))
+    if since is not None and since > until:
+        until = since
+
+    rows, tombstones = _fetch(since, until, limit)
+    has_more = False
+    if limit:
+        moments = sorted(
+            [row.updated_at for feed in rows.values() for row in feed] + [moment for moment, _, _ in tombstones]
+        )
+        if len(moments) > limit:
+            has_more = True
+            # Each feed was fetched up to limit + 1 rows, so it holds every row before this one
+            first_left_out = moments[limit]
+            if moments[0] < first_left_out:
+                until = first_left_out - MICROSECOND
+            else:
+                # The whole page shares one timestamp, which a cursor cannot split
+                until = first_left_out
+                rows, tombstones = _fetch(since, until, None)
+            rows = {kind: [row for row in feed if row.updated_at <= until] for kind, feed in rows.items()}
+            tombstones = [tombstone for tombstone in tombstones if tombstone[0] <= until]
+
+    changes = {kind: serializer_class(rows[kind], many=True).data for kind, _, serializer_class in FEEDS}
+    deleted = {kind: [] for kind, _, _ in FEEDS}
+    for _, kind, object_id in tombstones:
+        deleted[kind].append(object_id)
+
+    return {
+        'since': encode_cursor(since) if since is not None else None,
+        'cursor': encode_cursor(until),
+        'has_more': has_more,
+        'changes': changes,
+        'deleted': deleted,
+    }
@@ -1,3 +1,1765 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+import zipfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from unittest import mock
+from xml.etree import ElementTree
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Q
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from .admin import EstimatedCountPaginator
+from .admission import DEFAULTS as ADMISSION_DEFAULTS, _try_start, take_token
+from .authentication import local_tokens
+from .autocomplete import PrefixIndex, index as autocomplete_index
+from .archive import archive_predictions, collect_payloads, restore_prediction, result_data_of
+from .events import merge_totals
+from .export import export_predictions
+from .bom import BOMExpander, RecipeCycleError, convert, shopping_list
+from .benchmarks import (
+    build_synthetic_menus, benchmark_endpoints, benchmark_importers, measure_startup, percentile,
+    stub_llm, synthetic_prediction
+)
+from .models import (
+    AdmissionLease, ArchivedPayload, MenuItem, QuantityReference, PartyOrder, PredictionPayload, PredictionResult,
+    ProfileReport, ScalingSegment
+)
+from .predictions import default_mode
+from .profiling import profile_request, profiling_settings
+from .recompute import flush_background_recompute, recompute_predictions, start_background_recompute
+from .render_cache import get_render_cache
+from .routing import chunk_reference_data, select_route
+from .renderers import ORJSONRenderer, ORJSONParser
+from .scaling import fit_curve, rebuild_item_curves, scale_menu
+from .validation import validate_prediction
+from .warmup import get_cached_prediction, get_prediction_cache, warm_menu, warm_party_sizes
+
+
+class BenchmarkSuiteTests(TestCase):
+    """
+    Smoke tests keeping the benchmark suite runnable at a tiny scale.
+    """
+
+    def test_synthetic_menus_scale(self):
+        dataset = build_synthetic_menus(
+            menus=2, courses=2, items=3, reference_sizes=[50, 100], orders=3, predictions=4
+        )
+        self.assertEqual(len(dataset['menus']), 2)
+        self.assertEqual(MenuItem.objects.count(), 2 * 2 * 3)
+        self.assertEqual(QuantityReference.objects.count(), 2 * 2 * 3 * 2)
+        self.assertEqual(PredictionResult.objects.count(), 4)
+
+    def test_benchmarks_run(self):
+        dataset = build_synthetic_menus(courses=1, items=2, orders=1, predictions=1)
+        results = benchmark_endpoints(dataset, repeat=1)
+        results.update(benchmark_importers(dataset, items=1, repeat=1))
+
+        self.assertIn('party_orders.predict_quantities', results)
+        self.assertIn('import_menu_data', results)
+        self.assertIn('admin.upload_csv', results)
+        for stats in results.values():
+            self.assertIn('p95_ms', stats)
+            self.assertIn('queries', stats)
+            self.assertIn('peak_memory_kib', stats)
+
+    def test_percentile(self):
+        samples = list(range(1, 101))
+        self.assertEqual(percentile(samples, 50), 50)
+        self.assertEqual(percentile(samples, 99), 99)
+        self.assertIsNone(percentile([], 50))
+
+
+class MetricsTests(TestCase):
+    """
+    The /metrics endpoint exposes request, SQL and LLM metrics.
+    """
+
+    def test_prediction_records_usage_and_metrics(self):
+        dataset = build_synthetic_menus(courses=1, items=2, orders=1, predictions=0)
+        order = dataset['orders'][0]
+
+        with stub_llm(synthetic_prediction(order.menu, order.party_size)) as client_class:
+            response_usage = client_class.return_value.chat.completions.create.return_value.usage
+            response_usage.prompt_tokens = 120
+            response_usage.completion_tokens = 80
+            response = self.client.post(
+                f"/api/party-orders/{order.id}/predict_quantities/", {}, content_type='application/json'
+            )
+        self.assertEqual(response.status_code, 201)
+
+        prediction = PredictionResult.objects.get(id=response.json()['prediction_id'])
+        self.assertEqual(prediction.prompt_tokens, 120)
+        self.assertEqual(prediction.completion_tokens, 80)
+        self.assertIsNotNone(prediction.llm_latency_ms)
+
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('chef_co_llm_tokens_total{model="gpt-4o-mini",kind="prompt"}', body)
+        self.assertIn('chef_co_llm_route_cost_usd_total{route="small"}', body)
+        self.assertIn('chef_co_http_request_duration_seconds_count{endpoint="partyorder-predict-quantities"', body)
+        self.assertIn('chef_co_db_queries_per_request_bucket{endpoint="partyorder-predict-quantities"', body)
+        self.assertIn('chef_co_prediction_stage_seconds_count{stage="build_prompt"}', body)
+
+
+class ConditionalMenuTreeTests(TestCase):
+    """
+    Menu tree endpoints answer revalidation requests with 304 until something under the menu changes.
+    """
+
+    def setUp(self):
+        self.dataset = build_synthetic_menus(courses=2, items=2, orders=1, predictions=0)
+        self.menu = self.dataset['menus'][0]
+
+    def test_not_modified_skips_serializer(self):
+        url = f"/api/menus/{self.menu.id}/"
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_reference_change_bumps_version(self):
+        item = MenuItem.objects.filter(course__menu=self.menu).first()
+        urls = [
+            f"/api/menus/{self.menu.id}/",
+            '/api/menus/',
+            f"/api/courses/{item.course_id}/",
+            f"/api/menu-items/{item.id}/",
+            '/api/menu-items/',
+        ]
+        etags = {url: self.client.get(url)['ETag'] for url in urls}
+
+        reference = item.quantity_references.first()
+        reference.quantity_value += 1
+        reference.save()
+
+        self.menu.refresh_from_db()
+        self.assertEqual(self.menu.tree_version, 2)
+        for url in urls:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+            self.assertEqual(response.status_code, 200, url)
+            self.assertNotEqual(response['ETag'], etags[url])
+
+    def test_other_menu_change_keeps_detail_etag(self):
+        other = build_synthetic_menus(courses=1, items=1, orders=1, predictions=0,
+                                      user=self.dataset['user'])['menus'][0]
+        url = f"/api/menus/{self.menu.id}/"
+        etag = self.client.get(url)['ETag']
+
+        MenuItem.objects.create(course=other.courses.first(), name='NEW ITEM')
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_moving_rows_bumps_both_menus(self):
+        other = build_synthetic_menus(courses=1, items=1, orders=1, predictions=0,
+                                      user=self.dataset['user'])['menus'][0]
+        urls = [f"/api/menus/{self.menu.id}/", f"/api/menus/{other.id}/"]
+
+        def moved(row, **changes):
+            etags = {url: self.client.get(url)['ETag'] for url in urls}
+            for field, value in changes.items():
+                setattr(row, field, value)
+            row.save()
+            for url in urls:
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etags[url]).status_code, 200, url)
+
+        course = self.menu.courses.first()
+        moved(course, menu=other)
+        self.assertNotIn(course.pk, [c['id'] for c in self.client.get(urls[0]).json()['courses']])
+
+        item = MenuItem.objects.filter(course__menu=self.menu).first()
+        moved(item, course=other.courses.first())
+
+        reference = QuantityReference.objects.filter(menu_item__course__menu=self.menu).first()
+        old_item = reference.menu_item
+        moved(reference, menu_item=MenuItem.objects.filter(course__menu=other).first(), party_size=999)
+        # The curve of the item it left no longer counts the moved reference
+        self.assertEqual(
+            set(ScalingSegment.objects.filter(menu_item=old_item).values_list('reference_count', flat=True)),
+            {old_item.quantity_references.count()}
+        )
+
+
+class RenderCacheTests(TestCase):
+    """
+    Nested menu representations are serialized once per menu version.
+    """
+
+    def setUp(self):
+        get_render_cache().clear()
+        self.dataset = build_synthetic_menus(menus=2, courses=2, items=3, orders=1, predictions=0)
+        self.menu = self.dataset['menus'][0]
+
+    def test_detail_served_from_cache(self):
+        url = f"/api/menus/{self.menu.id}/"
+        first = self.client.get(url).json()
+        # Version check and object lookup only; no course/item/reference queries
+        with self.assertNumQueries(2):
+            second = self.client.get(url).json()
+        self.assertEqual(first, second)
+
+    def test_list_reserializes_only_changed_menu(self):
+        first = self.client.get('/api/menus/').json()
+        item = MenuItem.objects.filter(course__menu=self.menu).first()
+        item.name = 'RENAMED'
+        item.save()
+
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get('/api/menus/').json()
+        item_queries = [q for q in queries.captured_queries if 'chef_co_menuitem' in q['sql']]
+        self.assertEqual(len(item_queries), 1)
+
+        names = [i['name'] for c in second['results'][0]['courses'] for i in c['menu_items']]
+        self.assertIn('RENAMED', names)
+        self.assertEqual(first['results'][1], second['results'][1])
+
+    def test_gzipped_detail(self):
+        url = f"/api/menus/{self.menu.id}/"
+        expected = self.client.get(url).json()
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(response.content)), expected)
+
+
+class RendererTests(TestCase):
+    """
+    The fast renderers produce the same values as DRF's JSON renderer.
+    """
+
+    def test_orjson_matches_stdlib(self):
+        data = {
+            'quantity_value': Decimal('12.50'),
+            'created_at': datetime(2025, 5, 21, 1, 49, 0, 123456, tzinfo=dt_timezone.utc),
+            'name': 'PANEER   CURRY',
+            1: [1.5, None, True],
+        }
+        expected = JSONRenderer().render(data)
+        rendered = ORJSONRenderer().render(data)
+        self.assertEqual(json.loads(rendered), json.loads(expected))
+        self.assertNotIn(b'\xe2\x80\xa8', rendered)
+
+    def test_orjson_parser_round_trip(self):
+        body = ORJSONRenderer().render({'name': 'DAL', 'quantity_value': Decimal('2.00')})
+        self.assertEqual(ORJSONParser().parse(BytesIO(body)), {'name': 'DAL', 'quantity_value': 2.0})
+
+    def test_api_accepts_and_returns_json(self):
+        build_synthetic_menus(courses=1, items=2, orders=1, predictions=1)
+        response = self.client.get('/api/quantity-references/', HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(len(response.json()['results']), 8)
+
+
+class BulkUpsertTests(TestCase):
+    """
+    Quantity references can be upserted in one request with a status per row.
+    """
+
+    def setUp(self):
+        self.dataset = build_synthetic_menus(courses=1, items=3, reference_sizes=[50, 100], orders=1, predictions=0)
+        self.items = list(MenuItem.objects.order_by('id'))
+
+    def post(self, rows, query=''):
+        return self.client.post(f"/api/quantity-references/bulk/{query}", rows, content_type='application/json')
+
+    def test_mixed_batch(self):
+        existing = QuantityReference.objects.get(menu_item=self.items[0], party_size=50)
+        menu = self.dataset['menus'][0]
+        rows = [
+            {'menu_item': self.items[0].id, 'party_size': 50, 'quantity_value': '9.50', 'unit': 'KG'},
+            {'menu_item': self.items[1].id, 'party_size': 75, 'quantity_value': '3', 'unit': 'KG'},
+            {'menu_item': existing.menu_item_id, 'party_size': 100,
+             'quantity_value': str(QuantityReference.objects.get(menu_item=self.items[0], party_size=100).quantity_value),
+             'unit': QuantityReference.objects.get(menu_item=self.items[0], party_size=100).unit},
+            {'menu_item': 999999, 'party_size': 50, 'quantity_value': '1', 'unit': 'KG'},
+            {'menu_item': self.items[2].id, 'party_size': 50, 'quantity_value': 'abc', 'unit': 'KG'},
+            {'menu_item': self.items[1].id, 'party_size': 75, 'quantity_value': '4', 'unit': 'KG'},
+        ]
+        response = self.post(rows)
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(
+            [row['status'] for row in body['results']],
+            ['updated', 'created', 'unchanged', 'error', 'error', 'error']
+        )
+        self.assertEqual((body['created'], body['updated'], body['unchanged'], body['error']), (1, 1, 1, 3))
+
+        existing.refresh_from_db()
+        self.assertEqual(existing.quantity_value, Decimal('9.50'))
+        self.assertEqual(body['results'][0]['id'], existing.id)
+        created = QuantityReference.objects.get(menu_item=self.items[1], party_size=75)
+        self.assertEqual(created.quantity_value, Decimal('3'))
+        self.assertEqual(body['results'][1]['id'], created.id)
+
+        menu.refresh_from_db()
+        self.assertEqual(menu.tree_version, 2)
+
+    def test_atomic_rejects_whole_batch(self):
+        rows = [
+            {'menu_item': self.items[0].id, 'party_size': 50, 'quantity_value': '9.50', 'unit': 'KG'},
+            {'menu_item': self.items[0].id, 'party_size': 100},
+        ]
+        before = QuantityReference.objects.get(menu_item=self.items[0], party_size=50).quantity_value
+        response = self.post(rows, '?atomic=true')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([row['status'] for row in response.json()['results']], ['skipped', 'error'])
+        self.assertEqual(QuantityReference.objects.get(menu_item=self.items[0], party_size=50).quantity_value, before)
+
+    def test_single_write_query(self):
+        rows = [
+            {'menu_item': item.id, 'party_size': 250, 'quantity_value': '5', 'unit': 'KG'}
+            for item in self.items
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post(rows)
+        self.assertEqual(response.json()['created'], 3)
+        inserts = [q for q in queries.captured_queries if q['sql'].startswith('INSERT INTO "chef_co_quantityreference"')]
+        self.assertEqual(len(inserts), 1)
+
+
+class ScalingCurveTests(TestCase):
+    """
+    Materialized scaling curves follow the references and are maintained incrementally.
+    """
+
+    def setUp(self):
+        self.dataset = build_synthetic_menus(courses=2, items=2, reference_sizes=[50, 100, 250, 500],
+                                             orders=1, predictions=0)
+        self.menu = self.dataset['menus'][0]
+        self.item = MenuItem.objects.filter(course__menu=self.menu).order_by('id').first()
+
+    def quantities(self, party_size):
+        courses = scale_menu(self.menu.id, party_size)
+        return {item['item_name']: item for course in courses for item in course['items']}
+
+    def test_fit_curve(self):
+        segments = fit_curve([(100, 4.0, 'KG'), (50, 2.0, 'KG'), (250, 6.0, 'KG')])
+        self.assertEqual([(s['lower_bound'], s['upper_bound']) for s in segments],
+                         [(0, 50), (50, 100), (100, 250), (250, None)])
+        interior = segments[1]
+        self.assertAlmostEqual(interior['intercept'] + interior['slope'] * 75, 3.0)
+        self.assertEqual(fit_curve([(50, 2.0, 'PC')])[0]['slope'], 2.0 / 50)
+        self.assertEqual(fit_curve([]), [])
+
+    def test_interpolates_and_extrapolates(self):
+        QuantityReference.objects.filter(menu_item=self.item, party_size=50).update(quantity_value=2)
+        QuantityReference.objects.filter(menu_item=self.item, party_size=100).update(quantity_value=4)
+        rebuild_item_curves([self.item.id])
+
+        self.assertEqual(self.quantities(75)[self.item.name]['quantity_value'], 3.0)
+        self.assertEqual(self.quantities(100)[self.item.name]['quantity_value'], 4.0)
+        self.assertGreater(self.quantities(800)[self.item.name]['quantity_value'],
+                           self.quantities(500)[self.item.name]['quantity_value'])
+        self.assertEqual(len(self.quantities(75)), 4)
+
+    def test_reference_change_rebuilds_only_that_item(self):
+        other_segments = list(
+            ScalingSegment.objects.exclude(menu_item=self.item).order_by('id').values_list('id', flat=True)
+        )
+        reference = self.item.quantity_references.get(party_size=100)
+        reference.quantity_value = Decimal('50.00')
+        reference.save()
+
+        self.assertEqual(self.quantities(100)[self.item.name]['quantity_value'], 50.0)
+        self.assertEqual(
+            list(ScalingSegment.objects.exclude(menu_item=self.item).order_by('id').values_list('id', flat=True)),
+            other_segments
+        )
+
+    def test_scaled_quantities_endpoint(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(f"/api/menus/{self.menu.id}/scaled_quantities/?party_size=175")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['predictions']), 2)
+        response = self.client.get(f"/api/menus/{self.menu.id}/scaled_quantities/?party_size=abc")
+        self.assertEqual(response.status_code, 400)
+
+
+class HybridPredictionTests(TestCase):
+    """
+    Hybrid mode computes well-referenced items locally and asks the LLM only for the rest.
+    """
+
+    def setUp(self):
+        self.dataset = build_synthetic_menus(courses=2, items=2, orders=1, predictions=0)
+        self.order = self.dataset['orders'][0]
+        self.sparse = MenuItem.objects.filter(course__menu=self.order.menu).order_by('id').last()
+        self.sparse.quantity_references.exclude(party_size=100).delete()
+
+    def predict(self, payload):
+        with stub_llm(payload) as client_class:
+            response = self.client.post(
+                f"/api/party-orders/{self.order.id}/predict_quantities/",
+                {'mode': 'hybrid'}, content_type='application/json'
+            )
+        return response, client_class.return_value.chat.completions.create
+
+    def test_only_sparse_items_sent_to_llm(self):
+        course_name = self.sparse.course.name
+        payload = {'predictions': [{'course_name': course_name, 'items': [
+            {'item_name': self.sparse.name, 'quantity_value': 7.5, 'unit': 'KG'}
+        ]}]}
+        response, create = self.predict(payload)
+        self.assertEqual(response.status_code, 201)
+
+        prompt = create.call_args.kwargs['messages'][1]['content']
+        self.assertIn(self.sparse.name, prompt)
+        others = MenuItem.objects.filter(course__menu=self.order.menu).exclude(pk=self.sparse.pk)
+        for item in others:
+            self.assertNotIn(f"'{item.name}'", prompt)
+
+        data = response.json()['data']
+        self.assertEqual(data['sources']['local'], 3)
+        self.assertEqual(data['sources']['llm'], 1)
+        items = {item['item_name']: item for course in data['predictions'] for item in course['items']}
+        self.assertEqual(items[self.sparse.name]['source'], 'llm')
+        self.assertEqual(items[self.sparse.name]['quantity_value'], 7.5)
+        self.assertEqual(len(items), 4)
+
+    def test_fully_referenced_menu_skips_llm(self):
+        self.sparse.delete()
+        response, create = self.predict({'predictions': []})
+        self.assertEqual(response.status_code, 201)
+        create.assert_not_called()
+        self.assertEqual(response.json()['data']['sources']['llm'], 0)
+
+    def test_local_items_read_materialized_curves(self):
+        self.sparse.delete()
+        item = MenuItem.objects.filter(course__menu=self.order.menu).order_by('id').first()
+        party_size = self.order.party_size
+        segment = ScalingSegment.objects.get(
+            Q(upper_bound__gt=party_size) | Q(upper_bound__isnull=True),
+            menu_item=item, lower_bound__lte=party_size
+        )
+        # Nudge the stored curve within tolerance so the value can only have come from it
+        segment.intercept += 0.01
+        segment.save()
+        expected = round(segment.quantity_for(party_size), 2)
+
+        response, create = self.predict({'predictions': []})
+        self.assertEqual(response.status_code, 201)
+        items = {line['item_name']: line for course in response.json()['data']['predictions'] for line in course['items']}
+        self.assertEqual(items[item.name]['quantity_value'], expected)
+
+    def test_invalid_mode(self):
+        response = self.client.post(
+            f"/api/party-orders/{self.order.id}/predict_quantities/",
+            {'mode': 'magic'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(CHEF_CO_WARM_PARTY_SIZES=[150], CHEF_CO_WARM_TOP_SIZES=0)
+class PredictionWarmupTests(TestCase):
+    """
+    Warmed predictions are served without calling the LLM until the menu changes.
+    """
+
+    def setUp(self):
+        get_prediction_cache().clear()
+        self.dataset = build_synthetic_menus(courses=1, items=2, orders=1, predictions=0)
+        self.order = self.dataset['orders'][0]
+        self.order.party_size = 150
+        self.order.save()
+        self.payload = synthetic_prediction(self.order.menu, 150)
+
+    def predict(self):
+        with stub_llm(self.payload) as client_class:
+            response = self.client.post(
+                f"/api/party-orders/{self.order.id}/predict_quantities/", {}, content_type='application/json'
+            )
+        return response, client_class.return_value.chat.completions.create
+
+    def test_warmed_prediction_skips_llm(self):
+        with stub_llm(self.payload):
+            self.assertEqual(warm_menu(self.order.menu_id), [(150, 'warmed')])
+            self.assertEqual(warm_menu(self.order.menu_id), [(150, 'cached')])
+
+        response, create = self.predict()
+        self.assertEqual(response.status_code, 201)
+        create.assert_not_called()
+        self.assertTrue(response.json()['cached'])
+        cached_data, _ = get_cached_prediction(self.order.menu, 150, default_mode())
+        self.assertEqual(response.json()['data'], cached_data)
+        self.assertEqual(response.json()['data']['validation']['status'], 'valid')
+        prediction = PredictionResult.objects.get(party_order=self.order)
+        self.assertIsNone(prediction.prompt_tokens)
+        self.assertIsNone(prediction.completion_tokens)
+        self.assertIsNone(prediction.llm_latency_ms)
+
+    def test_reference_change_invalidates(self):
+        with stub_llm(self.payload):
+            warm_menu(self.order.menu_id)
+        reference = QuantityReference.objects.filter(menu_item__course__menu=self.order.menu).first()
+        reference.quantity_value += 1
+        reference.save()
+
+        response, create = self.predict()
+        self.assertFalse(response.json()['cached'])
+        create.assert_called_once()
+
+    def test_frequent_party_sizes(self):
+        with self.settings(CHEF_CO_WARM_TOP_SIZES=1):
+            self.assertEqual(warm_party_sizes(self.order.menu_id), [150])
+        with self.settings(CHEF_CO_WARM_PARTY_SIZES=[75]):
+            self.assertEqual(warm_party_sizes(self.order.menu_id, top=1), [75, 150])
+
+    @override_settings(CHEF_CO_WARM_ON_CHANGE=True)
+    def test_reference_change_schedules_warmup(self):
+        reference = QuantityReference.objects.filter(menu_item__course__menu=self.order.menu).first()
+        with mock.patch('chef_co.warmup.start_background_warmup') as start, \
+                mock.patch('chef_co.recompute.start_background_recompute'):
+            with self.captureOnCommitCallbacks(execute=True):
+                reference.quantity_value += 1
+                reference.save()
+        start.assert_called_once_with(self.order.menu_id)
+
+
+class PredictionRecomputeTests(TestCase):
+    """
+    Correcting a reference patches only that item's lines in stored predictions.
+    """
+
+    def setUp(self):
+        self.dataset = build_synthetic_menus(menus=2, courses=1, items=2, orders=4, predictions=8)
+        self.menu = self.dataset['menus'][0]
+        self.item = MenuItem.objects.filter(course__menu=self.menu).order_by('id').first()
+
+    def lines(self, prediction, name):
+        return [line for course in prediction.result_data['predictions']
+                for line in course['items'] if line['item_name'] == name]
+
+    def change_reference(self):
+        reference = self.item.quantity_references.order_by('party_size').first()
+        reference.quantity_value += 10
+        reference.save()
+
+    def test_dry_run_reports_without_saving(self):
+        QuantityReference.objects.filter(menu_item=self.item).update(quantity_value=Decimal('99'))
+        rebuild_item_curves([self.item.pk])
+        before = {p.pk: p.result_data for p in PredictionResult.objects.all()}
+
+        report = recompute_predictions([self.item.pk], dry_run=True)
+        affected = PredictionResult.objects.filter(party_order__menu=self.menu)
+        self.assertEqual(report['scanned'], affected.count())
+        self.assertEqual(report['changed'], affected.count())
+        self.assertTrue(all(line['new']['quantity_value'] == 99.0 for line in report['lines']))
+        self.assertEqual({p.pk: p.result_data for p in PredictionResult.objects.all()}, before)
+
+    def test_reference_change_patches_item_lines(self):
+        other_menu = PredictionResult.objects.exclude(party_order__menu=self.menu).first()
+        other_item = MenuItem.objects.filter(course__menu=self.menu).exclude(pk=self.item.pk).first()
+        # The smallest reference only shapes the curve below the next reference size
+        prediction = PredictionResult.objects.filter(party_order__menu=self.menu, party_order__party_size__lt=100).first()
+        untouched = self.lines(prediction, other_item.name)
+
+        with mock.patch('chef_co.recompute.threading.Timer') as timer_class:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.change_reference()
+        # Nothing is recomputed inside the request; the delayed job does it
+        self.assertEqual(PredictionResult.objects.get(pk=prediction.pk).result_data, prediction.result_data)
+        self.run_background(timer_class)
+
+        prediction.refresh_from_db()
+        segment = ScalingSegment.objects.filter(
+            menu_item=self.item, lower_bound__lte=prediction.party_order.party_size
+        ).order_by('-lower_bound').first()
+        expected = round(segment.quantity_for(prediction.party_order.party_size), 2)
+        self.assertEqual(self.lines(prediction, self.item.name)[0]['quantity_value'], expected)
+        self.assertEqual(self.lines(prediction, other_item.name), untouched)
+        self.assertIn('recomputed_at', prediction.result_data)
+        self.assertEqual(prediction.validation_status, prediction.result_data['validation']['status'])
+        self.assertIn(prediction.validation_status, ('valid', 'repaired'))
+        self.assertEqual(PredictionResult.objects.get(pk=other_menu.pk).result_data, other_menu.result_data)
+
+    def run_background(self, timer_class):
+        delay, run = timer_class.call_args.args
+        self.assertEqual(delay, 5.0)
+        # The worker thread closes its connections; here that would be the test's own
+        with mock.patch('chef_co.recompute.connections.close_all'):
+            run()
+
+    def test_changes_across_transactions_are_batched(self):
+        items = list(MenuItem.objects.filter(course__menu=self.menu).values_list('pk', flat=True))
+        with mock.patch('chef_co.recompute.threading.Timer') as timer_class, \
+                mock.patch('chef_co.recompute.recompute_predictions') as recompute:
+            # One hand-over per committed transaction, e.g. per imported row
+            for item_id in items:
+                start_background_recompute({item_id})
+            # Each hand-over restarts the delay
+            self.assertEqual(timer_class.return_value.cancel.call_count, len(items) - 1)
+            self.run_background(timer_class)
+        recompute.assert_called_once_with(set(items))
+
+    def test_query_count_independent_of_predictions(self):
+        QuantityReference.objects.filter(menu_item=self.item).update(quantity_value=Decimal('42'))
+        rebuild_item_curves([self.item.pk])
+        # Items, segments, the menu tree for validation (4), predictions, and in
+        # one savepoint (2) the payload lookup and insert and one bulk update
+        with self.assertNumQueries(12):
+            report = recompute_predictions([self.item.pk])
+        self.assertEqual(report['changed'], PredictionResult.objects.filter(party_order__menu=self.menu).count())
+        self.assertEqual(recompute_predictions([self.item.pk])['changed'], 0)
+
+    def test_changes_in_one_transaction_recompute_once(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            for reference in QuantityReference.objects.filter(menu_item__course__menu=self.menu):
+                reference.quantity_value += 1
+                reference.save()
+        with mock.patch('chef_co.recompute.threading.Timer') as timer_class, \
+                mock.patch('chef_co.recompute.recompute_predictions') as recompute:
+            for callback in callbacks:
+                callback()
+            self.run_background(timer_class)
+        recompute.assert_called_once_with(set(MenuItem.objects.filter(course__menu=self.menu).values_list('pk', flat=True)))
+
+    def test_flush_runs_queued_batch(self):
+        with mock.patch('chef_co.recompute.threading.Timer') as timer_class, \
+                mock.patch('chef_co.recompute.recompute_predictions') as recompute, \
+                mock.patch('chef_co.recompute.connections.close_all'):
+            start_background_recompute({self.item.pk})
+            # What the exit hook does when a short-lived process ends before the delay
+            flush_background_recompute()
+        timer_class.return_value.cancel.assert_called_once_with()
+        recompute.assert_called_once_with({self.item.pk})
+
+
+class AdminScalabilityTests(TestCase):
+    """
+    Admin changelists and actions run a fixed number of queries however many rows there are.
+    """
+    changelists = [
+        'menu', 'course', 'menuitem', 'quantityreference', 'partyorder', 'predictionresult'
+    ]
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('boss', 'boss@example.com', 'password')
+        self.client.force_login(self.admin)
+
+    def changelist_queries(self, model):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f"/admin/chef_co/{model}/")
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        build_synthetic_menus(menus=1, courses=2, items=2, orders=2, predictions=2, user=self.admin)
+        small = {model: self.changelist_queries(model) for model in self.changelists}
+        build_synthetic_menus(menus=3, courses=3, items=4, orders=10, predictions=20, user=self.admin)
+        large = {model: self.changelist_queries(model) for model in self.changelists}
+        self.assertEqual(small, large)
+
+    def test_prediction_detail_truncates_result_data(self):
+        dataset = build_synthetic_menus(courses=1, items=1, orders=1, predictions=1, user=self.admin)
+        prediction = dataset['predictions'][0]
+        prediction.result_data = {'predictions': [], 'blob': 'x' * 20000}
+        prediction.save()
+        response = self.client.get(f"/admin/chef_co/predictionresult/{prediction.pk}/change/")
+        self.assertContains(response, 'Truncated')
+        self.assertContains(response, f'href="/api/predicted_quantities/{prediction.pk}/"')
+        self.assertNotContains(response, 'name="archive"')
+        self.assertNotContains(response, 'name="payload"')
+        self.assertLess(len(response.content), 20000 + 15000)
+
+    def test_update_prediction_names_single_update(self):
+        dataset = build_synthetic_menus(courses=1, items=1, orders=3, predictions=6, user=self.admin)
+        PredictionResult.objects.update(name='string')
+        ids = [str(p.pk) for p in dataset['predictions']]
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post('/admin/chef_co/predictionresult/', {
+                'action': 'update_prediction_names', '_selected_action': ids
+            })
+        updates = [q for q in queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        for prediction in PredictionResult.objects.select_related('party_order__menu'):
+            self.assertEqual(prediction.name, str(prediction.party_order))
+
+    def test_estimated_count_for_unfiltered_tables(self):
+        build_synthetic_menus(courses=1, items=1, orders=3, predictions=0, user=self.admin)
+        with mock.patch('chef_co.admin.estimate_row_count', return_value=250000):
+            self.assertEqual(EstimatedCountPaginator(PartyOrder.objects.order_by('pk'), 10).count, 250000)
+            filtered = PartyOrder.objects.filter(party_size__gt=0).order_by('pk')
+            self.assertEqual(EstimatedCountPaginator(filtered, 10).count, 3)
+
+
+class OpenAPISchemaTests(TestCase):
+    """
+    The schema is served from the prebuilt file, which must match the code.
+    """
+
+    def test_stored_schema_is_up_to_date(self):
+        # Fails after API changes until generate_openapi_schema is run
+        call_command('generate_openapi_schema', '--check', stdout=StringIO())
+
+    def test_served_with_validators(self):
+        response = self.client.get('/swagger.json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['info']['title'], 'Chef Co API')
+        self.assertIn('max-age=', response['Cache-Control'])
+
+        cached = self.client.get('/swagger.json', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+
+        yaml_response = self.client.get('/swagger.yaml')
+        self.assertTrue(yaml_response.content.startswith(b'swagger:'))
+        self.assertNotEqual(yaml_response['ETag'], response['ETag'])
+
+    def test_ui_points_at_prebuilt_schema(self):
+        response = self.client.get('/swagger/')
+        self.assertContains(response, '/swagger.json')
+
+
+class StartupTimeTests(TestCase):
+    """
+    Booting a worker must not import the prediction or schema generation stacks.
+    The time budget itself is checked by the benchmark command, since wall
+    time depends on the load of the machine running the suite.
+    """
+
+    def test_heavy_modules_stay_lazy(self):
+        result = measure_startup(repeat=1)
+        self.assertEqual(result['eager_heavy_modules'], [], result['slowest_imports_ms'])
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """
+    Tokens are looked up once, then served from cache until revoked.
+    """
+
+    def setUp(self):
+        from rest_framework.authtoken.models import Token
+
+        local_tokens.clear()
+        self.user = User.objects.create_user('chef', password='password')
+        self.token = Token.objects.create(user=self.user)
+
+    def get(self, token=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/menus/', HTTP_AUTHORIZATION=f"Token {token or self.token.key}")
+        token_queries = [q for q in queries if 'authtoken_token' in q['sql']]
+        return response, token_queries
+
+    def test_repeat_requests_skip_token_query(self):
+        response, token_queries = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(token_queries), 1)
+        response, token_queries = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(token_queries, [])
+
+    def test_deactivated_user_rejected(self):
+        self.get()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get()[0].status_code, 401)
+
+    def test_deleted_token_rejected(self):
+        self.get()
+        self.token.delete()
+        self.assertEqual(self.get()[0].status_code, 401)
+
+    def test_lru_is_bounded(self):
+        from rest_framework.authtoken.models import Token
+
+        with self.settings(CHEF_CO_TOKEN_CACHE={'MAX_ENTRIES': 2}):
+            for n in range(4):
+                user = User.objects.create_user(f"cook{n}")
+                self.get(Token.objects.create(user=user).key)
+        self.assertEqual(len(local_tokens), 2)
+
+    def test_shared_cache_layer(self):
+        with self.settings(CHEF_CO_TOKEN_CACHE={'CACHE': 'default'}):
+            self.get()
+            local_tokens.clear()
+            response, token_queries = self.get()
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(token_queries, [])
+
+            self.token.delete()
+            local_tokens.clear()
+            self.assertEqual(self.get()[0].status_code, 401)
+
+
+@override_settings(CHEF_CO_SYNC_LAG=0)
+class ChangeFeedTests(TestCase):
+    """
+    The sync feed returns only what changed after the client's cursor.
+    """
+
+    def setUp(self):
+        self.dataset = build_synthetic_menus(courses=2, items=2, orders=0, predictions=0)
+        self.menu = self.dataset['menus'][0]
+
+    def sync(self, cursor=None):
+        url = '/api/changes/' + (f"?since={cursor}" if cursor else '')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_full_snapshot_then_delta(self):
+        snapshot = self.sync()
+        self.assertEqual(len(snapshot['changes']['quantity_references']), 16)
+        self.assertEqual(len(snapshot['changes']['menu_items']), 4)
+
+        reference = QuantityReference.objects.filter(menu_item__course__menu=self.menu).first()
+        reference.quantity_value += 1
+        reference.save()
+        course = self.menu.courses.last()
+        course_id = course.pk
+        doomed_items = set(course.menu_items.values_list('pk', flat=True))
+        course.delete()
+
+        delta = self.sync(snapshot['cursor'])
+        self.assertEqual([row['id'] for row in delta['changes']['quantity_references']], [reference.pk])
+        self.assertEqual(delta['changes']['menu_items'], [])
+        self.assertEqual(delta['deleted']['courses'], [course_id])
+        self.assertEqual(set(delta['deleted']['menu_items']), doomed_items)
+        self.assertEqual(len(delta['deleted']['quantity_references']), 8)
+
+        self.assertEqual(self.sync(delta['cursor'])['changes']['quantity_references'], [])
+
+    def test_bulk_upsert_appears_in_feed(self):
+        cursor = self.sync()['cursor']
+        item = MenuItem.objects.filter(course__menu=self.menu).first()
+        response = self.client.post('/api/quantity-references/bulk/', [
+            {'menu_item': item.pk, 'party_size': 50, 'quantity_value': '123.00', 'unit': 'KG'}
+        ], content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        rows = self.sync(cursor)['changes']['quantity_references']
+        self.assertEqual([(row['menu_item'], row['quantity_value']) for row in rows], [(item.pk, '123.00')])
+
+    def test_query_count_independent_of_catalog(self):
+        cursor = self.sync()['cursor']
+        build_synthetic_menus(menus=2, courses=3, items=5, orders=0, predictions=0)
+        with self.assertNumQueries(5):
+            self.client.get(f"/api/changes/?since={cursor}")
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/changes/?since=yesterday').status_code, 400)
+        self.assertEqual(self.client.get('/api/changes/?limit=all').status_code, 400)
+
+    def test_pages_follow_the_cursor(self):
+        cursor = self.sync()['cursor']
+        references = list(QuantityReference.objects.filter(menu_item__course__menu=self.menu).order_by('pk'))
+        for reference in references[:7]:
+            reference.quantity_value += 1
+            reference.save()
+        item = MenuItem.objects.filter(course__menu=self.menu).first()
+        item.name = 'RENAMED'
+        item.save()
+        deleted_pk = references[-1].pk
+        references[-1].delete()
+
+        seen, deleted, pages = [], [], 0
+        while True:
+            page = self.client.get(f"/api/changes/?since={cursor}&limit=3").json()
+            pages += 1
+            rows = sum(len(feed) for feed in page['changes'].values()) + sum(len(ids) for ids in page['deleted'].values())
+            self.assertLessEqual(rows, 3)
+            seen += [row['id'] for row in page['changes']['quantity_references']]
+            seen += [('item', row['id']) for row in page['changes']['menu_items']]
+            deleted += page['deleted']['quantity_references']
+            cursor = page['cursor']
+            if not page['has_more']:
+                break
+        self.assertEqual(pages, 3)
+        self.assertEqual(seen, [reference.pk for reference in references[:7]] + [('item', item.pk)])
+        self.assertEqual(deleted, [deleted_pk])
+
+    def test_rows_sharing_a_timestamp_stay_on_one_page(self):
+        cursor = self.sync()['cursor']
+        QuantityReference.objects.filter(menu_item__course__menu=self.menu).update(updated_at=timezone.now())
+        page = self.client.get(f"/api/changes/?since={cursor}&limit=3").json()
+        # More rows than the limit, but a cursor cannot split one timestamp
+        self.assertEqual(len(page['changes']['quantity_references']), 16)
+        self.assertTrue(page['has_more'])
+        page = self.client.get(f"/api/changes/?since={page['cursor']}&limit=3").json()
+        self.assertEqual(page['changes']['quantity_references'], [])
+        self.assertFalse(page['has_more'])
+
+
+class AutocompleteTests(TestCase):
+    """
+    The prefix index answers without queries and follows saves and deletes.
+    """
+
+    def setUp(self):
+        from .models import Course, Menu
+
+        self.menu = Menu.objects.create(name='Wedding', created_by=User.objects.create_user('planner'))
+        self.mains = Course.objects.create(menu=self.menu, name='Main Course', order=1)
+        self.desserts = Course.objects.create(menu=self.menu, name='Desserts', order=2)
+        self.tikka = MenuItem.objects.create(course=self.mains, name='Chicken Tikka')
+        self.creme = MenuItem.objects.create(course=self.desserts, name='Crème Brûlée')
+        self.other_menu = Menu.objects.create(name='Gala', created_by=self.menu.created_by)
+        self.other = MenuItem.objects.create(
+            course=Course.objects.create(menu=self.other_menu, name='Starters'), name='Chicken Soup'
+        )
+        autocomplete_index.build()
+
+    def names(self, query, **kwargs):
+        return [row[1] for row in autocomplete_index.search(query, **kwargs)]
+
+    def test_prefix_word_and_course_matches(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names('chick'), ['Chicken Soup', 'Chicken Tikka'])
+            self.assertEqual(self.names('TIK'), ['Chicken Tikka'])
+            self.assertEqual(self.names('creme b'), ['Crème Brûlée'])
+            self.assertEqual(self.names('dess'), ['Crème Brûlée'])
+            self.assertEqual(self.names('chick', menu_id=self.menu.pk), ['Chicken Tikka'])
+            self.assertEqual(self.names('chick', limit=1), ['Chicken Soup'])
+
+    def test_endpoint(self):
+        response = self.client.get(f"/api/menu-items/autocomplete/?q=tik&menu={self.menu.pk}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [[self.tikka.pk, 'Chicken Tikka', self.mains.pk, 'Main Course']])
+        self.assertEqual(self.client.get('/api/menu-items/autocomplete/?q=a&limit=x').status_code, 400)
+
+    def test_incremental_updates(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tikka.name = 'Paneer Tikka'
+            self.tikka.save()
+            self.desserts.name = 'Sweets'
+            self.desserts.save()
+            self.other.delete()
+            MenuItem.objects.create(course=self.mains, name='Chana Masala')
+
+        self.assertEqual(self.names('chick'), [])
+        self.assertEqual(self.names('paneer'), ['Paneer Tikka'])
+        self.assertEqual(self.names('sweet'), ['Crème Brûlée'])
+        self.assertEqual(self.names('dess'), [])
+        self.assertEqual(self.names('ch'), ['Chana Masala'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.mains.delete()
+        self.assertEqual(self.names('tikka'), [])
+
+    def test_rebuild_keeps_serving_and_replays_changes(self):
+        rows = list(MenuItem.objects.values_list('pk', 'name', 'course_id', 'course__name', 'course__menu_id'))
+        found = []
+
+        def during_rebuild():
+            # Searches are not held up by the rebuild's query
+            searcher = threading.Thread(target=lambda: found.extend(self.names('chick')))
+            searcher.start()
+            searcher.join(timeout=5)
+            # Committed after the query read its rows
+            autocomplete_index.upsert_item(self.tikka.pk, 'Paneer Tikka', self.mains.pk, 'Main Course', self.menu.pk)
+            yield from rows
+
+        with mock.patch.object(MenuItem.objects, 'values_list') as values_list:
+            values_list.return_value.iterator.side_effect = during_rebuild
+            autocomplete_index.build()
+        self.assertEqual(found, ['Chicken Soup', 'Chicken Tikka'])
+        self.assertEqual(self.names('paneer'), ['Paneer Tikka'])
+        self.assertEqual(self.names('chick'), ['Chicken Soup'])
+
+    def test_sub_millisecond_search(self):
+        prefix_index = PrefixIndex()
+        for n in range(20000):
+            prefix_index.upsert_item(n, f"Item {n} Special", n % 50, f"Course {n % 50}", 1)
+        start = time.perf_counter()
+        for n in range(1000):
+            prefix_index.search(f"item {n}")
+        self.assertLess((time.perf_counter() - start) / 1000, 0.001)
+
+
+class BillOfMaterialsTests(TestCase):
+    """
+    Predicted dish quantities expand through nested recipes into raw ingredients.
+    """
+
+    def setUp(self):
+        from .models import Course, Ingredient, Menu, Recipe, RecipeLine
+
+        self.menu = Menu.objects.create(name='Wedding', created_by=User.objects.create_user('planner'))
+        mains = Course.objects.create(menu=self.menu, name='Main Course', order=1)
+        curry = MenuItem.objects.create(course=mains, name='Chicken Curry')
+        rice = MenuItem.objects.create(course=mains, name='Jeera Rice')
+        MenuItem.objects.create(course=mains, name='Salad')
+
+        self.chicken, self.onion, self.chilli, self.cumin, self.basmati = [
+            Ingredient.objects.create(name=name, unit='KG')
+            for name in ('Chicken', 'Onion', 'Chilli', 'Cumin', 'Basmati')
+        ]
+        # Shared by both dishes: 1 KG of spice mix is 0.6 KG chilli and 0.4 KG cumin
+        self.spice = Recipe.objects.create(name='Spice Mix', yield_quantity=1, yield_unit='KG')
+        RecipeLine.objects.create(recipe=self.spice, ingredient=self.chilli, quantity=Decimal('0.6'))
+        RecipeLine.objects.create(recipe=self.spice, ingredient=self.cumin, quantity=Decimal('0.4'))
+        # 10 KG of curry: 6 KG chicken, 3 KG onion, 0.5 KG spice mix
+        self.curry = Recipe.objects.create(name='Curry', menu_item=curry, yield_quantity=10, yield_unit='KG')
+        RecipeLine.objects.create(recipe=self.curry, ingredient=self.chicken, quantity=6)
+        RecipeLine.objects.create(recipe=self.curry, ingredient=self.onion, quantity=3)
+        RecipeLine.objects.create(recipe=self.curry, sub_recipe=self.spice, quantity=Decimal('0.5'))
+        self.rice = Recipe.objects.create(name='Jeera Rice', menu_item=rice, yield_quantity=1, yield_unit='KG')
+        RecipeLine.objects.create(recipe=self.rice, ingredient=self.basmati, quantity=Decimal('0.5'))
+        RecipeLine.objects.create(recipe=self.rice, sub_recipe=self.spice, quantity=Decimal('0.05'))
+
+    def predict(self, party_size, curry=8, rice=2000, rice_unit='GM'):
+        order = PartyOrder.objects.create(menu=self.menu, user=self.menu.created_by, party_size=party_size)
+        return PredictionResult.objects.create(party_order=order, result_data={'predictions': [{
+            'course_name': 'MAIN COURSE',
+            'items': [
+                {'item_name': 'Chicken Curry', 'quantity_value': curry, 'unit': 'KG'},
+                {'item_name': 'Jeera Rice', 'quantity_value': rice, 'unit': rice_unit},
+                {'item_name': 'Salad', 'quantity_value': 3, 'unit': 'KG'},
+            ],
+        }]})
+
+    def totals(self, report):
+        return {row['name']: row['quantity'] for row in report['ingredients']}
+
+    def test_nested_expansion(self):
+        expander = BOMExpander()
+        per_unit = {pk: round(amount, 6) for pk, amount in expander.per_unit(self.curry.pk).items()}
+        self.assertEqual(per_unit, {
+            self.chicken.pk: 0.6, self.onion.pk: 0.3, self.chilli.pk: 0.03, self.cumin.pk: 0.02,
+        })
+        self.assertIn(self.spice.pk, expander._per_unit)
+        self.assertAlmostEqual(convert(2000, 'GM', 'KG'), 2.0)
+        self.assertIsNone(convert(2, 'PC', 'KG'))
+
+    def test_prediction_shopping_list(self):
+        prediction = self.predict(100)
+        report = shopping_list([PredictionResult.objects.select_related('party_order').get(pk=prediction.pk)])
+        self.assertEqual(self.totals(report), {
+            'Basmati': 1.0, 'Chicken': 4.8, 'Chilli': 0.3, 'Cumin': 0.2, 'Onion': 2.4,
+        })
+        self.assertEqual(report['unmatched'], [{
+            'course_name': 'MAIN COURSE', 'item_name': 'Salad', 'unit': 'KG', 'quantity_value': 3.0, 'reason': 'no recipe',
+        }])
+
+        response = self.client.get(f"/api/predicted_quantities/{prediction.pk}/shopping_list/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.totals(response.json()), self.totals(report))
+
+    def test_unit_mismatch_is_reported(self):
+        prediction = self.predict(100, rice=20, rice_unit='PC')
+        report = shopping_list([PredictionResult.objects.select_related('party_order').get(pk=prediction.pk)])
+        self.assertNotIn('Basmati', self.totals(report))
+        self.assertIn('unit PC does not convert to KG', [row['reason'] for row in report['unmatched']])
+
+    def test_batch_of_orders(self):
+        predictions = [self.predict(size, curry=size / 10) for size in range(50, 250)]
+        # An older prediction of the first order is ignored
+        self.predict(50).delete()
+        stale = PredictionResult.objects.create(party_order=predictions[0].party_order, result_data={'predictions': []})
+        stale.created_at = predictions[0].created_at.replace(year=2000)
+        stale.save(update_fields=['created_at'])
+
+        ids = ','.join(str(p.party_order_id) for p in predictions)
+        # Latest ids, predictions, menu items, two recipe levels with their lines, ingredients
+        with self.assertNumQueries(8):
+            response = self.client.get(f"/api/party-orders/shopping_list/?ids={ids}")
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(len(body['predictions']), 200)
+        curry_kg = sum(size / 10 for size in range(50, 250))
+        self.assertAlmostEqual(self.totals(body)['Chicken'], round(curry_kg * 0.6, 3))
+        self.assertEqual(body['unmatched'][0]['quantity_value'], 600.0)
+        self.assertEqual(self.client.get('/api/party-orders/shopping_list/?ids=a').status_code, 400)
+
+    def test_cycles_are_rejected(self):
+        from django.core.exceptions import ValidationError
+        from .models import RecipeLine
+
+        line = RecipeLine(recipe=self.spice, sub_recipe=self.curry, quantity=1)
+        with self.assertRaises(ValidationError):
+            line.full_clean()
+        # Saved without validation, expansion still refuses to recurse forever
+        line.save()
+        with self.assertRaises(RecipeCycleError):
+            BOMExpander().per_unit(self.curry.pk)
+        response = self.client.get(f"/api/predicted_quantities/{self.predict(100).pk}/shopping_list/")
+        self.assertEqual(response.status_code, 409)
+
+
+class EventPredictionTests(TestCase):
+    """
+    An event predicts all of its menus in one pass and merges their quantities.
+    """
+
+    def setUp(self):
+        self.dataset = build_synthetic_menus(menus=4, courses=1, items=2, orders=0, predictions=0)
+        self.menus = self.dataset['menus']
+        self.user = self.menus[0].created_by
+        get_prediction_cache().clear()
+
+    def create_event(self, lines):
+        response = self.client.post('/api/events/', {
+            'name': 'Gala', 'user_id': self.user.pk,
+            'orders': [{'menu': menu.pk, 'party_size': size} for menu, size in lines],
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()
+
+    def predict(self, event):
+        with stub_llm({'predictions': []}):
+            return self.client.post(
+                f"/api/events/{event['id']}/predict_quantities/", {'mode': 'hybrid'}, content_type='application/json'
+            )
+
+    def test_per_menu_results_and_merged_totals(self):
+        event = self.create_event([(self.menus[0], 120), (self.menus[1], 80), (self.menus[0], 120)])
+        self.assertEqual([line['party_size'] for line in event['orders']], [120, 80, 120])
+
+        response = self.predict(event)
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual([line['menu'] for line in body['menus']], [self.menus[0].pk, self.menus[1].pk, self.menus[0].pk])
+        self.assertEqual([line['cached'] for line in body['menus']], [False, False, True])
+        stored = PredictionResult.objects.filter(party_order__event_id=event['id']).order_by('id')
+        self.assertEqual(len(stored), 3)
+        # The repeated line came from the cache, so no LLM usage is recorded for it
+        self.assertEqual(
+            (stored[2].prompt_tokens, stored[2].completion_tokens, stored[2].llm_latency_ms), (None, None, None)
+        )
+
+        expected = {}
+        for line in body['menus']:
+            for item in line['data']['predictions'][0]['items']:
+                key = (item['item_name'], item['unit'])
+                expected[key] = expected.get(key, 0) + item['quantity_value']
+        totals = {(entry['item_name'], entry['unit']): entry for entry in body['totals']}
+        self.assertEqual(set(totals), set(expected))
+        for key, quantity in expected.items():
+            self.assertAlmostEqual(totals[key]['quantity_value'], quantity, places=2)
+        self.assertEqual(totals[next(iter(totals))]['menus'], [self.menus[0].pk, self.menus[1].pk])
+
+    def test_totals_convert_units(self):
+        def line(menu, *items):
+            return {'menu': menu, 'data': {'predictions': [{'course_name': 'MAINS', 'items': [
+                {'item_name': name, 'quantity_value': quantity, 'unit': unit} for name, quantity, unit in items
+            ]}]}}
+
+        totals = merge_totals([
+            line(1, ('Rice', 2.5, 'KG'), ('Raita', 2, 'L'), ('Papad', 40, 'PCS'), ('Salt', 1, 'PINCH')),
+            line(2, ('rice', 750, 'GMS'), ('Raita', 500, 'ml'), ('Papad', 10, 'PC'), ('Salt', 2, 'pinch')),
+        ])
+        self.assertEqual(
+            [(entry['item_name'], entry['quantity_value'], entry['unit'], entry['menus']) for entry in totals],
+            [('Papad', 50.0, 'PC', [1, 2]), ('Raita', 2.5, 'L', [1, 2]),
+             ('Rice', 3.25, 'KG', [1, 2]), ('Salt', 3.0, 'PINCH', [1, 2])]
+        )
+
+    # The first admitted request also creates the rate limit buckets
+    @override_settings(CHEF_CO_ADMISSION={'ENABLED': False})
+    def test_query_count_independent_of_menus(self):
+        small = self.create_event([(self.menus[0], 60), (self.menus[1], 70)])
+        large = self.create_event([(menu, 90) for menu in self.menus])
+        with CaptureQueriesContext(connection) as small_queries:
+            self.assertEqual(self.predict(small).status_code, 201)
+        with CaptureQueriesContext(connection) as large_queries:
+            self.assertEqual(self.predict(large).status_code, 201)
+        self.assertEqual(len(small_queries), len(large_queries))
+
+    def test_replace_lines_and_validation(self):
+        event = self.create_event([(self.menus[0], 50)])
+        response = self.client.patch(
+            f"/api/events/{event['id']}/", {'orders': [{'menu': self.menus[2].pk, 'party_size': 75}]},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(line['menu'], line['party_size']) for line in response.json()['orders']], [(self.menus[2].pk, 75)])
+        self.assertFalse(PartyOrder.objects.filter(pk=event['orders'][0]['id']).exists())
+
+        response = self.client.post('/api/events/', {'name': 'Empty', 'user_id': self.user.pk, 'orders': []},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class PredictionExportTests(TestCase):
+    """
+    Predictions stream out in the top sheet layout as CSV or XLSX.
+    """
+
+    def setUp(self):
+        self.dataset = build_synthetic_menus(courses=2, items=2, orders=3, predictions=3)
+        self.prediction = PredictionResult.objects.select_related('party_order').order_by('pk').first()
+
+    def export(self, query):
+        response = self.client.get(f"/api/predicted_quantities/export/?{query}")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def expected_rows(self, prediction):
+        rows = [['MENU', '', f"{prediction.party_order.party_size} PAX", '', prediction.name]]
+        for course in prediction.result_data['predictions']:
+            rows.append([])
+            rows.append([course['course_name']])
+            for item in course['items']:
+                quantity = ('%.2f' % item['quantity_value']).rstrip('0').rstrip('.')
+                rows.append([item['item_name'], '', f"{quantity}{item['unit']}"])
+        return rows
+
+    def test_csv(self):
+        response, body = self.export(f"ids={self.prediction.pk}")
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('predictions.csv', response['Content-Disposition'])
+        rows = list(csv.reader(StringIO(body.decode())))
+        self.assertEqual(rows, self.expected_rows(self.prediction))
+
+        _, body = self.export('')
+        self.assertEqual(body.decode().count('MENU,'), PredictionResult.objects.count())
+
+    def test_xlsx(self):
+        _, body = self.export(f"file=xlsx&ids={self.prediction.pk}")
+        with zipfile.ZipFile(BytesIO(body)) as archive:
+            self.assertIsNone(archive.testzip())
+            sheet = ElementTree.fromstring(archive.read('xl/worksheets/sheet1.xml'))
+        ns = {'x': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        rows = [[cell.find('x:is/x:t', ns).text for cell in row] for row in sheet.iterfind('.//x:row', ns)]
+        expected = [[value for value in row if value] for row in self.expected_rows(self.prediction)]
+        self.assertEqual(rows, expected)
+        self.assertEqual(self.client.get('/api/predicted_quantities/export/?file=pdf').status_code, 400)
+
+    def test_memory_stays_flat(self):
+        def peak(count):
+            queryset = PredictionResult.objects.filter(pk__in=list(PredictionResult.objects.values_list('pk', flat=True)[:count]))
+            tracemalloc.start()
+            try:
+                for _ in export_predictions(queryset, 'xlsx', chunk_size=50)[1]:
+                    pass
+                return tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        template = PredictionResult.objects.first()
+        PredictionResult.objects.bulk_create([
+            PredictionResult(party_order_id=template.party_order_id, result_data=template.result_data, name=f"copy {n}")
+            for n in range(1000)
+        ])
+        self.assertLess(peak(1000), peak(100) * 3)
+
+    def test_management_command(self):
+        out = StringIO()
+        call_command('export_predictions', '--id', str(self.prediction.pk), stdout=out)
+        self.assertTrue(out.getvalue().startswith(f"MENU,,{self.prediction.party_order.party_size} PAX"))
+
+        with tempfile.TemporaryDirectory() as workdir:
+            path = os.path.join(workdir, 'top.xlsx')
+            call_command('export_predictions', '--file-format', 'xlsx', '--output', path, stdout=StringIO())
+            with zipfile.ZipFile(path) as archive:
+                self.assertIn('xl/worksheets/sheet1.xml', archive.namelist())
+
+
+class PredictionArchiveTests(TestCase):
+    """
+    Old predictions are compressed into the archive table and restored on demand.
+    """
+
+    def setUp(self):
+        self.dataset = build_synthetic_menus(courses=2, items=3, orders=2, predictions=6)
+        self.old = list(PredictionResult.objects.order_by('pk')[:4])
+        PredictionResult.objects.filter(pk__in=[p.pk for p in self.old]).update(
+            created_at=timezone.now() - timedelta(days=200)
+        )
+        self.payloads = {p.pk: p.result_data for p in PredictionResult.objects.all()}
+        self.cutoff = timezone.now() - timedelta(days=90)
+
+    def test_archive_and_restore_on_retrieve(self):
+        report = archive_predictions(self.cutoff, batch_size=3)
+        self.assertEqual(report['archived'], 4)
+        self.assertLess(report['compressed_bytes'], report['raw_bytes'])
+        self.assertEqual(archive_predictions(self.cutoff)['archived'], 0)
+
+        archived = PredictionResult.objects.get(pk=self.old[0].pk)
+        self.assertIsNotNone(archived.archived_at)
+        self.assertEqual(archived.result_data, {})
+        self.assertEqual(result_data_of(archived), self.payloads[archived.pk])
+        self.assertEqual(PredictionResult.objects.filter(archived_at__isnull=True).count(), 2)
+
+        response = self.client.get(f"/api/predicted_quantities/{archived.pk}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['result_data'], self.payloads[archived.pk])
+        self.assertIsNone(response.json()['archived_at'])
+        archived.refresh_from_db()
+        self.assertEqual(archived.result_data, self.payloads[archived.pk])
+        self.assertIsNone(archived.archive_id)
+
+    def test_shared_payloads_are_archived_once(self):
+        digests = {prediction.payload_id for prediction in self.old}
+        self.assertLess(len(digests), len(self.old))
+        report = archive_predictions(self.cutoff)
+        self.assertEqual(report['archived'], 4)
+        self.assertEqual(ArchivedPayload.objects.count(), len(digests))
+        self.assertEqual(
+            set(PredictionResult.objects.filter(pk__in=[p.pk for p in self.old]).values_list('archive_id', flat=True)),
+            digests
+        )
+
+        # Restoring one prediction keeps the archive its siblings still point to
+        first = PredictionResult.objects.get(pk=self.old[0].pk)
+        siblings = PredictionResult.objects.filter(archive_id=first.archive_id).exclude(pk=first.pk)
+        self.assertTrue(siblings.exists())
+        restore_prediction(first)
+        collect_payloads()
+        self.assertTrue(ArchivedPayload.objects.filter(pk=self.old[0].payload_id).exists())
+        for sibling in siblings:
+            self.assertEqual(result_data_of(sibling), self.payloads[sibling.pk])
+
+        for prediction in PredictionResult.objects.exclude(archived_at=None):
+            restore_prediction(prediction)
+        collect_payloads()
+        self.assertFalse(ArchivedPayload.objects.exists())
+
+    @override_settings(CHEF_CO_PREDICTION_RETENTION={'RESTORE_ON_READ': False})
+    def test_read_without_restore_and_export(self):
+        archive_predictions(self.cutoff)
+        pk = self.old[1].pk
+        response = self.client.get(f"/api/predicted_quantities/{pk}/")
+        self.assertEqual(response.json()['result_data'], self.payloads[pk])
+        self.assertIsNotNone(PredictionResult.objects.get(pk=pk).archived_at)
+
+        body = b''.join(self.client.get(f"/api/predicted_quantities/export/?ids={pk}").streaming_content)
+        rows = list(csv.reader(StringIO(body.decode())))
+        item_names = {item['item_name'] for course in self.payloads[pk]['predictions'] for item in course['items']}
+        self.assertEqual(item_names, {row[0] for row in rows if len(row) == 3})
+
+    def test_recompute_skips_archived(self):
+        archive_predictions(self.cutoff)
+        item = MenuItem.objects.filter(course__menu=self.old[0].party_order.menu).first()
+        QuantityReference.objects.filter(menu_item=item).update(quantity_value=Decimal('77'))
+        rebuild_item_curves([item.pk])
+        recompute_predictions([item.pk])
+        self.assertEqual(PredictionResult.objects.get(pk=self.old[0].pk).result_data, {})
+
+    def test_command_applies_policy(self):
+        out = StringIO()
+        call_command('archive_predictions', '--dry-run', stdout=out)
+        self.assertIn('Would have Archived 4 predictions', out.getvalue())
+        self.assertFalse(PredictionResult.objects.exclude(archived_at=None).exists())
+
+        call_command('archive_predictions', '--delete-days', '180', stdout=out)
+        self.assertEqual(PredictionResult.objects.count(), 2)
+        self.assertIn('Deleted 4 predictions', out.getvalue())
+
+
+
+class PredictionPayloadTests(TestCase):
+    """
+    Identical prediction documents are stored once and shared.
+    """
+
+    def setUp(self):
+        self.dataset = build_synthetic_menus(menus=1, courses=1, items=2, orders=2, predictions=0)
+        self.order = self.dataset['orders'][0]
+        self.document = {'predictions': [{'course_name': 'COURSE 1', 'items': [
+            {'item_name': 'ITEM 1-1', 'quantity_value': 4.0, 'unit': 'KG'}
+        ]}]}
+
+    def test_identical_documents_share_a_payload(self):
+        first = PredictionResult.objects.create(party_order=self.order, result_data=self.document, name='a')
+        PredictionResult.objects.bulk_create([
+            PredictionResult(party_order=self.order, result_data=json.loads(json.dumps(self.document)), name=str(n))
+            for n in range(20)
+        ])
+        self.assertEqual(PredictionPayload.objects.count(), 1)
+        self.assertEqual(set(PredictionResult.objects.values_list('payload_id', flat=True)), {first.payload_id})
+        self.assertEqual(PredictionResult.objects.get(pk=first.pk).result_data, self.document)
+
+        first.result_data = {'predictions': []}
+        first.save(update_fields=['name'])
+        self.assertEqual(PredictionResult.objects.get(pk=first.pk).result_data, {'predictions': []})
+        self.assertEqual(PredictionPayload.objects.count(), 2)
+
+    def test_recompute_and_retention_keep_payloads_consistent(self):
+        dataset = build_synthetic_menus(menus=1, courses=1, items=2, orders=1, predictions=4)
+        # Every synthetic prediction of one order has the same content
+        self.assertEqual(len({p.payload_id for p in dataset['predictions']}), 1)
+        old_digest = dataset['predictions'][0].payload_id
+
+        item = MenuItem.objects.filter(course__menu=dataset['menus'][0]).order_by('pk').first()
+        QuantityReference.objects.filter(menu_item=item).update(quantity_value=Decimal('33'))
+        rebuild_item_curves([item.pk])
+        self.assertEqual(recompute_predictions([item.pk])['changed'], 4)
+        digests = set(PredictionResult.objects.filter(pk__in=[p.pk for p in dataset['predictions']])
+                      .values_list('payload_id', flat=True))
+        self.assertEqual(len(digests), 1)
+        self.assertNotEqual(digests, {old_digest})
+
+        archive_predictions(timezone.now() + timedelta(days=1))
+        self.assertFalse(PredictionPayload.objects.exists())
+
+
+class PredictionValidationTests(TestCase):
+    """
+    Predictions are checked against their references and repaired locally.
+    """
+
+    reference_data = {'party_size': 75, 'courses': [
+        {'course_name': 'MAINS', 'items': [
+            {'item_name': 'Biryani', 'reference_quantities': [
+                {'party_size': 50, 'quantity': 10.0, 'unit': 'KG'},
+                {'party_size': 100, 'quantity': 20.0, 'unit': 'KG'},
+            ]},
+            {'item_name': 'Raita', 'reference_quantities': [
+                {'party_size': 50, 'quantity': 5.0, 'unit': 'L'},
+                {'party_size': 100, 'quantity': 9.0, 'unit': 'L'},
+            ]},
+        ]},
+        {'course_name': 'DESSERT', 'items': [
+            {'item_name': 'Kheer', 'reference_quantities': [
+                {'party_size': 100, 'quantity': 8.0, 'unit': 'KG'},
+            ]},
+        ]},
+    ]}
+
+    def answer(self, mains, dessert=None):
+        return {'predictions': [
+            {'course_name': 'MAINS', 'items': mains},
+            {'course_name': 'DESSERT', 'items': dessert if dessert is not None else [
+                {'item_name': 'Kheer', 'quantity_value': 6.5, 'unit': 'KG'}
+            ]},
+        ]}
+
+    def lines(self, result_data):
+        return {
+            item['item_name']: (item['quantity_value'], item['unit'])
+            for course in result_data['predictions'] for item in course['items']
+        }
+
+    def test_valid_answer_is_left_alone(self):
+        result_data = self.answer([
+            {'item_name': 'biryani ', 'quantity_value': 15.5, 'unit': 'KG'},
+            {'item_name': 'Raita', 'quantity_value': 7.0, 'unit': 'L'},
+        ])
+        record = validate_prediction(self.reference_data, result_data, 75)
+        self.assertEqual(record, {'status': 'valid', 'issues': []})
+        self.assertEqual(result_data['validation'], record)
+        # A single reference only scales proportionally, so Kheer is not range-checked
+        self.assertEqual(self.lines(result_data)['Kheer'], (6.5, 'KG'))
+
+    def test_expected_values_come_from_stored_curves(self):
+        result_data = self.answer([
+            {'item_name': 'Biryani', 'quantity_value': 15.0, 'unit': 'KG'},
+            {'item_name': 'Raita', 'quantity_value': 7.0, 'unit': 'L'},
+        ])
+        # Raita has no materialized curve and falls back to the references
+        curves = {('MAINS', 'BIRYANI'): (18.0, 'KG')}
+        record = validate_prediction(self.reference_data, result_data, 75, curves=curves)
+        self.assertEqual([(issue['item_name'], issue['expected']) for issue in record['issues']], [('Biryani', 18.0)])
+        self.assertEqual(self.lines(result_data)['Biryani'], (18.0, 'KG'))
+        self.assertEqual(self.lines(result_data)['Raita'], (7.0, 'L'))
+
+    def test_repairs_without_another_call(self):
+        result_data = self.answer([
+            {'item_name': 'Biryani', 'quantity_value': 15000, 'unit': 'GMS'},
+            {'item_name': 'Raita', 'quantity_value': 70, 'unit': 'L'},
+            {'item_name': 'Naan', 'quantity_value': 300, 'unit': 'PC'},
+        ], dessert=[])
+        record = validate_prediction(self.reference_data, result_data, 75)
+
+        self.assertEqual(record['status'], 'repaired')
+        self.assertEqual(
+            sorted((issue['kind'], issue['item_name']) for issue in record['issues']),
+            [('missing', 'Kheer'), ('out_of_range', 'Raita'), ('unexpected_item', 'Naan'), ('unit_changed', 'Biryani')]
+        )
+        self.assertEqual(self.lines(result_data), {
+            'Biryani': (15.0, 'KG'), 'Raita': (7.0, 'L'), 'Kheer': (6.0, 'KG'),
+        })
+
+    def test_unrepairable_issues_make_the_result_invalid(self):
+        reference_data = {'party_size': 75, 'courses': [{'course_name': 'MAINS', 'items': [
+            {'item_name': 'Salad', 'reference_quantities': []},
+        ]}]}
+        result_data = {'predictions': [{'course_name': 'MAINS', 'items': [
+            {'item_name': 'Salad', 'quantity_value': 'plenty', 'unit': 'KG'},
+        ]}]}
+        record = validate_prediction(reference_data, result_data, 75)
+        self.assertEqual(record['status'], 'invalid')
+        self.assertEqual(record['issues'][0]['kind'], 'invalid_quantity')
+        self.assertFalse(record['issues'][0]['repaired'])
+
+    def test_report_only_when_repair_is_disabled(self):
+        mains = [{'item_name': 'Biryani', 'quantity_value': 40, 'unit': 'KG'}]
+        result_data = self.answer(mains)
+        config = {'TOLERANCE': 0.1, 'ABSOLUTE_TOLERANCE': 0.01, 'REPAIR': False}
+        record = validate_prediction(self.reference_data, result_data, 75, config=config)
+        self.assertEqual(record['status'], 'invalid')
+        self.assertEqual({issue['kind'] for issue in record['issues']}, {'out_of_range', 'missing'})
+        self.assertEqual(result_data['predictions'][0]['items'], mains)
+
+    def test_status_recorded_on_saved_prediction(self):
+        dataset = build_synthetic_menus(courses=1, items=2, orders=1, predictions=0)
+        order = dataset['orders'][0]
+        with stub_llm({'predictions': []}):
+            response = self.client.post(
+                f"/api/party-orders/{order.id}/predict_quantities/", {'mode': 'llm'}, content_type='application/json'
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['validation_status'], 'repaired')
+        prediction = PredictionResult.objects.get(pk=response.json()['prediction_id'])
+        self.assertEqual(prediction.validation_status, 'repaired')
+        self.assertEqual(len(self.lines(prediction.result_data)), 2)
+
+
+ROUTES = [
+    {'name': 'small', 'model': 'small-model', 'max_items': 3, 'max_tokens': 500, 'chunk_items': None,
+     'latency_ms': 1000, 'prompt_price': 1.0, 'completion_price': 2.0, 'fallback': 'large'},
+    {'name': 'large', 'model': 'large-model', 'max_items': None, 'max_tokens': 1000, 'chunk_items': 2,
+     'latency_ms': 4000, 'prompt_price': 10.0, 'completion_price': 20.0, 'fallback': None},
+]
+
+
+@override_settings(CHEF_CO_LLM_ROUTES=ROUTES)
+class LLMRoutingTests(TestCase):
+    """
+    LLM requests are routed by menu size and latency budget, with a fallback on validation failure.
+    """
+
+    def setUp(self):
+        get_prediction_cache().clear()
+        self.dataset = build_synthetic_menus(courses=2, items=2, orders=1, predictions=0)
+        self.order = self.dataset['orders'][0]
+
+    def predict(self, payload, **data):
+        with stub_llm(payload) as client_class:
+            response = self.client.post(
+                f"/api/party-orders/{self.order.id}/predict_quantities/",
+                {'mode': 'llm', **data}, content_type='application/json'
+            )
+        return response, client_class.return_value.chat.completions.create
+
+    def test_select_route(self):
+        self.assertEqual(select_route(3)['name'], 'small')
+        self.assertEqual(select_route(4)['name'], 'large')
+        # Three sequential chunks of the large route cannot answer in 5 seconds
+        self.assertEqual(select_route(2, latency_budget_ms=5000)['name'], 'small')
+        self.assertEqual(select_route(6, latency_budget_ms=5000)['name'], 'large')
+
+    def test_chunks_keep_course_names(self):
+        reference_data = {'party_size': 80, 'courses': [
+            {'course_name': 'A', 'items': [{'item_name': 'a1'}, {'item_name': 'a2'}, {'item_name': 'a3'}]},
+            {'course_name': 'B', 'items': [{'item_name': 'b1'}]},
+        ]}
+        chunks = chunk_reference_data(reference_data, 2)
+        self.assertEqual(
+            [[(course['course_name'], [item['item_name'] for item in course['items']]) for course in chunk['courses']]
+             for chunk in chunks],
+            [[('A', ['a1', 'a2'])], [('A', ['a3']), ('B', ['b1'])]]
+        )
+        self.assertEqual({chunk['party_size'] for chunk in chunks}, {80})
+
+    def test_large_menu_is_chunked_and_costed(self):
+        payload = synthetic_prediction(self.order.menu, self.order.party_size)
+        with stub_llm(payload) as client_class:
+            client_class.return_value.chat.completions.create.return_value.usage.prompt_tokens = 1000
+            client_class.return_value.chat.completions.create.return_value.usage.completion_tokens = 500
+            response = self.client.post(
+                f"/api/party-orders/{self.order.id}/predict_quantities/", {'mode': 'llm'}, content_type='application/json'
+            )
+        self.assertEqual(response.status_code, 201)
+        create = client_class.return_value.chat.completions.create
+        # Four items on the large route, two per call
+        self.assertEqual(create.call_count, 2)
+        self.assertEqual({call.kwargs['model'] for call in create.call_args_list}, {'large-model'})
+        self.assertEqual({call.kwargs['max_tokens'] for call in create.call_args_list}, {1000})
+
+        usage = response.json()['usage']
+        self.assertEqual((usage['route'], usage['calls'], usage['prompt_tokens']), ('large', 2, 2000))
+        self.assertAlmostEqual(usage['cost_usd'], (2000 * 10.0 + 1000 * 20.0) / 1_000_000)
+
+    @override_settings(CHEF_CO_VALIDATION={'REPAIR': False})
+    def test_falls_back_when_validation_fails(self):
+        self.order.menu.courses.order_by('pk').last().delete()
+        response, create = self.predict({'predictions': []})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([call.kwargs['model'] for call in create.call_args_list], ['small-model', 'large-model'])
+        usage = response.json()['usage']
+        self.assertEqual((usage['route'], usage['calls'], usage['fallback_from']), ('large', 2, ['small']))
+        self.assertEqual(response.json()['validation_status'], 'invalid')
+
+    def test_valid_answer_stays_on_small_route(self):
+        self.order.menu.courses.order_by('pk').last().delete()
+        payload = synthetic_prediction(self.order.menu, self.order.party_size)
+        response, create = self.predict(payload)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(create.call_count, 1)
+        self.assertEqual(response.json()['usage']['route'], 'small')
+        self.assertNotIn('fallback_from', response.json()['usage'])
+
+    def test_invalid_latency_budget(self):
+        response, create = self.predict({'predictions': []}, latency_budget_ms='soon')
+        self.assertEqual(response.status_code, 400)
+        create.assert_not_called()
+
+
+class AdmissionControlTests(TestCase):
+    """
+    Prediction actions are rate limited and queued fairly, answering 429 with Retry-After.
+    """
+
+    def setUp(self):
+        get_prediction_cache().clear()
+        self.dataset = build_synthetic_menus(courses=1, items=2, orders=1, predictions=0)
+        self.order = self.dataset['orders'][0]
+        self.payload = synthetic_prediction(self.order.menu, self.order.party_size)
+
+    def predict(self):
+        with stub_llm(self.payload):
+            return self.client.post(
+                f"/api/party-orders/{self.order.id}/predict_quantities/", {}, content_type='application/json'
+            )
+
+    def lease(self, key, state, expires_in=60):
+        return AdmissionLease.objects.create(
+            key=key, state=state, expires_at=timezone.now() + timedelta(seconds=expires_in)
+        )
+
+    @override_settings(CHEF_CO_ADMISSION={'USER_BURST': 2, 'USER_RATE_PER_MINUTE': 2})
+    def test_rate_limit(self):
+        self.assertEqual(self.predict().status_code, 201)
+        self.assertEqual(self.predict().status_code, 201)
+        response = self.predict()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertIn('rate limit', response.json()['error'])
+        # Slots are released once the prediction is done
+        self.assertFalse(AdmissionLease.objects.exists())
+
+    @override_settings(CHEF_CO_ADMISSION={'USER_BURST': 1, 'USER_RATE_PER_MINUTE': 1})
+    def test_missing_object_does_not_spend_quota(self):
+        for _ in range(3):
+            response = self.client.post("/api/party-orders/999999/predict_quantities/", {}, content_type='application/json')
+            self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.predict().status_code, 201)
+
+    def test_token_bucket_refills(self):
+        config = {**ADMISSION_DEFAULTS, 'USER_BURST': 1, 'USER_RATE_PER_MINUTE': 60, 'GLOBAL_RATE_PER_MINUTE': None}
+        self.assertEqual(take_token('user:1', config, now=1000.0), 0)
+        self.assertAlmostEqual(take_token('user:1', config, now=1000.25), 0.75)
+        self.assertEqual(take_token('user:2', config, now=1000.25), 0)
+        self.assertEqual(take_token('user:1', config, now=1001.0), 0)
+
+    @override_settings(CHEF_CO_ADMISSION={'USER_CONCURRENCY': 1})
+    def test_per_client_concurrency(self):
+        self.lease('ip:127.0.0.1', AdmissionLease.RUNNING)
+        response = self.predict()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+
+        # Leases of dead workers expire
+        AdmissionLease.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.predict().status_code, 201)
+
+    @override_settings(CHEF_CO_ADMISSION={'GLOBAL_CONCURRENCY': 1, 'QUEUE_TIMEOUT': 0})
+    def test_busy_service_times_out_of_the_queue(self):
+        self.lease('user:99', AdmissionLease.RUNNING)
+        response = self.predict()
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('busy', response.json()['error'])
+        self.assertEqual(AdmissionLease.objects.filter(state=AdmissionLease.WAITING).count(), 0)
+        self.assertEqual(PredictionResult.objects.count(), 0)
+
+    def test_free_slots_go_to_clients_with_fewest_running(self):
+        config = {**ADMISSION_DEFAULTS, 'GLOBAL_CONCURRENCY': 2}
+        self.lease('user:1', AdmissionLease.RUNNING)
+        first = self.lease('user:1', AdmissionLease.WAITING)
+        second = self.lease('user:2', AdmissionLease.WAITING)
+
+        self.assertFalse(_try_start(first, config))
+        self.assertTrue(_try_start(second, config))
+        self.assertFalse(_try_start(first, config))
+
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('chef_co_admission_queue_depth 1', body)
+
+
+class RequestProfilingTests(TestCase):
+    """
+    Staff can profile a request on demand; everyone else is served as usual.
+    """
+
+    def setUp(self):
+        self.dataset = build_synthetic_menus(courses=2, items=3, orders=1, predictions=1)
+        self.menu = self.dataset['menus'][0]
+        self.staff = User.objects.create_user('ops', password='password', is_staff=True)
+
+    def test_ignored_for_non_staff(self):
+        response = self.client.get(f"/api/menus/{self.menu.id}/?profile=1")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Chef-Profile-Report', response)
+        self.assertFalse(ProfileReport.objects.exists())
+
+    def test_stored_report_with_explained_queries(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(f"/api/menus/{self.menu.id}/?profile=1")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('courses', response.json())
+
+        report = ProfileReport.objects.get(pk=response['X-Chef-Profile-Report'])
+        self.assertEqual((report.user, report.method, report.status_code), (self.staff, 'GET', 200))
+        self.assertEqual(report.query_count, len(report.queries))
+        explained = [query for query in report.queries if 'explain' in query]
+        self.assertTrue(explained)
+        self.assertFalse([query for query in explained if query['explain'].startswith('EXPLAIN failed')])
+        self.assertIn('cumulative', report.profile)
+
+        download = self.client.get(response['X-Chef-Profile-URL'])
+        self.assertEqual(download.status_code, 200)
+        self.assertIn('attachment', download['Content-Disposition'])
+        self.assertIn('Slowest queries', download.content.decode())
+
+        self.client.force_login(User.objects.create_superuser('boss', 'boss@example.com', 'password'))
+        self.assertEqual(self.client.get(f"/admin/chef_co/profilereport/{report.pk}/change/").status_code, 200)
+        self.assertEqual(self.client.get("/admin/chef_co/profilereport/").status_code, 200)
+
+        self.client.logout()
+        self.assertEqual(self.client.get(response['X-Chef-Profile-URL']).status_code, 403)
+
+    def test_download_with_token_and_header(self):
+        from rest_framework.authtoken.models import Token
+
+        token = Token.objects.create(user=self.staff)
+        response = self.client.get(
+            f"/api/menus/{self.menu.id}/", HTTP_AUTHORIZATION=f"Token {token.key}", HTTP_X_CHEF_PROFILE='download'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn(f"GET /api/menus/{self.menu.id}/ -> 200", response.content.decode())
+
+    def test_parameter_values_are_not_stored(self):
+        from rest_framework.authtoken.models import Token
+
+        token = Token.objects.create(user=self.staff)
+
+        def get_response(request):
+            Token.objects.filter(key=token.key).exists()
+            MenuItem.objects.filter(name='SECRET MENU', pk__gt=0).exists()
+            return None
+
+        _, fields = profile_request(get_response, None, profiling_settings())
+        self.assertNotIn(token.key, json.dumps(fields))
+        self.assertNotIn('SECRET MENU', json.dumps(fields))
+        queries = {query['sql'].split(' FROM ')[1].split()[0].strip('"'): query for query in fields['queries']}
+        self.assertIsNone(queries['authtoken_token']['params'])
+        self.assertNotIn('explain', queries['authtoken_token'])
+        self.assertEqual(set(queries['chef_co_menuitem']['params']), {'str', 'int'})
+        self.assertIn('explain', queries['chef_co_menuitem'])
+
+    @override_settings(CHEF_CO_PROFILING={'ENABLED': False})
+    def test_disabled(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(f"/api/menus/{self.menu.id}/?profile=1")
+        self.assertNotIn('X-Chef-Profile-Report', response)
+        self.assertFalse(ProfileReport.objects.exists())
@@ -9,10 +9,14 @@ router.register(r'courses', views.CourseViewSet)
 router.register(r'menu-items', views.MenuItemViewSet)
 router.register(r'quantity-references', views.QuantityReferenceViewSet)
 router.register(r'party-orders', views.PartyOrderViewSet)
+router.register(r'events', views.EventViewSet, basename='events')
 router.register(r'predicted_quantities', views.PredictedQuantitiesViewSet, basename='predicted_quantities')
+router.register(r'changes', views.ChangeFeedViewSet, basename='changes')
 
 urlpatterns = [
     # Redirect root to Swagger UI
     path('', RedirectView.as_view(url='/swagger/', permanent=False), name='home'),
     path('api/', include(router.urls)),
+    path('metrics', views.metrics, name='metrics'),
+    path('profiles/<int:pk>', views.profile_report, name='profile-report'),
 ] 
\ No newline at end of file
@@ -0,0 +1,188 @@
+"""
+Validation of predictions against the reference snapshot they were made from.
+
+Every prediction is checked before it is returned or cached: each course and
+item of the menu must be answered exactly once, in the unit of its
+references, and items whose party size lies inside their referenced range
+must land within ``TOLERANCE`` of the value on their materialized scaling
+curve (fitted from the references for items without one). Problems that can
+be fixed from the references alone are repaired in place, without another
+LLM call: missing or non-numeric lines are interpolated, convertible units
+are converted back, out-of-range values are replaced by the interpolation
+and lines for items that are not on the menu are dropped.
+
+The outcome is stored under ``validation`` in the prediction JSON and as
+PredictionResult.validation_status.
+"""
+from django.conf import settings
+
+from .bom import convert, normalize_unit
+from .metrics import prediction_validation_issues
+from .predictions import SOURCE_LOCAL, interpolate_item, item_key, refresh_sources
+
+
+DEFAULTS = {
+    'TOLERANCE': 0.1,            # Relative distance allowed from the interpolated value
+    'ABSOLUTE_TOLERANCE': 0.01,  # Floor for items whose interpolated value is close to zero
+    'REPAIR': True,
+}
+
+STATUS_VALID = 'valid'
+STATUS_REPAIRED = 'repaired'
+STATUS_INVALID = 'invalid'
+
+MISSING = 'missing'
+DUPLICATE = 'duplicate'
+INVALID_QUANTITY = 'invalid_quantity'
+UNIT_CHANGED = 'unit_changed'
+OUT_OF_RANGE = 'out_of_range'
+UNEXPECTED_ITEM = 'unexpected_item'
+
+
+def validation_settings():
+    return {**DEFAULTS, **getattr(settings, 'CHEF_CO_VALIDATION', {})}
+
+
+def _quantity(value):
+    if isinstance(value, bool):
+        return None
+    try:
+        quantity = float(value)
+    except (TypeError, ValueError):
+        return None
+    return quantity if quantity == quantity and quantity >= 0 else None
+
+
+def _expected(item_data, party_size, curve=None):
+    """
+    (quantity, unit, checked) from the item's materialized curve, or
+    interpolated from the references when it has none. ``checked`` is True
+    when the value is tight enough to hold an answer to: at least two sizes
+    in one unit with the party size between them.
+    """
+    references = item_data['reference_quantities']
+    if not references:
+        return None, None, False
+    sizes = {ref['party_size'] for ref in references}
+    units = {normalize_unit(ref['unit']) for ref in references}
+    if len(sizes) < len(references):
+        # Duplicate sizes give no curve to interpolate along
+        return None, references[0]['unit'], False
+    quantity, unit = interpolate_item(item_data, party_size, curve)
+    checked = len(sizes) > 1 and len(units) == 1 and min(sizes) <= party_size <= max(sizes)
+    return quantity, unit, checked
+
+
+def validate_prediction(reference_data, result_data, party_size, config=None, curves=None):
+    """
+    Check ``result_data`` against ``reference_data`` and, unless repair is
+    disabled, fix it in place. Expected values come from ``curves`` (see
+    predictions.menu_curves()) where an item has one. Returns the validation
+    record, which is also stored under ``result_data['validation']``.
+    """
+    config = config or validation_settings()
+    curves = curves or {}
+    repair = config['REPAIR']
+    issues = []
+
+    def report(kind, course_name, item_name, returned=None, expected=None, repaired=False):
+        issues.append({
+            'kind': kind,
+            'course_name': course_name,
+            'item_name': item_name,
+            'returned': returned,
+            'expected': expected,
+            'repaired': repaired,
+        })
+
+    answers = {}
+    for course in result_data.get('predictions') or []:
+        if not isinstance(course, dict):
+            continue
+        for line in course.get('items') or []:
+            if not isinstance(line, dict):
+                continue
+            key = item_key(course.get('course_name'), line.get('item_name'))
+            if key in answers:
+                report(DUPLICATE, course.get('course_name'), line.get('item_name'),
+                       returned=line.get('quantity_value'), repaired=repair)
+                continue
+            answers[key] = (course.get('course_name'), line)
+
+    hybrid = isinstance(result_data.get('sources'), dict)
+    predictions = []
+    for course in reference_data['courses']:
+        items = []
+        for item in course['items']:
+            course_name, item_name = course['course_name'], item['item_name']
+            key = item_key(course_name, item_name)
+            _, line = answers.pop(key, (None, None))
+            expected, unit, checked = _expected(item, party_size, curves.get(key))
+            fix = None
+
+            if line is None:
+                report(MISSING, course_name, item_name, expected=expected,
+                       repaired=repair and expected is not None)
+                if repair and expected is not None:
+                    fix = expected
+                    line = {'item_name': item_name, 'quantity_value': expected, 'unit': unit}
+                else:
+                    continue
+            else:
+                line = dict(line)
+                quantity = _quantity(line.get('quantity_value'))
+                if quantity is None:
+                    report(INVALID_QUANTITY, course_name, item_name, returned=line.get('quantity_value'),
+                           expected=expected, repaired=repair and expected is not None)
+                    fix = expected
+                elif unit is not None and normalize_unit(line.get('unit')) != normalize_unit(unit):
+                    converted = convert(quantity, line.get('unit'), unit)
+                    if converted is None:
+                        converted = expected
+                    else:
+                        converted = round(converted, 2)
+                    report(UNIT_CHANGED, course_name, item_name,
+                           returned=f"{line.get('quantity_value')} {line.get('unit')}",
+                           expected=expected, repaired=repair and converted is not None)
+                    fix = converted
+                    quantity = converted
+                if quantity is not None and checked:
+                    allowed = max(config['TOLERANCE'] * abs(expected), config['ABSOLUTE_TOLERANCE'])
+                    if abs(quantity - expected) > allowed:
+                        report(OUT_OF_RANGE, course_name, item_name, returned=line.get('quantity_value'),
+                               expected=expected, repaired=repair)
+                        fix = expected
+
+            if repair and fix is not None:
+                line.update({'item_name': item_name, 'quantity_value': fix, 'unit': unit})
+                if hybrid:
+                    line['source'] = SOURCE_LOCAL
+            items.append(line)
+        predictions.append({'course_name': course['course_name'], 'items': items})
+
+    for course_name, line in answers.values():
+        report(UNEXPECTED_ITEM, course_name, line.get('item_name'), returned=line.get('quantity_value'), repaired=repair)
+
+    if not issues:
+        status = STATUS_VALID
+    elif all(issue['repaired'] for issue in issues):
+        status = STATUS_REPAIRED
+    else:
+        status = STATUS_INVALID
+
+    if repair:
+        result_data['predictions'] = predictions
+        refresh_sources(result_data)
+    for issue in issues:
+        prediction_validation_issues.inc(kind=issue['kind'], repaired=str(issue['repaired']).lower())
+
+    record = {'status': status, 'issues': issues}
+    result_data['validation'] = record
+    return record
+
+
+def validation_status(result_data):
+    """
+    The status recorded on a prediction JSON, or '' for predictions made before validation.
+    """
+    return ((result_data or {}).get('validation') or {}).get('status', '')
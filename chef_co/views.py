@@ -1,29 +1,51 @@
-from django.shortcuts import render
+from django.db import transaction
+from django.db.models import Prefetch
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
-import json
 from django.conf import settings
-import openai
-import os
-from decimal import Decimal
+from django.http import HttpResponse, HttpResponseForbidden, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_cache_control
 from drf_yasg.utils import swagger_auto_schema
-from drf_yasg import openapi
 
-from .models import Menu, Course, MenuItem, QuantityReference, PartyOrder, PredictionResult
+from .models import Menu, Course, MenuItem, QuantityReference, PartyOrder, PredictionResult, Event, ProfileReport
 from .serializers import (
     MenuSerializer, CourseSerializer, MenuItemSerializer,
-    QuantityReferenceSerializer, PartyOrderSerializer, PredictionResultSerializer
+    QuantityReferenceSerializer, PartyOrderSerializer, PredictionResultSerializer,
+    QuantityReferenceBulkSerializer, EventSerializer
 )
-from .apiutils import tags, prediction_name_schema
+from .admission import admission_controlled, refresh_queue_depth
+from .apiutils import (
+    tags, prediction_name_schema, party_size_param, bulk_atomic_param, bulk_upsert_response, since_cursor_param,
+    sync_limit_param, autocomplete_params, autocomplete_response, party_order_ids_param, shopping_list_response,
+    event_prediction_response, export_params, admission_response
+)
+from .autocomplete import search_items
+from .bom import latest_predictions, shopping_list, RecipeCycleError
+from .bulk import bulk_upsert_references
+from .archive import result_data_of, restore_prediction, retention_settings
+from .events import predict_event
+from .export import EXPORT_FORMATS, export_predictions
+from .conditional import MenuTreeConditionalMixin
+from .render_cache import MenuTreeRenderCacheMixin
+from .metrics import registry
+from .profiling import report_download, staff_user
+from .predictions import load_menu, predict, stage_timer, default_mode, PREDICTION_MODES
+from .scaling import scale_menu
+from .sync import changes_since, decode_cursor, page_size
+from .validation import validation_status
+from .schema import schema_document
+from .warmup import get_cached_prediction, store_prediction, usage_fields
 
 
-class MenuViewSet(viewsets.ModelViewSet):
+class MenuViewSet(MenuTreeConditionalMixin, MenuTreeRenderCacheMixin, viewsets.ModelViewSet):
     """
     API endpoints for managing menus.
     """
     queryset = Menu.objects.all()
     serializer_class = MenuSerializer
+    fragment_prefetch = ('created_by', 'courses__menu_items__quantity_references')
     
     @swagger_auto_schema(
         operation_summary="Create a new menu",
@@ -35,14 +57,49 @@ class MenuViewSet(viewsets.ModelViewSet):
             serializer.save(created_by=self.request.user)
         else:
             serializer.save()
+    
+    @swagger_auto_schema(
+        operation_summary="Scale menu quantities",
+        operation_description=(
+            "Compute quantities for every referenced item of the menu for a party size from the "
+            "materialized scaling curves (linear between references, fitted slope outside them). "
+            "No AI call is made."
+        ),
+        manual_parameters=[party_size_param],
+        tags=[tags['menus']]
+    )
+    @action(detail=True, methods=['get'])
+    def scaled_quantities(self, request, pk=None):
+        """
+        Scale every referenced item of the menu to the requested party size
+        """
+        menu = self.get_object()
+        try:
+            party_size = int(request.query_params.get('party_size', ''))
+            if party_size < 1:
+                raise ValueError
+        except ValueError:
+            return Response(
+                {"error": "party_size must be a positive integer."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response({
+            "menu_id": menu.id,
+            "party_size": party_size,
+            "predictions": scale_menu(menu.id, party_size)
+        })
 
 
-class CourseViewSet(viewsets.ModelViewSet):
+class CourseViewSet(MenuTreeConditionalMixin, MenuTreeRenderCacheMixin, viewsets.ModelViewSet):
     """
     API endpoints for managing courses within menus.
     """
     queryset = Course.objects.all()
     serializer_class = CourseSerializer
+    menu_lookup = 'courses'
+    menu_path = 'menu'
+    fragment_prefetch = ('menu_items__quantity_references',)
     
     @swagger_auto_schema(
         operation_summary="List all courses",
@@ -61,12 +118,15 @@ class CourseViewSet(viewsets.ModelViewSet):
         return super().create(request, *args, **kwargs)
 
 
-class MenuItemViewSet(viewsets.ModelViewSet):
+class MenuItemViewSet(MenuTreeConditionalMixin, MenuTreeRenderCacheMixin, viewsets.ModelViewSet):
     """
     API endpoints for managing menu items within courses.
     """
     queryset = MenuItem.objects.all()
     serializer_class = MenuItemSerializer
+    menu_lookup = 'courses__menu_items'
+    menu_path = 'course__menu'
+    fragment_prefetch = ('quantity_references',)
     
     @swagger_auto_schema(
         operation_summary="List all menu items",
@@ -75,6 +135,37 @@ class MenuItemViewSet(viewsets.ModelViewSet):
     )
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
+    
+    @swagger_auto_schema(
+        operation_summary="Autocomplete menu items",
+        operation_description=(
+            "Find items whose name, a word in their name, or course name starts with q. "
+            "Served from an in-memory prefix index, without database queries."
+        ),
+        manual_parameters=autocomplete_params,
+        responses={200: autocomplete_response},
+        tags=[tags['menu_items']]
+    )
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        """
+        Return lightweight (id, name, course_id, course_name) tuples for a typed prefix
+        """
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+            menu_id = request.query_params.get('menu')
+            menu_id = int(menu_id) if menu_id else None
+        except ValueError:
+            return Response(
+                {"error": "limit and menu must be integers."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        results = search_items(request.query_params.get('q', ''), limit=limit, menu_id=menu_id)
+        return Response({
+            "fields": ["id", "name", "course_id", "course_name"],
+            "results": results
+        })
 
 
 class QuantityReferenceViewSet(viewsets.ModelViewSet):
@@ -83,6 +174,7 @@ class QuantityReferenceViewSet(viewsets.ModelViewSet):
     """
     queryset = QuantityReference.objects.all()
     serializer_class = QuantityReferenceSerializer
+    bulk_max_rows = 5000
     
     @swagger_auto_schema(
         operation_summary="List all quantity references",
@@ -91,6 +183,72 @@ class QuantityReferenceViewSet(viewsets.ModelViewSet):
     )
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
+    
+    @swagger_auto_schema(
+        operation_summary="Bulk upsert quantity references",
+        operation_description=(
+            "Create or update many quantity references in one transaction, matching rows on "
+            "(menu_item, party_size). Returns a status per row. Invalid rows are reported and skipped "
+            "unless atomic=true, in which case nothing is written if any row is invalid."
+        ),
+        request_body=QuantityReferenceBulkSerializer(many=True),
+        manual_parameters=[bulk_atomic_param],
+        responses={200: bulk_upsert_response},
+        tags=[tags['quantity_references']]
+    )
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk_upsert(self, request):
+        """
+        Upsert a list of {menu_item, party_size, quantity_value, unit} records
+        """
+        rows = request.data
+        if not isinstance(rows, list):
+            return Response(
+                {"error": "Expected a list of quantity references."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(rows) > self.bulk_max_rows:
+            return Response(
+                {"error": f"At most {self.bulk_max_rows} rows can be upserted per request."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Validate rows individually so every row gets its own status
+        records, invalid = [], {}
+        for index, row in enumerate(rows):
+            serializer = QuantityReferenceBulkSerializer(data=row)
+            if serializer.is_valid():
+                records.append((index, serializer.validated_data))
+            else:
+                invalid[index] = serializer.errors
+        
+        atomic = request.query_params.get('atomic', '').lower() in ('1', 'true', 'yes')
+        if atomic and invalid:
+            results = [
+                {"index": index, "status": "error", "errors": invalid[index]} if index in invalid
+                else {"index": index, "status": "skipped"}
+                for index in range(len(rows))
+            ]
+            return Response(self._bulk_summary(results), status=status.HTTP_400_BAD_REQUEST)
+        
+        upserted = bulk_upsert_references([record for _, record in records])
+        results = [None] * len(rows)
+        for (index, _), result in zip(records, upserted):
+            result['index'] = index
+            results[index] = result
+        for index, errors in invalid.items():
+            results[index] = {"index": index, "status": "error", "errors": errors}
+        
+        return Response(self._bulk_summary(results), status=status.HTTP_200_OK)
+    
+    @staticmethod
+    def _bulk_summary(results):
+        summary = {key: 0 for key in ('created', 'updated', 'unchanged', 'error')}
+        for result in results:
+            if result['status'] in summary:
+                summary[result['status']] += 1
+        summary['results'] = results
+        return summary
 
 
 class PartyOrderViewSet(viewsets.ModelViewSet):
@@ -108,18 +266,46 @@ class PartyOrderViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         return PartyOrder.objects.all()
     
+    @swagger_auto_schema(
+        operation_summary="Shopping list for party orders",
+        operation_description=(
+            "Expand the latest prediction of each order through the item recipes "
+            "and return aggregated raw ingredient totals."
+        ),
+        manual_parameters=[party_order_ids_param],
+        responses={200: shopping_list_response},
+        tags=[tags['predictions']]
+    )
+    @action(detail=False, methods=['get'])
+    def shopping_list(self, request):
+        """
+        Aggregate raw ingredients over a batch of party orders
+        """
+        try:
+            ids = {int(value) for value in request.query_params.get('ids', '').split(',') if value.strip()}
+        except ValueError:
+            return Response(
+                {"error": "ids must be a comma-separated list of integers."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not ids:
+            return Response({"error": "ids is required."}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return _shopping_list_response(latest_predictions(ids))
+    
     @swagger_auto_schema(
         operation_summary="Generate quantity predictions",
         operation_description="Use AI to predict quantities for a party order based on reference data and save the result.",
         request_body=prediction_name_schema,
+        responses={429: admission_response},
         tags=[tags['predictions']]
     )
     @action(detail=True, methods=['post'])
-    def predict_quantities(self, request, pk=None):
+    @admission_controlled
+    def predict_quantities(self, request, party_order, pk=None):
         """
         Use OpenAI to predict quantities for the menu items based on party size and save the result
         """
-        party_order = self.get_object()
         menu_id = party_order.menu.id
         party_size = party_order.party_size
         
@@ -128,115 +314,52 @@ class PartyOrderViewSet(viewsets.ModelViewSet):
         if not prediction_name:
             prediction_name = str(party_order)  # Use the party order's string representation
         
-        # Get all reference quantities from the database
-        menu = Menu.objects.prefetch_related(
-            'courses__menu_items__quantity_references'
-        ).get(id=menu_id)
-        
-        # Create a simpler, more explicit reference structure
-        reference_data = {"party_size": party_size, "courses": []}
-        
-        for course in menu.courses.all():
-            course_data = {
-                "course_name": course.name,
-                "items": []
-            }
-            
-            for item in course.menu_items.all():
-                item_data = {
-                    "item_name": item.name,
-                    "reference_quantities": []
-                }
-                
-                # Collect references in a simpler format
-                references = list(item.quantity_references.all().order_by('party_size'))
-                for ref in references:
-                    item_data["reference_quantities"].append({
-                        "party_size": ref.party_size,
-                        "quantity": float(ref.quantity_value),
-                        "unit": ref.unit
-                    })
-                
-                course_data["items"].append(item_data)
-            
-            reference_data["courses"].append(course_data)
-        
-        # Create a very explicit prompt with clear examples
-        prompt = f"""
-        Your task is to predict food quantities needed for a party of {party_size} people.
-        
-        The reference data contains known quantities for standard party sizes (typically 50, 100, 250, 500 people).
-        
-        The relationship between party size and quantity is typically linear. For example:
-        - If 50 people need 2KG and 100 people need 4KG, then 75 people would need 3KG.
-        - If 50 people need 200 pieces and 100 people need 500 pieces, then 75 people would need 350 pieces.
-        
-        Here is the reference data:
-        {reference_data}
-        
-        For each menu item, calculate the appropriate quantity for {party_size} people by using linear interpolation/extrapolation from the reference data.
-        
-        Return a JSON object with the following structure:
-        {{
-          "predictions": [
-            {{
-              "course_name": "COURSE_NAME",
-              "items": [
-                {{ 
-                  "item_name": "ITEM_NAME", 
-                  "quantity_value": NUMERIC_VALUE, 
-                  "unit": "ORIGINAL_UNIT" 
-                }},
-                ...
-              ]
-            }},
-            ...
-          ]
-        }}
-        
-        Important:
-        1. Preserve the original units exactly as they appear in the reference data (KG, PC, etc.)
-        2. Include ALL courses and ALL items from the reference data in your prediction
-        3. Calculate each value by proper linear scaling based on party size
-        """
-        
+        mode = request.data.get('mode') or default_mode()
+        if mode not in PREDICTION_MODES:
+            return Response(
+                {"error": f"mode must be one of: {', '.join(PREDICTION_MODES)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         try:
-            # Initialize OpenAI client
-            client = openai.OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-            
-            # Call OpenAI API with strict parameters
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {
-                        "role": "system", 
-                        "content": "You are a calculator for food quantities. Your only job is to perform linear interpolation based on party sizes and return correctly formatted JSON. Maintain the original units."
-                    },
-                    {"role": "user", "content": prompt}
-                ],
-                response_format={"type": "json_object"},
-                temperature=0.0,  # Zero temperature for deterministic outputs
-                max_tokens=2000
+            latency_budget_ms = _latency_budget(request.data)
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "latency_budget_ms must be a positive number."},
+                status=status.HTTP_400_BAD_REQUEST
             )
-            
-            # Get the response content
-            content = response.choices[0].message.content
-            
-            # Parse JSON to ensure it's valid
-            result_data = json.loads(content)
-            
+        
+        try:
+            # Common party sizes are usually precomputed for the current menu version
+            cached = get_cached_prediction(party_order.menu, party_size, mode)
+            if cached is not None:
+                result_data, usage = cached
+            else:
+                # Get all reference quantities from the database
+                with stage_timer('load_references'):
+                    menu = load_menu(menu_id)
+
+                result_data, usage = predict(menu, party_size, mode=mode, latency_budget_ms=latency_budget_ms)
+                store_prediction(menu, party_size, mode, result_data, usage)
+
             # Always save the prediction
-            prediction = PredictionResult.objects.create(
-                party_order=party_order,
-                result_data=result_data,
-                name=prediction_name
-            )
+            with stage_timer('save'):
+                prediction = PredictionResult.objects.create(
+                    party_order=party_order,
+                    result_data=result_data,
+                    name=prediction_name,
+                    **usage_fields(usage, cached=cached is not None),
+                    validation_status=validation_status(result_data)
+                )
             
             # Return both the prediction and its metadata
             return Response({
                 "prediction_id": prediction.id,
                 "name": prediction.name,
                 "created_at": prediction.created_at,
+                "mode": mode,
+                "cached": cached is not None,
+                "usage": usage,
+                "validation_status": prediction.validation_status,
                 "data": result_data
             }, status=status.HTTP_201_CREATED)
             
@@ -247,6 +370,165 @@ class PartyOrderViewSet(viewsets.ModelViewSet):
             )
 
 
+class EventViewSet(viewsets.ModelViewSet):
+    """
+    API endpoints for events combining several menus, each for its own guest count.
+    """
+    serializer_class = EventSerializer
+    
+    def get_queryset(self):
+        return Event.objects.select_related('user').prefetch_related(
+            Prefetch('orders', queryset=PartyOrder.objects.select_related('menu').order_by('pk'))
+        )
+    
+    @swagger_auto_schema(
+        operation_summary="List events",
+        operation_description="List all events with their (menu, party size) lines.",
+        tags=[tags['events']]
+    )
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+    
+    @swagger_auto_schema(
+        operation_summary="Create an event",
+        operation_description="Create an event from a list of {menu, party_size} lines.",
+        tags=[tags['events']]
+    )
+    def create(self, request, *args, **kwargs):
+        with transaction.atomic():
+            return super().create(request, *args, **kwargs)
+    
+    @swagger_auto_schema(
+        operation_summary="Predict quantities for an event",
+        operation_description=(
+            "Predict every menu line in one pass, save one prediction per line and "
+            "return them with quantities merged per item and unit across menus."
+        ),
+        request_body=prediction_name_schema,
+        responses={201: event_prediction_response, 429: admission_response},
+        tags=[tags['predictions']]
+    )
+    @action(detail=True, methods=['post'])
+    @admission_controlled
+    def predict_quantities(self, request, event, pk=None):
+        """
+        Predict all menus of the event and return per-menu and merged quantities
+        """
+        mode = request.data.get('mode') or default_mode()
+        if mode not in PREDICTION_MODES:
+            return Response(
+                {"error": f"mode must be one of: {', '.join(PREDICTION_MODES)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            latency_budget_ms = _latency_budget(request.data)
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "latency_budget_ms must be a positive number."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            lines, totals, usage = predict_event(
+                event, mode, name=request.data.get('name', '').strip(), latency_budget_ms=latency_budget_ms
+            )
+        except Exception as e:
+            return Response(
+                {"error": f"Failed to predict quantities: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        return Response({
+            "event": event.pk,
+            "mode": mode,
+            "usage": usage,
+            "menus": lines,
+            "totals": totals
+        }, status=status.HTTP_201_CREATED)
+    
+    @swagger_auto_schema(
+        operation_summary="Shopping list for an event",
+        operation_description="Raw ingredient totals for the latest prediction of every menu line.",
+        responses={200: shopping_list_response},
+        tags=[tags['predictions']]
+    )
+    @action(detail=True, methods=['get'])
+    def shopping_list(self, request, pk=None):
+        """
+        Aggregate raw ingredients over all menus of the event
+        """
+        event = self.get_object()
+        return _shopping_list_response(latest_predictions([order.pk for order in event.orders.all()]))
+
+
+class ChangeFeedViewSet(viewsets.ViewSet):
+    """
+    API endpoint for incremental sync of menus, courses, items and references.
+    """
+    
+    @swagger_auto_schema(
+        operation_summary="Changes since a cursor",
+        operation_description=(
+            "Return menus, courses, menu items and quantity references created or updated after "
+            "the cursor, plus the ids of deleted ones. Pass the returned cursor as ?since= on the "
+            "next sync; without it the response is a full snapshot. Responses are paged: while "
+            "has_more is true, sync again from the returned cursor."
+        ),
+        manual_parameters=[since_cursor_param, sync_limit_param],
+        tags=[tags['sync']]
+    )
+    def list(self, request):
+        since = request.query_params.get('since')
+        if since:
+            try:
+                since = decode_cursor(since)
+            except (ValueError, OverflowError):
+                return Response(
+                    {"error": "since must be a cursor returned by this endpoint."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        try:
+            limit = min(max(int(request.query_params.get('limit', page_size())), 1), page_size())
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "limit must be an integer."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(changes_since(since or None, limit=limit))
+
+
+def metrics(request):
+    """
+    Expose request, SQL and LLM metrics in the Prometheus text format.
+    """
+    # Other workers queue requests too; read the depth from the shared leases
+    refresh_queue_depth()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def profile_report(request, pk):
+    """
+    Download a stored request profile; staff only.
+    """
+    if staff_user(request) is None:
+        return HttpResponseForbidden()
+    return report_download(get_object_or_404(ProfileReport, pk=pk))
+
+
+def openapi_schema(request, format='.json'):
+    """
+    Serve the prebuilt OpenAPI schema with validators so clients can poll it cheaply.
+    """
+    fmt = 'yaml' if format == '.yaml' else 'json'
+    body, etag = schema_document(fmt)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        content_type = 'application/yaml' if fmt == 'yaml' else 'application/json'
+        response = HttpResponse(body, content_type=f"{content_type}; charset=utf-8")
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=getattr(settings, 'CHEF_CO_SCHEMA_MAX_AGE', 3600))
+    return response
+
+
 class PredictedQuantitiesViewSet(viewsets.ReadOnlyModelViewSet):
     """
     API endpoints for retrieving past predictions.
@@ -262,7 +544,7 @@ class PredictedQuantitiesViewSet(viewsets.ReadOnlyModelViewSet):
         tags=[tags['predictions']]
     )
     def get_queryset(self):
-        return PredictionResult.objects.all()
+        return PredictionResult.objects.select_related('payload')
     
     @swagger_auto_schema(
         operation_summary="List all past predictions",
@@ -274,8 +556,89 @@ class PredictedQuantitiesViewSet(viewsets.ReadOnlyModelViewSet):
     
     @swagger_auto_schema(
         operation_summary="Get a specific prediction",
-        operation_description="Retrieve details for a specific past prediction.",
+        operation_description=(
+            "Retrieve details for a specific past prediction. Archived predictions are "
+            "decompressed transparently and, by default, restored."
+        ),
         tags=[tags['predictions']]
     )
     def retrieve(self, request, *args, **kwargs):
-        return super().retrieve(request, *args, **kwargs)
+        prediction = self.get_object()
+        if prediction.archived_at is not None:
+            if retention_settings()['RESTORE_ON_READ']:
+                restore_prediction(prediction)
+            else:
+                prediction.result_data = result_data_of(prediction)
+        return Response(self.get_serializer(prediction).data)
+    
+    @swagger_auto_schema(
+        operation_summary="Shopping list for a prediction",
+        operation_description="Expand the predicted dish quantities through the item recipes into raw ingredients.",
+        responses={200: shopping_list_response},
+        tags=[tags['predictions']]
+    )
+    @action(detail=True, methods=['get'])
+    def shopping_list(self, request, pk=None):
+        """
+        Return the raw ingredient totals for one prediction
+        """
+        prediction = self.get_object()
+        return _shopping_list_response([prediction])
+    
+    @swagger_auto_schema(
+        operation_summary="Export predictions as a top sheet",
+        operation_description=(
+            "Stream predictions in the BANQUET FOOD TOP SHEET layout as CSV or XLSX. "
+            "Honours the list's search and ordering parameters."
+        ),
+        manual_parameters=export_params,
+        responses={200: "The CSV or XLSX file"},
+        tags=[tags['predictions']]
+    )
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Stream one or many predictions for the kitchen without loading them all at once
+        """
+        file_format = request.query_params.get('file', 'csv')
+        if file_format not in EXPORT_FORMATS:
+            return Response(
+                {"error": f"file must be one of: {', '.join(EXPORT_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        queryset = self.filter_queryset(self.get_queryset())
+        ids = request.query_params.get('ids')
+        if ids:
+            try:
+                queryset = queryset.filter(pk__in=[int(value) for value in ids.split(',') if value.strip()])
+            except ValueError:
+                return Response(
+                    {"error": "ids must be a comma-separated list of integers."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        
+        content_type, chunks = export_predictions(queryset, file_format)
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="predictions.{file_format}"'
+        return response
+
+
+def _shopping_list_response(predictions):
+    try:
+        return Response(shopping_list(predictions))
+    except RecipeCycleError as e:
+        return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
+
+
+def _latency_budget(data):
+    """
+    The optional ``latency_budget_ms`` of a prediction request.
+    """
+    value = data.get('latency_budget_ms')
+    if value in (None, ''):
+        return None
+    budget = float(value)
+    if not budget > 0:
+        raise ValueError(value)
+    return budget
@@ -0,0 +1,150 @@
+"""
+Prediction cache and warm-up for common party sizes.
+
+Predictions are cached per menu tree version, party size and mode, so a
+menu edit naturally invalidates them. Warming precomputes the configured and
+historically most frequent party sizes of a menu, either from the
+``warm_predictions`` management command or, when ``CHEF_CO_WARM_ON_CHANGE``
+is enabled, in a background thread shortly after the menu's references change.
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections, transaction
+from django.db.models import Count
+
+from .models import Menu, PartyOrder
+from .predictions import load_menu, predict, default_mode
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'CACHE': 'default',
+    'TIMEOUT': 60 * 60 * 24 * 7,
+    'KEY_PREFIX': 'chef_co:prediction',
+}
+
+_pending = {}
+_pending_lock = threading.Lock()
+
+
+def prediction_cache_settings():
+    return {**DEFAULTS, **getattr(settings, 'CHEF_CO_PREDICTION_CACHE', {})}
+
+
+def get_prediction_cache():
+    return caches[prediction_cache_settings()['CACHE']]
+
+
+def prediction_cache_key(menu, party_size, mode):
+    stamp = int(menu.tree_updated_at.timestamp() * 1_000_000)
+    prefix = prediction_cache_settings()['KEY_PREFIX']
+    return f"{prefix}:{menu.pk}:{menu.tree_version}:{stamp}:{party_size}:{mode}"
+
+
+def get_cached_prediction(menu, party_size, mode):
+    """
+    Return the cached (result_data, usage) pair or None.
+    """
+    return get_prediction_cache().get(prediction_cache_key(menu, party_size, mode))
+
+
+def store_prediction(menu, party_size, mode, result_data, usage):
+    get_prediction_cache().set(
+        prediction_cache_key(menu, party_size, mode),
+        (result_data, usage),
+        timeout=prediction_cache_settings()['TIMEOUT']
+    )
+
+
+def usage_fields(usage, cached=False):
+    """
+    PredictionResult usage columns; a cache hit made no LLM call and records none.
+    """
+    if cached:
+        return {'prompt_tokens': None, 'completion_tokens': None, 'llm_latency_ms': None}
+    return {
+        'prompt_tokens': usage['prompt_tokens'],
+        'completion_tokens': usage['completion_tokens'],
+        'llm_latency_ms': usage['latency_ms'],
+    }
+
+
+def warm_party_sizes(menu_id, top=None):
+    """
+    Configured party sizes plus the ``top`` most frequently ordered sizes for the menu.
+    """
+    if top is None:
+        top = getattr(settings, 'CHEF_CO_WARM_TOP_SIZES', 5)
+    sizes = list(getattr(settings, 'CHEF_CO_WARM_PARTY_SIZES', []))
+    if top:
+        frequent = PartyOrder.objects.filter(menu_id=menu_id).values('party_size').annotate(
+            orders=Count('id')
+        ).order_by('-orders', 'party_size')[:top]
+        sizes.extend(row['party_size'] for row in frequent)
+    return sorted(set(sizes))
+
+
+def warm_menu(menu_id, sizes=None, mode=None, force=False):
+    """
+    Compute and cache predictions for the menu at each party size.
+    Returns a list of (party_size, status) pairs, status being
+    ``warmed``, ``cached`` or an error message.
+    """
+    mode = mode or getattr(settings, 'CHEF_CO_WARM_MODE', None) or default_mode()
+    if sizes is None:
+        sizes = warm_party_sizes(menu_id)
+
+    menu = load_menu(menu_id)
+    report = []
+    for party_size in sizes:
+        if not force and get_cached_prediction(menu, party_size, mode) is not None:
+            report.append((party_size, 'cached'))
+            continue
+        try:
+            result_data, usage = predict(menu, party_size, mode=mode)
+        except Exception as e:
+            logger.warning("Warming menu %s for %s people failed: %s", menu_id, party_size, e)
+            report.append((party_size, f"error: {e}"))
+            continue
+        store_prediction(menu, party_size, mode, result_data, usage)
+        report.append((party_size, 'warmed'))
+    return report
+
+
+def schedule_warmup(menu_ids):
+    """
+    Warm the given menus in the background once the current transaction commits.
+    Repeated changes within ``CHEF_CO_WARM_DELAY`` seconds are coalesced.
+    """
+    if not getattr(settings, 'CHEF_CO_WARM_ON_CHANGE', False):
+        return
+    for menu_id in set(menu_ids):
+        transaction.on_commit(lambda menu_id=menu_id: start_background_warmup(menu_id))
+
+
+def start_background_warmup(menu_id):
+    delay = getattr(settings, 'CHEF_CO_WARM_DELAY', 5.0)
+    with _pending_lock:
+        previous = _pending.pop(menu_id, None)
+        if previous is not None:
+            previous.cancel()
+        timer = threading.Timer(delay, _run_background_warmup, args=[menu_id])
+        timer.daemon = True
+        _pending[menu_id] = timer
+    timer.start()
+
+
+def _run_background_warmup(menu_id):
+    with _pending_lock:
+        _pending.pop(menu_id, None)
+    try:
+        if Menu.objects.filter(pk=menu_id).exists():
+            warm_menu(menu_id)
+    except Exception:
+        logger.exception("Background warm-up of menu %s failed", menu_id)
+    finally:
+        connections.close_all()